@@ -0,0 +1,168 @@
+"""
+Сравнение подготовки текста к озвучке: прежняя реализация process_text_to_voice и TTSTextNormalizer.
+
+Запуск из корня репозитория:
+    python scripts/benchmark_tts_normalizer.py [--runs 50] [--history Histories/Mita/Mita_history.json ...]
+
+С --history корпусом служат реплики ассистента из файлов истории персонажей; без него - встроенные
+реплики в формате ответов персонажей (эмоции/анимации/команды в тегах, числа, смесь языков).
+Кэш результатов нормализатора сбрасывается перед каждым прогоном, чтобы мерить саму обработку,
+отдельно показан прогон с тёплым кэшем и с подсказкой языка персонажа.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import unicodedata as ud
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from num2words import num2words  # noqa: E402
+
+from utils import tts_text  # noqa: E402
+from utils.tts_text import SAFE_PUNCT, SCRIPT_TO_LANG, TTSTextNormalizer, guess_lang_statistically, normalize_lang_code  # noqa: E402
+
+BUILTIN_CORPUS = [
+    "<e>smile</e>Ой, привет! Я так рада тебя видеть, мы не виделись целых 3 дня! <a>Помахай рукой</a>",
+    "<p>-4,0,5</p><e>discontent</e>Ну и зачем ты это сделал? Я же просила не трогать ту коробку на 2 полке.",
+    "Давай поиграем в игру! Я загадала число от 1 до 100, попробуй угадать. <c>подойди ко мне</c>",
+    "<music>Веселая Музыка</music>Слышишь? Это моя любимая песня. Я слушала её, наверное, 1000 раз.",
+    "<e>fear</e>Там... там кто-то есть. <c>walk to Hall Sofa</c> Не оставляй меня одну, пожалуйста!",
+    "Hmm, you said you were 25 years old? That's funny, I thought you were younger. <e>smile</e>",
+    "<v>Кровь,3.5</v>Ты поранился? Дай посмотрю. Сейчас принесу аптечку, подожди 5 минут.",
+    "Знаешь, в этой версии мира 12 комнат, и в каждой есть что-то интересное. Хочешь, покажу?",
+    "<p>2,-1,0</p>Ладно-ладно, не злись. Я просто пошутила! Ха-ха... <e>smile</e><a>Поклон</a>",
+    "Okay! Let's cook something together. We need 2 eggs, 300 grams of flour and a little bit of sugar.",
+]
+
+
+# ----- прежняя реализация (для сравнения скорости и результата) -----
+
+def _legacy_script_token(ch):
+    try:
+        name = ud.name(ch)
+    except ValueError:
+        return None
+    token = name.split()[0]
+    return "CJK" if token == "CJK" else token
+
+
+def _legacy_guess_lang_by_script(text, threshold=0.6):
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        return None
+    scripts = [s for s in (_legacy_script_token(ch) for ch in letters) if s]
+    if not scripts:
+        return None
+    counts = Counter(scripts)
+    script, cnt = counts.most_common(1)[0]
+    share = cnt / len(scripts)
+    if counts.get("HIRAGANA", 0) + counts.get("KATAKANA", 0) >= max(3, 0.1 * len(scripts)):
+        return "ja"
+    if counts.get("HANGUL", 0) >= max(3, 0.1 * len(scripts)):
+        return "ko"
+    if counts.get("CJK", 0) >= max(3, 0.2 * len(scripts)):
+        return "zh"
+    if share >= threshold:
+        if script == "LATIN":
+            return None
+        return SCRIPT_TO_LANG.get(script)
+    return None
+
+
+def _legacy_replace_numbers(text, lang):
+    lang = normalize_lang_code(lang) or "en"
+    cache = {}
+
+    def _repl(m):
+        token = m.group(0)
+        if token in cache:
+            return cache[token]
+        try:
+            num = int(token)
+            try:
+                word = num2words(num, lang=lang)
+            except NotImplementedError:
+                word = num2words(num, lang="en")
+        except Exception:
+            word = token
+        cache[token] = word
+        return word
+
+    return re.sub(r"[-+]?\d+", _repl, text)
+
+
+def legacy_process_text_to_voice(text):
+    clean_text = re.sub(r"<[^>]+>.*?</[^>]+>", "", text, flags=re.DOTALL)
+    clean_text = re.sub(r"<[^>]+>", "", clean_text)
+    lang_code = normalize_lang_code(_legacy_guess_lang_by_script(clean_text)
+                                    or guess_lang_statistically(clean_text))
+    clean_text = _legacy_replace_numbers(clean_text, lang_code or "en")
+    clean_text = "".join(ch if ch.isalpha() or ch.isspace() or ch in SAFE_PUNCT else " " for ch in clean_text)
+    clean_text = re.sub(r"\s{2,}", " ", clean_text).strip()
+    return clean_text or "..."
+
+
+# ----- замеры -----
+
+def load_history_corpus(paths):
+    corpus = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for message in data.get("messages", []):
+            content = message.get("content")
+            if message.get("role") == "assistant" and isinstance(content, str) and content.strip():
+                corpus.append(content)
+    return corpus
+
+
+def bench(label, func, runs, before_run=None):
+    timings = []
+    for _ in range(runs):
+        if before_run:
+            before_run()
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+    print(f"  {label:<30} медиана {median:8.2f} мс, мин {min(timings):8.2f} мс")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--history", nargs="*", default=[])
+    args = parser.parse_args()
+
+    corpus = load_history_corpus(args.history) if args.history else BUILTIN_CORPUS
+    print(f"Реплик в корпусе: {len(corpus)}, langdetect: {'есть' if tts_text.LANGDETECT_AVAILABLE else 'нет'}")
+
+    normalizer = TTSTextNormalizer()
+    mismatches = [text for text in corpus if legacy_process_text_to_voice(text) != normalizer.normalize(text)]
+    print(f"Расхождений с прежней реализацией: {len(mismatches)}")
+    for text in mismatches[:3]:
+        print(f"  было: {legacy_process_text_to_voice(text)!r}\n  стало: {normalizer.normalize(text)!r}")
+
+    def cold_start():
+        normalizer.cache_clear()
+        tts_text.number_to_words.cache_clear()
+
+    legacy = bench("прежняя", lambda: [legacy_process_text_to_voice(t) for t in corpus], args.runs)
+    cold = bench("нормализатор (холодный)", lambda: [normalizer.normalize(t) for t in corpus], args.runs,
+                 before_run=cold_start)
+    bench("нормализатор (num2words LRU)", lambda: [normalizer.normalize(t) for t in corpus], args.runs,
+          before_run=normalizer.cache_clear)
+    bench("нормализатор + язык персонажа", lambda: [normalizer.normalize(t, "ru") for t in corpus], args.runs,
+          before_run=normalizer.cache_clear)
+    bench("нормализатор (тёплый кэш)", lambda: [normalizer.normalize(t) for t in corpus], args.runs)
+    print(f"Ускорение холодного прогона: x{legacy / cold:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,5 @@
 ### main.py
 
-import pydantic.fields
-import uvicorn
 import os
 import sys
 import re
@@ -48,33 +46,63 @@ if loaded:
 else:
     logger.notify(f"Файл окружения '{ENV_FILENAME}' не найден по пути: {ENV_FILENAME}. Используются системные переменные или значения по умолчанию.")
 
+# Профилировщик ставится сразу после чтения features.env (STARTUP_PROFILE=1), чтобы увидеть все тяжёлые импорты
+from startup_profiler import startup_profiler
+
 # region Для исправления проблем с импортом динамично подгружаемых пакетов:
-import timeit
-import pickletools
-import logging.config
-import fileinput
-from win32 import win32file
-import pyworld
-import cProfile
-import filecmp
-import soxr
-
-try:
-    import google.api_core
-    import google.auth
-    from google.cloud import storage
-    from google.protobuf import empty_pb2
-    import google.protobuf.wrappers_pb2
-except Exception as e:
-    logger.warning(f"{e}")
-import xml.dom
-
-
-import modulefinder
-import sunau
-import xml.etree
-import xml.etree.ElementTree
-import os
+# Импорты ниже нужны только для того, чтобы сборщик положил эти модули в сборку.
+# Сами модули используются пакетами из Lib (RVC, gemini, сервер) гораздо позже,
+# поэтому грузим их в фоне уже после показа окна, а не на холодном старте.
+def _import_dynamic_package_hints():
+    import pydantic.fields
+    import uvicorn
+    import timeit
+    import pickletools
+    import logging.config
+    import fileinput
+    import cProfile
+    import filecmp
+    import modulefinder
+    import sunau
+    import xml.dom
+    import xml.etree
+    import xml.etree.ElementTree
+
+    # Каждый модуль отдельно: без win32file (не Windows) pyworld и soxr всё равно должны загрузиться
+    try:
+        from win32 import win32file
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        import pyworld
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        import soxr
+    except Exception as e:
+        logger.warning(f"{e}")
+
+    try:
+        import google.api_core
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        import google.auth
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        from google.cloud import storage
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        from google.protobuf import empty_pb2
+    except Exception as e:
+        logger.warning(f"{e}")
+    try:
+        import google.protobuf.wrappers_pb2
+    except Exception as e:
+        logger.warning(f"{e}")
+# endregion
 
 # os.environ["TEST_AS_AMD"] = "TRUE"
 
@@ -98,6 +126,7 @@ import importlib.util, ctypes, pathlib, os
 # capi_dir = pathlib.Path(ort_spec.origin).parent / "capi"
 # ctypes.WinDLL(str(capi_dir / "libiomp5md.dll"))
 
+# onnxruntime оставляем на старте: его DLL должны загрузиться раньше, чем torch из Lib
 import onnxruntime
 
 from PyQt6.QtWidgets import QApplication
@@ -274,21 +303,28 @@ if __name__ == "__main__":
 
         # Создаем пустой объект для контроллера
         logger.info("Создаю MainController...")
-        controller = MainController(None)
+        with startup_profiler.stage("MainController"):
+            controller = MainController(None)
         logger.info("MainController создан")
     
         logger.info("Создаю ChatGUI...")
-        main_win = ChatGUI(controller.settings)  # Передаем controller  settings
+        with startup_profiler.stage("ChatGUI"):
+            main_win = ChatGUI(controller.settings)  # Передаем controller  settings
         logger.info("ChatGUI создан")
         
         # Обновляем ссылку на реальный view в контроллере
-        controller.update_view(main_win)
+        with startup_profiler.stage("GuiController"):
+            controller.update_view(main_win)
 
-        main_win.load_chat_history()
+        with startup_profiler.stage("Загрузка истории чата"):
+            main_win.load_chat_history()
         
         
         logger.info("Показываю главное окно...")
         main_win.show()
+        startup_profiler.report()
+
+        threading.Thread(target=_import_dynamic_package_hints, name="PackageHintsImport", daemon=True).start()
         logger.info("Запускаю app.exec()...")
 
         
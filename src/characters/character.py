@@ -261,10 +261,11 @@ class Character:
             print(f"{RED_COLOR}Critical error in get_llm_system_prompts for {self.char_id}: {e}{RESET_COLOR}\n{traceback.format_exc()}", file=sys.stderr)
             return []
 
-    def get_full_system_setup_for_llm(self, separate_prompts = False):
+    def get_full_system_setup_for_llm(self, separate_prompts = False, memory_query: str = "", memory_top_k: int = 0):
         """
         Собирает системные сообщения для LLM на основе массива строк из DSL.
         Если separate_prompts=True — по одному сообщению на блок; иначе — один общий промпт.
+        Если memory_top_k > 0 — в блок памяти попадают только релевантные memory_query воспоминания.
         """
         from utils.prompt_builder import build_system_prompts
 
@@ -273,7 +274,7 @@ class Character:
 
         messages.extend(build_system_prompts(dsl_blocks, separate=separate_prompts))
 
-        memory_message_content = self.memory_system.get_memories_formatted()
+        memory_message_content = self.memory_system.get_memories_formatted(memory_query, memory_top_k)
         if memory_message_content and memory_message_content.strip():
             messages.append({"role": "system", "content": memory_message_content})
 
@@ -449,7 +450,9 @@ class Character:
             #return "" # Remove the tag from the response
             return match_obj.group(0)
 
-        return re.sub(memory_pattern, memory_processor, response, flags=re.DOTALL).strip()
+        # Все операции с памятью из одного ответа записываются на диск одним коммитом
+        with self.memory_system.batch():
+            return re.sub(memory_pattern, memory_processor, response, flags=re.DOTALL).strip()
 
     # In OpenMita/character.py, class Character
     def reload_character_data(self):
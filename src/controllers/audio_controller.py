@@ -10,6 +10,7 @@ from core.events import get_event_bus, Events, Event
 from managers.task_manager import TaskStatus
 from typing import Optional
 from utils import process_text_to_voice
+from utils.tts_text import split_sentences
 
 
 class AudioController:
@@ -73,6 +74,7 @@ class AudioController:
         text = data.get('text', '')
         speaker = data.get('speaker', self.get_speaker_text())
         task_uid = data.get('task_uid')
+        language = data.get('language')
 
         if not text:
             return
@@ -80,7 +82,7 @@ class AudioController:
         # Сохраняем оригинальный текст (с командами) для логики
         original_text = text
         # Создаем очищенный текст для TTS (без команд)
-        text_for_voice = process_text_to_voice(text)
+        text_for_voice = process_text_to_voice(text, language=language)
 
         loops = self.event_bus.emit_and_wait(Events.Core.GET_EVENT_LOOP, timeout=1.0)
         loop = loops[0] if loops else None
@@ -161,18 +163,20 @@ class AudioController:
     async def _await_local_voiceover_and_postprocess(self, voice_text: str, original_text: str,
                                                      task_uid: Optional[str]):
         """Локальная озвучка через LocalVoiceController (через Future) + пост-обработка."""
-        import asyncio
-
-        future = asyncio.Future()
-        self.event_bus.emit(Events.Audio.LOCAL_SEND_VOICE_REQUEST, {
-            'text': voice_text,  # Отправляем очищенный текст в TTS
-            'future': future,
-            'task_uid': task_uid
-        })
+        server_res = self.event_bus.emit_and_wait(Events.Server.GET_GAME_CONNECTION, timeout=1.0)
+        is_connected = server_res[0] if server_res else False
+        play_in_chat = not is_connected and self.settings.get("VOICEOVER_LOCAL_CHAT")
+
+        # В чате без игры файл никому не передаётся: реплика озвучивается по предложениям
+        # и начинает звучать, как только готово первое
+        if play_in_chat and self.settings.get("LOCAL_VOICE_SEGMENTED", True) and AudioHandler.get_output():
+            sentences = split_sentences(voice_text)
+            if len(sentences) > 1:
+                await self._play_local_voiceover_segments(sentences, original_text, task_uid)
+                return
 
         try:
-            await future
-            result_path = future.result()
+            result_path = await self._request_local_voiceover(voice_text, task_uid)
 
             if task_uid:
                 self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
@@ -184,16 +188,8 @@ class AudioController:
                     }
                 })
 
-            # Остальная логика как раньше
-            server_res = self.event_bus.emit_and_wait(Events.Server.GET_GAME_CONNECTION, timeout=1.0)
-            is_connected = server_res[0] if server_res else False
-
-            if not is_connected and self.settings.get("VOICEOVER_LOCAL_CHAT"):
-                await AudioHandler.handle_voice_file(
-                    result_path,
-                    self.settings.get("LOCAL_VOICE_DELETE_AUDIO", True) if os.environ.get(
-                        "ENABLE_VOICE_DELETE_CHECKBOX", "0") == "1" else True
-                )
+            if play_in_chat:
+                await AudioHandler.handle_voice_file(result_path, self._delete_played_audio())
             elif is_connected:
                 self.event_bus.emit(Events.Server.SET_PATCH_TO_SOUND_FILE, result_path)
             else:
@@ -204,6 +200,50 @@ class AudioController:
             if task_uid:
                 self._update_task_failed_voiceover(task_uid, str(e))
 
+    async def _request_local_voiceover(self, voice_text: str, task_uid: Optional[str] = None) -> str:
+        future = asyncio.Future()
+        self.event_bus.emit(Events.Audio.LOCAL_SEND_VOICE_REQUEST, {
+            'text': voice_text,  # Отправляем очищенный текст в TTS
+            'future': future,
+            'task_uid': task_uid
+        })
+        await future
+        return future.result()
+
+    async def _play_local_voiceover_segments(self, sentences, original_text: str, task_uid: Optional[str]):
+        """Синтезирует предложения по очереди и отдаёт их в поток вывода: следующее синтезируется, пока звучит текущее."""
+        delete_files = self._delete_played_audio()
+
+        async def segments():
+            for sentence in sentences:
+                path = await self._request_local_voiceover(sentence, task_uid)
+                audio, sample_rate = await asyncio.to_thread(AudioHandler.read_audio, path)
+                if delete_files:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        logger.info(f"Файл {path} НЕ удалён. Ошибка: {e}")
+                yield audio, sample_rate
+            if task_uid:
+                self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
+                    'uid': task_uid,
+                    'status': TaskStatus.SUCCESS,
+                    'result': {'response': original_text}
+                })
+
+        try:
+            logger.info(f"Посегментная локальная озвучка: {len(sentences)} предложений")
+            await AudioHandler.play_segments(segments())
+        except Exception as e:
+            logger.error(f"Ошибка при посегментной локальной озвучке: {e}")
+            if task_uid:
+                self._update_task_failed_voiceover(task_uid, str(e))
+
+    def _delete_played_audio(self) -> bool:
+        if os.environ.get("ENABLE_VOICE_DELETE_CHECKBOX", "0") == "1":
+            return self.settings.get("LOCAL_VOICE_DELETE_AUDIO", True)
+        return True
+
     @staticmethod
     def delete_all_sound_files():
         for pattern in ["*.wav", "*.mp3"]:
@@ -1,7 +1,5 @@
 import time
 import threading
-from win32 import win32gui
-from handlers.screen_handler import ScreenCapture
 from main_logger import logger
 from core.events import get_event_bus, Events, Event
 
@@ -12,7 +10,9 @@ class CaptureController:
         self.settings = settings
 
         self.event_bus = get_event_bus()
-        self.screen_capture_instance = ScreenCapture()
+        # ScreenCapture (mss, numpy, win32) создаётся при первом запуске захвата, а не на старте
+        self.screen_capture_instance = None
+        self._screen_exclusion = None
         self.screen_capture_thread = None
         self.screen_capture_running = False
         self.screen_capture_active = False
@@ -84,6 +84,7 @@ class CaptureController:
         exclude_title = event.data.get('exclude_title', '')
         exclude_enabled = event.data.get('exclude_enabled', False)
         
+        self._screen_exclusion = (hwnd_to_pass, exclude_title, exclude_enabled)
         if self.screen_capture_instance:
             self.screen_capture_instance.set_exclusion_parameters(hwnd_to_pass, exclude_title, exclude_enabled)
             
@@ -197,6 +198,7 @@ class CaptureController:
             
             logger.info(f"Запуск захвата экрана с параметрами: interval={interval}, quality={quality}, fps={fps}")
             
+            self._ensure_screen_capture()
             self.screen_capture_instance.start_capture(interval, quality, fps, max_history_frames,
                                                        max_frames_per_request, capture_width,
                                                        capture_height)
@@ -208,6 +210,14 @@ class CaptureController:
                 self.start_image_request_timer()
             self.event_bus.emit(Events.GUI.UPDATE_STATUS_COLORS)
             
+    def _ensure_screen_capture(self):
+        if self.screen_capture_instance is None:
+            from handlers.screen_handler import ScreenCapture
+            self.screen_capture_instance = ScreenCapture()
+            if self._screen_exclusion is not None:
+                self.screen_capture_instance.set_exclusion_parameters(*self._screen_exclusion)
+        return self.screen_capture_instance
+
     def stop_screen_capture_thread(self):
         if self.screen_capture_running:
             self.screen_capture_instance.stop_capture()
@@ -287,7 +297,7 @@ class CaptureController:
             if self.settings.get("ENABLE_SCREEN_ANALYSIS", False):
                 logger.info(f"Отправка периодического запроса с изображением ({current_time - self.last_image_request_time:.2f}/{interval:.2f} сек).")
                 history_limit = int(self.settings.get("SCREEN_CAPTURE_HISTORY_LIMIT", 1))
-                frames = self.screen_capture_instance.get_recent_frames(history_limit)
+                frames = self.screen_capture_instance.get_recent_frames(history_limit) if self.screen_capture_instance else []
                 if frames:
                     image_data.extend(frames)
                     logger.info(f"Захвачено {len(frames)} кадров для периодической отправки.")
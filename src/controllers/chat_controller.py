@@ -1,7 +1,10 @@
 # src/controllers/chat_controller.py
 import os
 import asyncio
+import concurrent.futures
+import functools
 import tempfile
+import threading
 from main_logger import logger
 from core.events import get_event_bus, Events, Event
 from managers.task_manager import TaskStatus
@@ -12,7 +15,11 @@ class ChatController:
     def __init__(self, settings):
         self.settings = settings
         self.event_bus = get_event_bus()
-        self.llm_processing = False
+        # Генераций может быть несколько (разные персонажи из игры), поэтому счётчик, а не флаг
+        self._active_generations = 0
+        # Поток ответа в окно чата один: его получает первая генерация, остальные выводятся целиком
+        self._stream_owner = None
+        self._state_lock = threading.Lock()
         
         self.staged_images = []
         self._subscribe_to_events()
@@ -26,16 +33,55 @@ class ChatController:
         self.event_bus.subscribe(Events.Chat.STAGE_IMAGE, self._on_stage_image, weak=False)
         self.event_bus.subscribe(Events.Chat.CLEAR_STAGED_IMAGES, self._on_clear_staged_images, weak=False)
         
+    @property
+    def llm_processing(self) -> bool:
+        return self._active_generations > 0
+
+    def _begin_generation(self):
+        with self._state_lock:
+            self._active_generations += 1
+
+    def _end_generation(self, stream_token):
+        with self._state_lock:
+            self._active_generations = max(0, self._active_generations - 1)
+            if stream_token is not None and self._stream_owner is stream_token:
+                self._stream_owner = None
+
+    def _is_task_cancelled(self, task_uid: str | None) -> bool:
+        if not task_uid:
+            return False
+        task_result = self.event_bus.emit_and_wait(Events.Task.GET_TASK, {'uid': task_uid}, timeout=1.0)
+        task = task_result[0] if task_result else None
+        return bool(task) and task.status in (TaskStatus.CANCELLED, TaskStatus.ABORTED)
+
+    def _claim_stream(self, stream_token) -> bool:
+        with self._state_lock:
+            if self._stream_owner is None:
+                self._stream_owner = stream_token
+                return True
+            return False
+
     async def async_send_message(
         self,
         user_input: str,
         system_input: str = "",
         image_data: list[bytes] | None = None,
-        task_uid: str | None = None  # Изменено с message_id на task_uid
+        task_uid: str | None = None,  # Изменено с message_id на task_uid
+        character_id: str | None = None,
+        game_data: dict | None = None
     ):
+        """
+        character_id/game_data приходят от игрового сервера: ответ генерируется для этого
+        персонажа с его игровым контекстом, не трогая текущего персонажа окна чата. Пока LLM
+        отвечает, цикл событий свободен - генерации разных персонажей идут параллельно.
+        """
+        stream_token = object()
+        self._begin_generation()
         try:
-            print("[DEBUG] Начинаем async_send_message, показываем статус")
-            self.llm_processing = True
+            logger.debug("Начинаем async_send_message, показываем статус")
+            if self._is_task_cancelled(task_uid):
+                logger.info(f"Задача {task_uid} отменена, генерация пропущена")
+                return None
             
             # Обновляем статус задачи на PENDING если есть uid
             if task_uid:
@@ -44,7 +90,7 @@ class ChatController:
                     'status': TaskStatus.PENDING
                 })
             
-            is_streaming = bool(self.settings.get("ENABLE_STREAMING", False))
+            is_streaming = bool(self.settings.get("ENABLE_STREAMING", False)) and self._claim_stream(stream_token)
 
             def stream_callback_handler(chunk: str):
                 self.event_bus.emit(Events.GUI.APPEND_STREAM_CHUNK_UI, {'chunk': chunk})
@@ -66,16 +112,29 @@ class ChatController:
                             continue
                 image_data = prepared if prepared else None
 
-            response_result = self.event_bus.emit_and_wait(Events.Model.GENERATE_RESPONSE, {
-                'user_input': user_input,
-                'system_input': system_input,
-                'image_data': image_data,
-                'stream_callback': stream_callback_handler if is_streaming else None,
-                'message_id': task_uid  # Передаем task_uid как message_id для совместимости
-            }, timeout=600.0)
+            loop = asyncio.get_running_loop()
+            response_result = await loop.run_in_executor(None, functools.partial(
+                self.event_bus.emit_and_wait, Events.Model.GENERATE_RESPONSE, {
+                    'user_input': user_input,
+                    'system_input': system_input,
+                    'image_data': image_data,
+                    'stream_callback': stream_callback_handler if is_streaming else None,
+                    'message_id': task_uid,  # Передаем task_uid как message_id для совместимости
+                    'character_id': character_id,
+                    'game_data': game_data,
+                    # Отменённая задача (игрок ответил раньше idle-реплики) бросает генерацию и не пишет историю
+                    'cancel_check': (lambda: self._is_task_cancelled(task_uid)) if task_uid else None
+                }, 600.0
+            ))
             
             response = response_result[0] if response_result else None
 
+            if not response and self._is_task_cancelled(task_uid):
+                logger.info(f"Задача {task_uid} отменена во время генерации, ответ отброшен")
+                if is_streaming:
+                    self.event_bus.emit(Events.GUI.FINISH_STREAM_UI)
+                return None
+
             if not response:
                 # Обновляем статус задачи на FAILED_ON_GENERATION
                 if task_uid:
@@ -84,13 +143,19 @@ class ChatController:
                         'status': TaskStatus.FAILED_ON_GENERATION,
                         'error': "Failed to generate response"
                     })
-                self.llm_processing = False
                 self.event_bus.emit(Events.Model.ON_FAILED_RESPONSE, {'error': "Превышено время ожидания ответа"})
                 return None
 
-            # Проверяем нужна ли озвучка
-            if response and self.settings.get("USE_VOICEOVER"):
-                character_result = self.event_bus.emit_and_wait(Events.Model.GET_CURRENT_CHARACTER, timeout=3.0)
+            # Задачу отменили, пока шла генерация (например, игрок ответил раньше idle-реплики)
+            voiceover_cancelled = self._is_task_cancelled(task_uid)
+            if voiceover_cancelled:
+                logger.info(f"Задача {task_uid} отменена во время генерации, озвучка пропущена")
+
+            # Проверяем нужна ли озвучка (у отменённой задачи статус уже не меняется)
+            if response and self.settings.get("USE_VOICEOVER") and not voiceover_cancelled:
+                character_result = self.event_bus.emit_and_wait(
+                    Events.Model.GET_CURRENT_CHARACTER, {'character': character_id}, timeout=3.0
+                )
                 current_character = character_result[0] if character_result else None
                 
                 logger.info(current_character)
@@ -112,6 +177,7 @@ class ChatController:
                         self.event_bus.emit(Events.Audio.VOICEOVER_REQUESTED, {
                             'text': response,
                             'speaker': speaker,
+                            'language': current_character.get('voice_language'),
                             'task_uid': task_uid  # Передаем task_uid вместо message_id
                         })
                         logger.info(f"Озвучка запрошена с task_uid: {task_uid}")
@@ -151,12 +217,10 @@ class ChatController:
                     except Exception as e:
                         logger.error(f"Не удалось отправить ответ в игру: {e}")
             
-            self.llm_processing = False
             return response
                     
         except asyncio.TimeoutError:
             logger.warning("Тайм-аут: генерация ответа заняла слишком много времени.")
-            self.llm_processing = False
             if task_uid:
                 self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
                     'uid': task_uid,
@@ -167,7 +231,6 @@ class ChatController:
             return "Произошла ошибка при обработке вашего сообщения."
         except Exception as e:
             logger.error(f"Ошибка в async_send_message: {e}", exc_info=True)
-            self.llm_processing = False
             if task_uid:
                 self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
                     'uid': task_uid,
@@ -176,6 +239,8 @@ class ChatController:
                 })
             self.event_bus.emit(Events.Model.ON_FAILED_RESPONSE, {'error': f"Ошибка: {str(e)[:50]}..."})
             return "Произошла ошибка при обработке вашего сообщения."
+        finally:
+            self._end_generation(stream_token)
     
     def _on_send_message(self, event: Event):
         data = event.data
@@ -183,6 +248,10 @@ class ChatController:
         system_input = data.get('system_input', '')
         image_data = data.get('image_data', [])
         task_uid = data.get('task_uid')  # Изменено с message_id
+        character_id = data.get('character_id')
+        game_data = data.get('game_data')
+        # concurrent.futures.Future от игрового сервера: ответ отдаётся через него, поток шины не ждёт
+        result_future = data.get('future')
         
         if image_data:
             self.event_bus.emit(Events.Capture.UPDATE_LAST_IMAGE_REQUEST_TIME)
@@ -192,12 +261,14 @@ class ChatController:
         loop = loop_res[0] if loop_res else None
         
         if loop and loop.is_running():
-            # Запускаем корутину в этом loop'е и синхронно ждём результата
-            import asyncio
+            # Запускаем корутину в этом loop'е
             fut = asyncio.run_coroutine_threadsafe(
-                self.async_send_message(user_input, system_input, image_data, task_uid),
+                self.async_send_message(user_input, system_input, image_data, task_uid, character_id, game_data),
                 loop
             )
+            if result_future is not None:
+                fut.add_done_callback(functools.partial(self._copy_future_result, target=result_future))
+                return None
             try:
                 response = fut.result(timeout=600)
                 return response  # ответ попадёт вызвавшему emit_and_wait
@@ -206,11 +277,33 @@ class ChatController:
                 return None
         else:
             # fallback: нет цикла ⇒ запускаем напрямую
-            import asyncio
-            response = asyncio.run(
-                self.async_send_message(user_input, system_input, image_data, task_uid)
-            )
+            try:
+                response = asyncio.run(
+                    self.async_send_message(user_input, system_input, image_data, task_uid, character_id, game_data)
+                )
+            except Exception as e:
+                if result_future is not None and not result_future.done():
+                    result_future.set_exception(e)
+                raise
+            if result_future is not None and not result_future.done():
+                result_future.set_result(response)
             return response
+
+    @staticmethod
+    def _copy_future_result(source, target):
+        if source.cancelled():
+            target.cancel()
+            return
+        error = source.exception()
+        if error is not None:
+            logger.error(f"async_send_message failed: {error}")
+        try:
+            if error is not None:
+                target.set_exception(error)
+            else:
+                target.set_result(source.result())
+        except concurrent.futures.InvalidStateError:
+            pass  # ожидающий уже отказался (таймаут сервера)
     
     def _on_get_llm_processing_status(self, event: Event):
         return self.llm_processing
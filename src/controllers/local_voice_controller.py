@@ -5,6 +5,7 @@ import uuid
 import glob
 import asyncio
 import importlib
+import threading
 from typing import Any, Dict, List, Optional
 
 from main_logger import logger
@@ -29,16 +30,29 @@ class LocalVoiceController:
         self._triton_check_in_progress: bool = False                # +++
 
         self._subscribe_to_events()
-        
-        logger.info("LocalVoiceController начинает импорт модулей для озвучки...")
-        try:
-            # event не используется внутри _on_refresh_voice_modules
-            self._on_refresh_voice_modules(event=None)
-        except Exception as e:
-            logger.warning(f"Первичный прогрев модулей локальной озвучки завершился с ошибкой: {e}")
+        self._schedule_voice_modules_warmup()
 
         logger.notify("LocalVoiceController успешно инициализирован.")
 
+    def _schedule_voice_modules_warmup(self):
+        """
+        Прогрев модулей озвучки тянет torch/fairseq и занимает секунды, поэтому на старте он не блокирует окно:
+        при включённой локальной озвучке модули грузятся в фоне, иначе - лениво при первом обращении к модели.
+        """
+        if not (self.settings.get("USE_VOICEOVER", False) and self.settings.get("VOICEOVER_METHOD") == "Local"):
+            logger.info("Локальная озвучка выключена, импорт модулей отложен до первого использования.")
+            return
+
+        def warmup():
+            logger.info("LocalVoiceController начинает импорт модулей для озвучки...")
+            try:
+                # event не используется внутри _on_refresh_voice_modules
+                self._on_refresh_voice_modules(event=None)
+            except Exception as e:
+                logger.warning(f"Первичный прогрев модулей локальной озвучки завершился с ошибкой: {e}")
+
+        threading.Thread(target=warmup, name="VoiceModulesWarmup", daemon=True).start()
+
     def _subscribe_to_events(self):
         eb = self.event_bus
 
@@ -59,6 +73,7 @@ class LocalVoiceController:
         eb.subscribe(Events.Audio.SELECT_VOICE_MODEL, self._on_select_voice_model, weak=False)
         eb.subscribe(Events.Audio.INIT_VOICE_MODEL, self._on_init_voice_model, weak=False)
         eb.subscribe(Events.Audio.CHANGE_VOICE_LANGUAGE, self._on_change_voice_language, weak=False)
+        eb.subscribe(Events.Model.SET_CHARACTER_TO_CHANGE, self._on_set_character_to_change, weak=False)
 
         # Установка/удаление (вызываются из GUI-контроллера окна настроек)
         eb.subscribe(Events.Audio.LOCAL_INSTALL_MODEL, self._on_local_install_model, weak=False)
@@ -258,6 +273,15 @@ class LocalVoiceController:
                 return False
         return False
 
+    def _on_set_character_to_change(self, event: Event):
+        character_name = (event.data or {}).get('character')
+        if not character_name or not self.local_voice or not self.settings.get("USE_VOICEOVER", False):
+            return
+        results = self.event_bus.emit_and_wait(Events.Model.GET_CHARACTER, {'name': character_name}, timeout=1.0)
+        character = next((c for c in results if c is not None), None)
+        if character is not None:
+            self.local_voice.preload_character_voice(character)
+
     def _on_init_voice_model(self, event: Event):
         model_id = event.data.get('model_id')
         progress_callback = event.data.get('progress_callback')
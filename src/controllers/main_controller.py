@@ -16,9 +16,10 @@ from controllers.task_controller import TaskController
 from controllers.api_presets_controller import ApiPresetsController
 from controllers.local_voice_controller import LocalVoiceController
 
-from main_logger import logger
+from main_logger import logger, configure_log_levels
 from utils.ffmpeg_installer import install_ffmpeg
 from utils.pip_installer import PipInstaller
+from startup_profiler import startup_profiler
 from core.events import get_event_bus, Events, Event, shutdown_event_bus
 
 
@@ -34,12 +35,14 @@ class MainController:
         self.dialog_active = False
 
 
-        self.loop_controller = LoopController()
+        with startup_profiler.stage("LoopController"):
+            self.loop_controller = LoopController()
         logger.notify("LoopController успешно инициализирован.")
 
         self.gui_controller = None
 
-        self.telegram_controller = TelegramController()
+        with startup_profiler.stage("TelegramController"):
+            self.telegram_controller = TelegramController()
         logger.notify("TelegramController успешно инициализирован.")
         
 
@@ -54,6 +57,9 @@ class MainController:
             logger.info("Не удалось удачно получить из системных переменных все данные", e)
             self.settings = SettingsController("Settings/settings.json").settings
 
+        if self.settings.get("LOG_LEVELS"):
+            configure_log_levels(self.settings.get("LOG_LEVELS"))
+
         try:
             self.pip_installer = PipInstaller(
                 script_path=r"libs\python\python.exe",
@@ -68,24 +74,33 @@ class MainController:
         self._check_and_perform_pending_update()
 
         
-        self.local_voice_controller = LocalVoiceController(self)
+        with startup_profiler.stage("LocalVoiceController"):
+            self.local_voice_controller = LocalVoiceController(self)
         logger.notify("LocalVoiceController успешно инициализирован.")
 
         
-        self.task_controller = TaskController()
+        with startup_profiler.stage("TaskController"):
+            self.task_controller = TaskController()
         logger.notify("TaskController успешно инициализирован.")
-        self.api_presets_controller = ApiPresetsController()
+        with startup_profiler.stage("ApiPresetsController"):
+            self.api_presets_controller = ApiPresetsController()
         logger.notify("ApiPresetsController успешно инициализирован.")
-        self.audio_controller = AudioController(self)
+        with startup_profiler.stage("AudioController"):
+            self.audio_controller = AudioController(self)
         logger.notify("AudioController успешно инициализирован.")
-        self.model_controller = ModelController(self.settings, self.pip_installer)
+        with startup_profiler.stage("ModelController"):
+            self.model_controller = ModelController(self.settings, self.pip_installer)
         logger.notify("ModelController успешно инициализирован.")
-        self.capture_controller = CaptureController(self.settings)
+        with startup_profiler.stage("CaptureController"):
+            self.capture_controller = CaptureController(self.settings)
         logger.notify("CaptureController успешно инициализирован.")
-        self.speech_controller = SpeechController()
+        with startup_profiler.stage("SpeechController"):
+            self.speech_controller = SpeechController()
         logger.notify("SpeechController успешно инициализирован.")
-        self._init_server_controller()
-        self.chat_controller = ChatController(self.settings)
+        with startup_profiler.stage("ServerController"):
+            self._init_server_controller()
+        with startup_profiler.stage("ChatController"):
+            self.chat_controller = ChatController(self.settings)
         logger.notify("ChatController успешно инициализирован.")
 
         
@@ -152,6 +167,8 @@ class MainController:
         if key == 'USE_NEW_API':
             logger.info("Обнаружено изменение настройки API, переинициализация ServerController...")
             self._init_server_controller()
+        elif key == 'LOG_LEVELS':
+            configure_log_levels(event.data.get('value') or os.environ.get("NEUROMITA_LOG_LEVELS", ""))
 
     def close_app(self):
         logger.info("Начинаем закрытие приложения...")
@@ -133,18 +133,25 @@ class ModelController:
         return []
     
     def _on_get_current_character(self, event: Event):
-        if hasattr(self.model, 'current_character'):
+        # Запросы из игры уточняют персонажа: текущий в окне чата может быть другим
+        character_name = event.data.get('character') if isinstance(event.data, dict) else None
+        if character_name and character_name in getattr(self.model, 'characters', {}):
+            char = self.model.characters[character_name]
+        elif hasattr(self.model, 'current_character'):
             char = self.model.current_character
-            return {
-                'name': char.name if hasattr(char, 'name') else '',
-                'char_id': char.char_id if hasattr(char, 'char_id') else '',
-                'is_cartridge': char.is_cartridge if hasattr(char, 'is_cartridge') else False,
-                'silero_command': getattr(char, 'silero_command', ''),
-                'short_name': getattr(char, 'short_name', ''),
-                'miku_tts_name': getattr(char, 'miku_tts_name', 'Player'),
-                'silero_turn_off_video': getattr(char, 'silero_turn_off_video', False),
-            }
-        return None
+        else:
+            return None
+        return {
+            'name': char.name if hasattr(char, 'name') else '',
+            'char_id': char.char_id if hasattr(char, 'char_id') else '',
+            'is_cartridge': char.is_cartridge if hasattr(char, 'is_cartridge') else False,
+            'silero_command': getattr(char, 'silero_command', ''),
+            'short_name': getattr(char, 'short_name', ''),
+            'miku_tts_name': getattr(char, 'miku_tts_name', 'Player'),
+            'silero_turn_off_video': getattr(char, 'silero_turn_off_video', False),
+            # Язык озвучки из config.json персонажа: если задан, язык текста не определяется
+            'voice_language': char.get_variable('voice_language') if hasattr(char, 'get_variable') else None,
+        }
     
     def _on_set_character_to_change(self, event: Event):
         character_name = event.data.get('character')
@@ -164,7 +171,9 @@ class ModelController:
     def _on_reload_character_data(self, event: Event):
         if hasattr(self.model, 'current_character'):
             char = self.model.current_character
-            if hasattr(char, 'reload_character_data'):
+            if hasattr(self.model, 'reload_character'):
+                self.model.reload_character(char)
+            elif hasattr(char, 'reload_character_data'):
                 char.reload_character_data()
     
     def _on_reload_character_prompts(self, event: Event):
@@ -192,13 +201,13 @@ class ModelController:
         self.total_messages_in_history = 0
         self.loading_more_history = False
         
-        chat_history = self.model.current_character.load_history()
-        all_messages = chat_history["messages"]
-        self.total_messages_in_history = len(all_messages)
+        # Постраничное чтение: без повторного разбора файла и применения переменных персонажа
+        history = self.model.current_character.history_manager
+        self.total_messages_in_history = history.count()
         
         max_display_messages = int(self.settings.get("MAX_CHAT_HISTORY_DISPLAY", 100))
         start_index = max(0, self.total_messages_in_history - max_display_messages)
-        messages_to_load = all_messages[start_index:]
+        messages_to_load = history.read_range(start_index, self.total_messages_in_history)
         
         self.loaded_messages_offset = len(messages_to_load)
         
@@ -214,13 +223,12 @@ class ModelController:
         
         self.loading_more_history = True
         try:
-            chat_history = self.model.current_character.load_history()
-            all_messages = chat_history["messages"]
+            history = self.model.current_character.history_manager
             
             lazy_load_batch_size = self.lazy_load_batch_size
             end_index = self.total_messages_in_history - self.loaded_messages_offset
             start_index = max(0, end_index - lazy_load_batch_size)
-            messages_to_prepend = all_messages[start_index:end_index]
+            messages_to_prepend = history.read_range(start_index, end_index)
             
             if messages_to_prepend:
                 self.loaded_messages_offset += len(messages_to_prepend)
@@ -277,9 +285,14 @@ class ModelController:
         image_data = event.data.get('image_data', [])
         stream_callback = event.data.get('stream_callback', None)
         message_id = event.data.get('message_id', None)
+        character_id = event.data.get('character_id', None)
+        game_data = event.data.get('game_data', None)
+        cancel_check = event.data.get('cancel_check', None)
         
         if hasattr(self.model, 'generate_response'):
-            return self.model.generate_response(user_input, system_input, image_data, stream_callback, message_id)
+            return self.model.generate_response(user_input, system_input, image_data, stream_callback, message_id,
+                                                character_id=character_id, game_data=game_data,
+                                                cancel_check=cancel_check)
         return None
     
     def _on_reload_prompts_async(self, event: Event):
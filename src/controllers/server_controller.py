@@ -61,6 +61,18 @@ class ServerController:
         except Exception:
             self.server.set_game_master_voice(False)
 
+        try:
+            max_parallel_value = self._get_setting('GAME_MAX_PARALLEL_GENERATIONS', 2)
+            self.server.set_max_parallel_generations(int(max_parallel_value))
+        except Exception:
+            self.server.set_max_parallel_generations(2)
+
+        try:
+            coalesce_window_value = self._get_setting('GAME_COALESCE_WINDOW_MS', 300)
+            self.server.set_coalesce_window_ms(int(coalesce_window_value))
+        except Exception:
+            self.server.set_coalesce_window_ms(300)
+
     def start_server(self):
         if not self.running:
             self.running = True
@@ -149,6 +161,16 @@ class ServerController:
             self.server.set_game_block_level(str(value))
         elif key == 'GM_VOICE':
             self.server.set_game_master_voice(bool(value))
+        elif key == 'GAME_MAX_PARALLEL_GENERATIONS':
+            try:
+                self.server.set_max_parallel_generations(int(value))
+            except (TypeError, ValueError):
+                logger.warning(f"Некорректное значение GAME_MAX_PARALLEL_GENERATIONS: {value}")
+        elif key == 'GAME_COALESCE_WINDOW_MS':
+            try:
+                self.server.set_coalesce_window_ms(int(value))
+            except (TypeError, ValueError):
+                logger.warning(f"Некорректное значение GAME_COALESCE_WINDOW_MS: {value}")
 
         if key in self.settings_to_send:
             try:
@@ -1,11 +1,14 @@
+import logging
 import threading
 from typing import Dict, List, Callable, Any, Optional
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 import weakref
 from dataclasses import dataclass
 from queue import Queue, Empty
 import time
-from main_logger import logger
+from main_logger import get_logger
+
+logger = get_logger("events")
 
 
 @dataclass
@@ -20,16 +23,88 @@ class Event:
             self.timestamp = time.time()
 
 
+LANE_QUERY = "query"  # emit_and_wait с быстрыми ответами (настройки, статусы, геттеры)
+LANE_LONG = "long"    # генерация ответа, диалоги, установка моделей - могут занимать минуты
+LANE_UI = "ui"        # emit без ожидания результата
+
+
+class _Lane:
+    """Отдельный пул потоков для класса событий со счётчиками очереди."""
+
+    # Очередь длиннее этого - повод для предупреждения в логе (не чаще раза в 10 сек)
+    QUEUE_WARN_DEPTH = 50
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"EventBus-{name}")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self._last_warning = 0.0
+
+    def submit(self, func: Callable, *args) -> Future:
+        with self._lock:
+            self.queued += 1
+            self.submitted += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            depth = self.queued
+        if depth > self.QUEUE_WARN_DEPTH and time.time() - self._last_warning > 10:
+            self._last_warning = time.time()
+            logger.warning(f"EventBus: очередь '{self.name}' - {depth} задач, все {self.max_workers} потоков заняты")
+        return self._executor.submit(self._run, func, *args)
+
+    def _run(self, func: Callable, *args):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+            }
+
+    def shutdown(self, wait_for_tasks: bool = True):
+        self._executor.shutdown(wait=wait_for_tasks)
+
+
 class EventBus:
     """
     Потокобезопасная система событий с поддержкой слабых ссылок
-    для предотвращения утечек памяти
+    для предотвращения утечек памяти.
+
+    Обработчики выполняются в трёх раздельных пулах (lanes), чтобы долгие обработчики
+    (генерация ответа ждёт до 10 минут) не занимали потоки, нужные быстрым запросам вроде
+    GET_SETTINGS, - раньше в таком случае emit_and_wait молча возвращал [] по таймауту.
     """
     
-    def __init__(self, max_workers: int = 5):
+    def __init__(self, max_workers: int = 5, query_workers: int = 4, long_workers: int = 6):
         self._subscribers: Dict[str, List[weakref.ref]] = {}
         self._lock = threading.RLock()
-        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lanes: Dict[str, _Lane] = {
+            LANE_QUERY: _Lane(LANE_QUERY, query_workers),
+            LANE_LONG: _Lane(LANE_LONG, long_workers),
+            LANE_UI: _Lane(LANE_UI, max_workers),
+        }
+        # Событие -> пул; неуказанные события идут в query (emit_and_wait) или ui (emit)
+        self._event_lanes: Dict[str, str] = {}
+        # События, чей единственный обработчик можно вызвать прямо в потоке emit_and_wait
+        self._inline_events: set = set()
         self._event_queue = Queue()
         self._running = True
         self._processor_thread = threading.Thread(target=self._process_events, daemon=True)
@@ -56,8 +131,36 @@ class EventBus:
                 # Для статических функций можно использовать сильные ссылки
                 self._subscribers[event_name].append(callback)
             
-            logger.debug(f"Подписка на событие '{event_name}' добавлена")
+            logger.debug("Подписка на событие '%s' добавлена", event_name)
     
+    def set_lane(self, event_name: str, lane: str, inline: bool = False) -> None:
+        """
+        Закрепляет событие за пулом (LANE_QUERY / LANE_LONG / LANE_UI).
+
+        inline=True - обработчик мгновенный и не берёт чужих замков (геттер состояния): при одном
+        подписчике emit_and_wait вызывает его в своём потоке. Таймаут к такому вызову не применяется,
+        поэтому для всего, что может ждать диск, сеть или замок, флаг не ставится.
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Неизвестный пул событий: {lane}")
+        with self._lock:
+            self._event_lanes[event_name] = lane
+            if inline:
+                self._inline_events.add(event_name)
+            else:
+                self._inline_events.discard(event_name)
+
+    def _lane_for(self, event_name: str, default: str) -> _Lane:
+        return self._lanes[self._event_lanes.get(event_name, default)]
+
+    def lane_workers(self, lane: str) -> int:
+        """Число потоков пула: по нему ограничиваются настройки параллельности."""
+        return self._lanes[lane].max_workers
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Загрузка пулов: потоки, задачи в очереди/в работе, максимум очереди, счётчики."""
+        return {name: lane.metrics() for name, lane in self._lanes.items()}
+
     def unsubscribe(self, event_name: str, callback: Callable) -> None:
         """Отписаться от события"""
         with self._lock:
@@ -85,13 +188,13 @@ class EventBus:
         """
         event = Event(name=event_name, data=data)
         
-        # Добавить отладку
-        with self._lock:
-            subscribers_count = len(self._get_active_subscribers(event_name))
-            if subscribers_count > 0:
-                logger.debug(f"Emitting event '{event_name}' to {subscribers_count} subscribers")
-            else:
-                logger.warning(f"No subscribers for event '{event_name}'")
+        # Без замка: чтение словаря атомарно, а подсчёт подписчиков нужен только для отладки
+        if event_name not in self._subscribers:
+            logger.warning("No subscribers for event '%s'", event_name)
+        elif logger.isEnabledFor(logging.DEBUG):
+            with self._lock:
+                subscribers_count = len(self._get_active_subscribers(event_name))
+            logger.debug("Emitting event '%s' to %d subscribers", event_name, subscribers_count)
         
         if sync:
             self._emit_sync(event)
@@ -102,18 +205,19 @@ class EventBus:
         """
         Отправить событие и дождаться результатов от всех подписчиков
         
+        Если подписчик один, а событие помечено как inline (set_lane(..., inline=True)), он вызывается
+        прямо в текущем потоке. Остальные обработчики выполняются в пуле, и timeout соблюдается.
+
         Returns:
             Список результатов от подписчиков
         """
         results = []
-        result_queue = Queue()
         
         # Создаем специальный wrapper для сбора результатов
         def result_wrapper(callback):
             def wrapper(*args, **kwargs):
                 try:
-                    result = callback(*args, **kwargs)
-                    result_queue.put(result)
+                    return callback(*args, **kwargs)
                 except Exception as e:
                     logger.error("Произошла ошибка в событии, коллектим:")
                     # Логируем с максимальной информацией: имя обработчика, имя события и полный traceback
@@ -127,7 +231,7 @@ class EventBus:
                         f"Ошибка в обработчике '{callback_name}' для {event_name_for_log}: {e}",
                         exc_info=True 
                     )
-                    result_queue.put(None)
+                    return None
             return wrapper
         
         with self._lock:
@@ -135,24 +239,33 @@ class EventBus:
         
         if not subscribers:
             return results
+
+        lane = self._lane_for(event_name, LANE_QUERY)
+        if len(subscribers) == 1 and event_name in self._inline_events:
+            result = result_wrapper(subscribers[0])(Event(name=event_name, data=data))
+            return [result] if result is not None else results
         
         # Запускаем все обработчики
-        for subscriber in subscribers:
-            wrapped = result_wrapper(subscriber)
-            self._executor.submit(wrapped, Event(name=event_name, data=data))
+        pending = {
+            lane.submit(result_wrapper(subscriber), Event(name=event_name, data=data))
+            for subscriber in subscribers
+        }
         
-        # Собираем результаты с таймаутом
-        start_time = time.time()
-        collected = 0
-        
-        while collected < len(subscribers) and (time.time() - start_time) < timeout:
-            try:
-                result = result_queue.get(timeout=0.1)
+        # Собираем результаты с таймаутом (в порядке готовности)
+        deadline = time.time() + timeout
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.warning(
+                    f"emit_and_wait('{event_name}'): {len(pending)} из {len(subscribers)} обработчиков "
+                    f"не ответили за {timeout} сек (пул '{lane.name}': {lane.metrics()})"
+                )
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
                 if result is not None:
                     results.append(result)
-                collected += 1
-            except Empty:
-                continue
         
         return results
     
@@ -161,7 +274,8 @@ class EventBus:
         self._running = False
         self._event_queue.put(None)  # Сигнал для остановки
         self._processor_thread.join(timeout=5)
-        self._executor.shutdown(wait=True)
+        for lane in self._lanes.values():
+            lane.shutdown(wait_for_tasks=True)
     
     def _process_events(self) -> None:
         """Обработчик очереди событий (работает в отдельном потоке)"""
@@ -193,8 +307,9 @@ class EventBus:
         with self._lock:
             subscribers = self._get_active_subscribers(event.name)
         
+        lane = self._lane_for(event.name, LANE_UI)
         for subscriber in subscribers:
-            self._executor.submit(self._safe_call, subscriber, event)
+            lane.submit(self._safe_call, subscriber, event)
     
     def _safe_call(self, callback: Callable, event: Event) -> None:
         """Безопасный вызов обработчика"""
@@ -259,6 +374,10 @@ def get_event_bus() -> EventBus:
     global _global_event_bus
     if _global_event_bus is None:
         _global_event_bus = EventBus()
+        for event_name in LONG_RUNNING_EVENTS:
+            _global_event_bus.set_lane(event_name, LANE_LONG)
+        for event_name in INLINE_EVENTS:
+            _global_event_bus.set_lane(event_name, LANE_QUERY, inline=True)
     return _global_event_bus
 
 
@@ -541,4 +660,37 @@ class Events:
         GET_CURRENT_PRESET_ID = "get_current_preset_id"
         SET_CURRENT_PRESET_ID = "set_current_preset_id"
         UPDATE_PRESET_MODELS = "update_preset_models"
-        SAVE_PRESETS_ORDER = "save_presets_order"
\ No newline at end of file
+        SAVE_PRESETS_ORDER = "save_presets_order"
+
+# Обработчики, которые работают долго (генерация, диалоги с ожиданием пользователя, установка моделей),
+# выполняются в отдельном пуле и не занимают потоки быстрых запросов
+LONG_RUNNING_EVENTS = (
+    Events.Model.GENERATE_RESPONSE,
+    Events.Audio.SHOW_VC_REDIST_DIALOG,
+    Events.Audio.SHOW_TRITON_DIALOG,
+    Events.Audio.REFRESH_VOICE_MODULES,
+    Events.Audio.REFRESH_TRITON_STATUS,
+    Events.Audio.LOCAL_INSTALL_MODEL,
+    Events.Audio.LOCAL_UNINSTALL_MODEL,
+    Events.VoiceModel.INSTALL_MODEL,
+    Events.VoiceModel.UNINSTALL_MODEL,
+    Events.GUI.CHECK_TRITON_DEPENDENCIES,
+    Events.Audio.SELECT_VOICE_MODEL,
+    Events.Audio.INIT_VOICE_MODEL,
+    Events.Audio.CHANGE_VOICE_LANGUAGE,
+    Events.Speech.INSTALL_ASR_MODEL,
+    Events.ApiPresets.TEST_CONNECTION,
+)
+
+# Геттеры, которые возвращают уже готовое состояние в памяти: единственный обработчик
+# вызывается прямо в потоке emit_and_wait, без пула
+INLINE_EVENTS = (
+    Events.Core.GET_EVENT_LOOP,
+    Events.Settings.GET_SETTING,
+    Events.Settings.GET_SETTINGS,
+    Events.Model.GET_LLM_PROCESSING_STATUS,
+    Events.Audio.GET_WAITING_ANSWER,
+    Events.Speech.GET_INSTANT_SEND_STATUS,
+    Events.Server.GET_GAME_CONNECTION,
+    Events.Task.GET_TASK,
+)
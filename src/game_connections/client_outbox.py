@@ -0,0 +1,145 @@
+# File: src/game_connections/client_outbox.py
+"""
+Исходящая очередь одного игрового соединения.
+
+Раньше каждое обновление задачи отправлялось отдельной корутиной прямо в StreamWriter, и медленный
+клиент накапливал в памяти сервера и корутины, и буфер транспорта. Теперь у соединения одна
+очередь и одна корутина-писатель:
+ • сообщения с ключом (обновление задачи, рассылка настроек) схлопываются - в очереди остаётся
+   только последнее состояние, а task_update собирается из задачи в момент отправки;
+ • писатель отправляет накопившуюся пачку и ждёт writer.drain(), поэтому объём неотправленных
+   данных ограничен буфером транспорта и размером очереди;
+ • при переполнении очереди отбрасывается самое старое сообщение без ключа, затем промежуточное
+   состояние задачи, затем сообщение с ключом (счётчик dropped). Итоговое состояние задачи
+   (SUCCESS/FAILED/...) не отбрасывается никогда - иначе клиент не узнал бы о её завершении.
+"""
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from main_logger import logger
+
+DEFAULT_MAX_PENDING = 256
+# Буфер транспорта, после которого drain() начинает ждать клиента
+WRITE_BUFFER_HIGH = 256 * 1024
+
+SCOPE_NONE = "none"  # только ответы на запросы (клиент опрашивает get_task_status)
+SCOPE_OWN = "own"    # обновления задач, созданных этим соединением (по умолчанию)
+SCOPE_ALL = "all"    # обновления всех задач сервера
+SUBSCRIPTION_SCOPES = (SCOPE_NONE, SCOPE_OWN, SCOPE_ALL)
+
+
+class ClientOutbox:
+    def __init__(self, client_id: str, writer: asyncio.StreamWriter,
+                 task_message: Callable[[Any], Dict[str, Any]], max_pending: int = DEFAULT_MAX_PENDING):
+        self.client_id = client_id
+        self.writer = writer
+        self.scope = SCOPE_OWN
+        self.max_pending = max_pending
+        self._task_message = task_message
+        # ключ -> ("task", задача) или ("message", готовый словарь)
+        self._pending: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._unkeyed = itertools.count()
+        self._unkeyed_marker = object()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._writer_task: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+        transport = writer.transport
+        if transport is not None and hasattr(transport, "set_write_buffer_limits"):
+            transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+
+    # ---------- постановка в очередь (только из потока цикла сервера) ----------
+
+    def push_task(self, task) -> None:
+        """Обновление задачи: в очереди остаётся одно, и оно отражает состояние задачи на момент отправки."""
+        self._put(("task", task.uid), ("task", task))
+
+    def push(self, message: Dict[str, Any], key: Optional[Hashable] = None) -> None:
+        """Готовое сообщение; сообщения с одинаковым key заменяют друг друга."""
+        self._put(key if key is not None else (self._unkeyed_marker, next(self._unkeyed)), ("message", message))
+
+    def _put(self, key: Hashable, entry: tuple) -> None:
+        if self._closed:
+            return
+        if key in self._pending:
+            self.coalesced += 1
+            self._pending[key] = entry
+        else:
+            self._pending[key] = entry
+            if len(self._pending) > self.max_pending:
+                self._drop_one()
+        self._wakeup.set()
+
+    def _drop_one(self) -> None:
+        victim = self._pick_victim()
+        if victim is None:
+            # В очереди только итоговые состояния задач: лучше превысить лимит, чем потерять их
+            return
+        del self._pending[victim]
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            logger.warning(f"Клиент {self.client_id} не успевает читать: отброшено {self.dropped} сообщений")
+
+    def _pick_victim(self) -> Optional[Hashable]:
+        """Самое старое сообщение без ключа, иначе промежуточное состояние задачи, иначе сообщение с ключом."""
+        oldest_task = oldest_keyed = None
+        for key, (kind, payload) in self._pending.items():
+            if kind == "task":
+                if oldest_task is None and not payload.is_final:
+                    oldest_task = key
+            elif isinstance(key, tuple) and key and key[0] is self._unkeyed_marker:
+                return key
+            elif oldest_keyed is None:
+                oldest_keyed = key
+        return oldest_task if oldest_task is not None else oldest_keyed
+
+    # ---------- писатель ----------
+
+    def start(self) -> None:
+        self._writer_task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        try:
+            while not self._closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._pending and not self._closed:
+                    _, (kind, payload) = self._pending.popitem(last=False)
+                    message = self._task_message(payload) if kind == "task" else payload
+                    self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+                    self.sent += 1
+                    if not self._pending or self.writer.transport.get_write_buffer_size() >= WRITE_BUFFER_HIGH:
+                        await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка отправки клиенту {self.client_id}: {e}")
+        finally:
+            self._closed = True
+            self._pending.clear()
+
+    async def close(self) -> None:
+        self._closed = True
+        self._pending.clear()
+        self._wakeup.set()
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
@@ -1,25 +1,34 @@
 # File: src/game_connections/server.py
 import json
 import asyncio
+import concurrent.futures
 import threading
 from typing import Optional, Dict, Any, Set
 from main_logger import logger
-from core.events import get_event_bus, Events, Event
-from managers.task_manager import TaskStatus
+from core.events import get_event_bus, Events, Event, LANE_LONG
+from managers.task_manager import TaskStatus, FINAL_STATUSES, get_task_manager
+from game_connections.client_outbox import ClientOutbox, SCOPE_ALL, SCOPE_NONE, SCOPE_OWN, SUBSCRIPTION_SCOPES
 import uuid
 
+IDLE_PROMPT = "The player has been silent for 90 seconds. React naturally to this silence."
+# Потоки пула long, не отдаваемые игровым генерациям
+LONG_LANE_RESERVE = 2
+
 
 class ChatServerNew:
     def __init__(self, host='127.0.0.1', port=12345):
         self.host = host
         self.port = port
         self.active_connections: Dict[str, asyncio.StreamWriter] = {}
+        # Всё исходящее идёт через очередь соединения (схлопывание обновлений, drain)
+        self._outboxes: Dict[str, ClientOutbox] = {}
         self.event_bus = get_event_bus()
         self.running = False
         self._loop = None
         self._server_thread = None
         self._server_task = None
-        self.client_tasks: Dict[str, Set[str]] = {}
+        # Индекс клиент -> задачи ведёт TaskManager (и чистит его вместе с задачами)
+        self.task_manager = get_task_manager()
         self.last_idle_tasks: Dict[str, str] = {}
         self.pending_sysinfo: Dict[str, list[str]] = {}
 
@@ -27,6 +36,21 @@ class ChatServerNew:
         self.game_block_level: str = 'Idle events'
         self.game_master_voice: bool = False
 
+        # Генерации из игры: у каждого персонажа своя очередь (ответы персонажа идут по порядку),
+        # разные персонажи отвечают параллельно, но не больше max_parallel_generations сразу
+        self.max_parallel_generations: int = 2
+        self._character_queues: Dict[str, asyncio.Queue] = {}
+        self._queue_workers: Set[asyncio.Task] = set()
+        self._running_generations = 0
+        self._generation_slots: Optional[asyncio.Condition] = None
+
+        # Фоновые события (idle_timeout, system_info_flush) персонажа, пришедшие в течение окна,
+        # объединяются в одну задачу; ответ игрока отменяет ещё не начатые фоновые задачи
+        self.coalesce_window_ms: int = 300
+        self._coalescing: Dict[str, Dict[str, Any]] = {}
+        self._background_tasks: Dict[str, Set[str]] = {}
+        self._superseded_tasks: Set[str] = set()
+
         self._subscribe_to_events()
 
     def _subscribe_to_events(self):
@@ -35,6 +59,7 @@ class ChatServerNew:
 
     async def start_async(self):
         self.running = True
+        self._generation_slots = asyncio.Condition()
         self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
         addrs = ', '.join(str(sock.getsockname()) for sock in self.server.sockets)
         logger.info(f'Новый сервер запущен на {addrs}')
@@ -61,7 +86,9 @@ class ChatServerNew:
         logger.info(f"Новое подключение от {client_id}")
 
         self.active_connections[client_id] = writer
-        self.client_tasks[client_id] = set()
+        outbox = ClientOutbox(client_id, writer, self._task_update_message)
+        self._outboxes[client_id] = outbox
+        outbox.start()
         self.event_bus.emit(Events.Server.SET_GAME_CONNECTION, {'is_connected': True})
 
         buffer = bytearray()
@@ -96,11 +123,17 @@ class ChatServerNew:
             logger.error(f"Ошибка в handle_client: {e}", exc_info=True)
         finally:
             self.active_connections.pop(client_id, None)
-            if client_id in self.client_tasks:
-                del self.client_tasks[client_id]
+            self.task_manager.forget_client(client_id)
+            outbox = self._outboxes.pop(client_id, None)
+            if outbox:
+                await outbox.close()
             writer.close()
-            await writer.wait_closed()
-            logger.info(f"Клиент {client_id} отключился")
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            logger.info(f"Клиент {client_id} отключился" + (f" ({outbox.metrics()})" if outbox else ""))
+            logger.debug(f"Задачи после отключения {client_id}: {self.task_manager.metrics()}")
             if not self.active_connections:
                 self.event_bus.emit(Events.Server.SET_GAME_CONNECTION, {'is_connected': False})
 
@@ -113,8 +146,25 @@ class ChatServerNew:
             await self.handle_get_task_status(request, client_id)
         elif action == 'get_settings':
             await self.handle_get_settings(request, client_id)
+        elif action == 'subscribe':
+            await self.handle_subscribe(request, client_id)
         else:
-            await self.send_error(self.active_connections[client_id], f"Unknown action: {action}")
+            await self.send_error(client_id, f"Unknown action: {action}")
+
+    async def handle_subscribe(self, request: Dict[str, Any], client_id: str):
+        """
+        Режим доставки обновлений задач: "own" - задачи этого соединения (по умолчанию),
+        "all" - все задачи сервера, "none" - без рассылки, только ответы на get_task_status.
+        """
+        scope = request.get('scope', SCOPE_OWN)
+        if scope not in SUBSCRIPTION_SCOPES:
+            await self.send_error(client_id, f"Unknown subscription scope: {scope}")
+            return
+        outbox = self._outboxes.get(client_id)
+        if outbox:
+            outbox.scope = scope
+            outbox.push({"type": "subscribed", "scope": scope})
+            logger.info(f"Клиент {client_id}: подписка на обновления задач '{scope}'")
 
     async def handle_get_settings(self, request: Dict[str, Any], client_id: str):
         # Просто инициируем загрузку/рассылку настроек — контроллер соберёт и отправит всем
@@ -134,10 +184,9 @@ class ChatServerNew:
         return False
 
     async def _send_aborted_update(self, client_id: str, event_type: str, character: str, reason: str = 'Blocked by settings', req_id: Optional[str] = None):
-        if client_id not in self.active_connections:
+        if client_id not in self._outboxes:
             return
 
-        writer = self.active_connections[client_id]
         uid = f"abrt_{uuid.uuid4().hex}"
 
         body = {
@@ -162,7 +211,7 @@ class ChatServerNew:
             "status": TaskStatus.ABORTED.value,
             "body": body
         }
-        await self.send_json(writer, message)
+        self._outboxes[client_id].push(message)
         logger.info(f"Отправлен ABORTED для {event_type} ({character})")
 
     async def handle_create_task(self, request: Dict[str, Any], client_id: str):
@@ -172,15 +221,18 @@ class ChatServerNew:
         context = request.get('context', {})
         req_id = request.get('req_id', None)
 
+        # Окно чата переключается на персонажа из игры, но генерация идёт по character_id
+        # и со снимком game_data, поэтому параллельные запросы не зависят от этого переключения
         self.event_bus.emit(Events.Model.SET_CHARACTER_TO_CHANGE, {'character': character})
 
-        self.event_bus.emit(Events.Server.SET_GAME_DATA, {
+        game_data = {
             'distance': float(str(context.get('distance', '0')).replace(',', '.')),
             'roomPlayer': int(context.get('roomPlayer', 0)),
             'roomMita': int(context.get('roomMita', 0)),
             'nearObjects': context.get('hierarchy', ''),
             'actualInfo': context.get('currentInfo', '')
-        })
+        }
+        self.event_bus.emit(Events.Server.SET_GAME_DATA, game_data)
 
         if self._should_block_event(event_type):
             await self._send_aborted_update(client_id, event_type, character, req_id=req_id)
@@ -188,6 +240,7 @@ class ChatServerNew:
 
         if event_type == 'answer':
             user_input = data.get('message', '')
+            self._supersede_background(character)
 
             if user_input:
                 self.event_bus.emit(Events.GUI.UPDATE_CHAT_UI, {
@@ -215,19 +268,27 @@ class ChatServerNew:
             task = task_result[0] if task_result else None
 
             if task:
-                self.client_tasks[client_id].add(task.uid)
                 await self.send_task_update(client_id, task)
 
-                self.event_bus.emit(Events.Chat.SEND_MESSAGE, {
+                self._enqueue_generation(character, {
                     'user_input': user_input,
                     'system_input': collected_sys,
                     'image_data': context.get('image_base64_list', []),
-                    'task_uid': task.uid
+                    'task_uid': task.uid,
+                    'character_id': character,
+                    'game_data': game_data
                 })
             else:
                 await self._send_aborted_update(client_id, event_type, character, reason="Failed to create task", req_id=req_id)
 
         elif event_type == 'idle_timeout':
+            entry = self._coalescing.get(character)
+            if entry:
+                entry['idle'] = True
+                entry['game_data'] = game_data
+                await self._reply_with_coalesced(client_id, entry)
+                return
+
             last_idle_uid = self.last_idle_tasks.get(character)
             if last_idle_uid:
                 last_task_result = self.event_bus.emit_and_wait(Events.Task.GET_TASK, {
@@ -239,14 +300,11 @@ class ChatServerNew:
                     await self.send_task_update(client_id, last_task)
                     return
 
-            collected_sys = "\n".join(self.pending_sysinfo.pop(character, []))
-
             task_result = self.event_bus.emit_and_wait(Events.Task.CREATE_TASK, {
                 'type': 'idle',
                 'data': {
                     'character': character,
                     'message': data.get('message', 'Player idle for 90 seconds'),
-                    'system_input': collected_sys,
                     'client_id': client_id,
                     'event_type': event_type,
                     'req_id': req_id
@@ -256,20 +314,9 @@ class ChatServerNew:
             task = task_result[0] if task_result else None
 
             if task:
-                self.client_tasks[client_id].add(task.uid)
                 self.last_idle_tasks[character] = task.uid
                 await self.send_task_update(client_id, task)
-
-                idle_prompt = "The player has been silent for 90 seconds. React naturally to this silence."
-                if collected_sys:
-                    idle_prompt += f"\n\nAdditional context:\n{collected_sys}"
-
-                self.event_bus.emit(Events.Chat.SEND_MESSAGE, {
-                    'user_input': '',
-                    'system_input': idle_prompt,
-                    'image_data': [],
-                    'task_uid': task.uid
-                })
+                self._start_coalescing(character, task, idle=True, game_data=game_data)
             else:
                 await self._send_aborted_update(client_id, event_type, character, reason="Failed to create idle task", req_id=req_id)
 
@@ -282,15 +329,19 @@ class ChatServerNew:
                 self.pending_sysinfo.setdefault(character, []).append(msg)
                 logger.info(f"Buffered system_info for {character}: {msg[:60]}...")
 
-            await self.send_json(self.active_connections[client_id], {
+            self._send(client_id, {
                 "type": "info",
                 "stored": len(self.pending_sysinfo.get(character, []))
             })
 
         elif event_type == 'system_info_flush':
-            collected_sys = "\n".join(self.pending_sysinfo.pop(character, []))
+            entry = self._coalescing.get(character)
+            if entry:
+                entry['game_data'] = game_data
+                await self._reply_with_coalesced(client_id, entry)
+                return
 
-            if not collected_sys:
+            if not self.pending_sysinfo.get(character):
                 await self._send_aborted_update(client_id, event_type, character, reason="No pending system_info to flush", req_id=req_id)
                 return
 
@@ -299,7 +350,6 @@ class ChatServerNew:
                 'data': {
                     'character': character,
                     'user_input': '',
-                    'system_input': collected_sys,
                     'system_info': context.get('currentInfo', ''),
                     'client_id': client_id,
                     'event_type': event_type,
@@ -309,26 +359,151 @@ class ChatServerNew:
 
             task = task_result[0] if task_result else None
             if task:
-                self.client_tasks[client_id].add(task.uid)
                 await self.send_task_update(client_id, task)
-
-                self.event_bus.emit(Events.Chat.SEND_MESSAGE, {
-                    'user_input': '',
-                    'system_input': collected_sys,
-                    'image_data': [],
-                    'task_uid': task.uid
-                })
+                self._start_coalescing(character, task, idle=False, game_data=game_data)
             else:
                 await self._send_aborted_update(client_id, event_type, character, reason="Failed to flush system info", req_id=req_id)
 
         else:
             await self._send_aborted_update(client_id, event_type, character, reason=f"Unknown event type: {event_type}", req_id=req_id)
 
+    def _start_coalescing(self, character: str, task, idle: bool, game_data: Dict[str, Any]):
+        """
+        Откладывает фоновую задачу на coalesce_window_ms: повторные idle_timeout/system_info_flush
+        этого персонажа присоединяются к ней, system_info за это время попадают в её контекст.
+        """
+        entry = {'task': task, 'idle': idle, 'game_data': game_data, 'handle': None}
+        self._coalescing[character] = entry
+        window = max(0, self.coalesce_window_ms) / 1000.0
+        if window:
+            entry['handle'] = self._loop.call_later(window, self._dispatch_coalesced, character)
+        else:
+            self._dispatch_coalesced(character)
+
+    async def _reply_with_coalesced(self, client_id: str, entry: Dict[str, Any]):
+        task = entry['task']
+        self.task_manager.link_client(client_id, task.uid)
+        await self.send_task_update(client_id, task)
+        logger.debug(f"Событие объединено с задачей {task.uid}")
+
+    def _dispatch_coalesced(self, character: str):
+        entry = self._coalescing.pop(character, None)
+        if not entry:
+            return
+        task = entry['task']
+        collected_sys = "\n".join(self.pending_sysinfo.pop(character, []))
+
+        if entry['idle']:
+            system_input = IDLE_PROMPT
+            if collected_sys:
+                system_input += f"\n\nAdditional context:\n{collected_sys}"
+        elif collected_sys:
+            system_input = collected_sys
+        else:
+            self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
+                'uid': task.uid,
+                'status': TaskStatus.ABORTED,
+                'error': "No pending system_info to flush"
+            })
+            return
+
+        self._background_tasks.setdefault(character, set()).add(task.uid)
+        self._enqueue_generation(character, {
+            'user_input': '',
+            'system_input': system_input,
+            'image_data': [],
+            'task_uid': task.uid,
+            'character_id': character,
+            'game_data': entry['game_data']
+        })
+
+    def _supersede_background(self, character: str):
+        """
+        Ответ игрока делает фоновые задачи персонажа неактуальными. Неотправленная задача
+        отменяется (её system_info войдут в ответ), стоящие в очереди idle/flush-задачи
+        пропускаются, а уже генерирующиеся бросают запрос к API (ChatModel проверяет отмену
+        задачи) и не пишут ответ в историю - ответ игрока не ждёт устаревшую реплику.
+        """
+        uids = []
+        entry = self._coalescing.pop(character, None)
+        if entry:
+            if entry['handle']:
+                entry['handle'].cancel()
+            uids.append(entry['task'].uid)
+        # В _superseded_tasks только задачи из очереди: обработчик очереди их оттуда и удалит
+        queued = self._background_tasks.pop(character, set())
+        self._superseded_tasks.update(queued)
+        uids.extend(queued)
+
+        for uid in uids:
+            self.event_bus.emit(Events.Task.UPDATE_TASK_STATUS, {
+                'uid': uid,
+                'status': TaskStatus.CANCELLED,
+                'error': "Superseded by player message"
+            })
+        if uids:
+            logger.info(f"Ответ игрока отменил {len(uids)} фоновых задач(и) {character}")
+
+    def _enqueue_generation(self, character: str, payload: Dict[str, Any]):
+        """Ставит генерацию в очередь персонажа; обработчик очереди запускается при первой задаче."""
+        queue = self._character_queues.get(character)
+        if queue is None:
+            queue = self._character_queues[character] = asyncio.Queue()
+            worker = asyncio.ensure_future(self._run_character_queue(character, queue))
+            self._queue_workers.add(worker)
+            worker.add_done_callback(self._queue_workers.discard)
+        queue.put_nowait(payload)
+        if queue.qsize() > 1:
+            logger.info(f"Запрос для {character} ждёт в очереди персонажа ({queue.qsize()} в очереди)")
+
+    async def _run_character_queue(self, character: str, queue: asyncio.Queue):
+        while True:
+            payload = await queue.get()
+            task_uid = payload.get('task_uid')
+            if task_uid in self._superseded_tasks:
+                self._superseded_tasks.discard(task_uid)
+                logger.debug(f"Задача {task_uid} отменена до начала генерации")
+            else:
+                await self._acquire_generation_slot()
+                try:
+                    # Ответ приходит через future: поток шины не ждёт генерацию и озвучку,
+                    # иначе 4 игровых запроса занимали весь пул query и CREATE_TASK получал []
+                    result = concurrent.futures.Future()
+                    self.event_bus.emit(Events.Chat.SEND_MESSAGE, {**payload, 'future': result})
+                    await asyncio.wait_for(asyncio.wrap_future(result), timeout=660.0)
+                except Exception as e:
+                    logger.error(f"Ошибка генерации для {character}: {e}", exc_info=True)
+                finally:
+                    await self._release_generation_slot()
+                    self._superseded_tasks.discard(task_uid)
+                    background = self._background_tasks.get(character)
+                    if background is not None:
+                        background.discard(task_uid)
+            queue.task_done()
+
+            # Проверка и удаление без await между ними: новая задача не потеряется
+            if queue.empty():
+                if self._character_queues.get(character) is queue:
+                    del self._character_queues[character]
+                return
+
+    async def _acquire_generation_slot(self):
+        async with self._generation_slots:
+            await self._generation_slots.wait_for(
+                lambda: self._running_generations < max(1, self.max_parallel_generations)
+            )
+            self._running_generations += 1
+
+    async def _release_generation_slot(self):
+        async with self._generation_slots:
+            self._running_generations -= 1
+            self._generation_slots.notify_all()
+
     async def handle_get_task_status(self, request: Dict[str, Any], client_id: str):
         task_uid = request.get('task_uid')
 
         if not task_uid:
-            await self.send_error(self.active_connections[client_id], "Missing task_uid")
+            await self.send_error(client_id, "Missing task_uid")
             return
 
         task_result = self.event_bus.emit_and_wait(Events.Task.GET_TASK, {
@@ -358,90 +533,87 @@ class ChatServerNew:
                     Events.Settings.GET_SETTING, {'key': 'GM_VOICE'}, timeout=1.0
                 )[0]
 
-            await self.send_json(self.active_connections[client_id], response)
+            # Повторные опросы одной задачи, не успевшие уйти клиенту, схлопываются
+            self._send(client_id, response, key=('status', task_uid))
         else:
-            await self.send_error(self.active_connections[client_id], f"Task {task_uid} not found")
+            await self.send_error(client_id, f"Task {task_uid} not found")
 
     def _on_task_status_changed(self, event: Event):
         task = event.data.get('task')
         if not task or not getattr(task, 'data', None):
             return
 
-        client_id = task.data.get('client_id')
         character = task.data.get('character')
         event_type = task.data.get('event_type')
 
-        if client_id and client_id in self.active_connections:
-            asyncio.run_coroutine_threadsafe(
-                self.send_task_update(client_id, task),
-                self._loop
-            )
+        self._schedule_task_push(task)
 
         if event_type in ('idle', 'idle_timeout') and character:
-            if task.status in (TaskStatus.SUCCESS,
-                               TaskStatus.FAILED,
-                               TaskStatus.CANCELLED,
-                               TaskStatus.FAILED_ON_GENERATION,
-                               TaskStatus.FAILED_ON_VOICEOVER,
-                               TaskStatus.ABORTED):
+            if task.status in FINAL_STATUSES:
                 if self.last_idle_tasks.get(character) == task.uid:
                     del self.last_idle_tasks[character]
 
     def _on_send_task_update(self, event: Event):
         task = event.data.get('task')
         if task and hasattr(task, 'data') and task.data:
-            client_id = task.data.get('client_id')
-            if client_id and client_id in self.active_connections:
-                asyncio.run_coroutine_threadsafe(
-                    self.send_task_update(client_id, task),
-                    self._loop
-                )
-
-    async def send_task_update(self, client_id: str, task):
-        if client_id not in self.active_connections:
-            return
+            self._schedule_task_push(task)
 
-        writer = self.active_connections[client_id]
-
-        message = {
+    def _schedule_task_push(self, task):
+        """Вызывается из потоков EventBus: сама постановка в очереди выполняется в цикле сервера."""
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._push_task_update, task)
+
+    def _push_task_update(self, task):
+        owner = task.data.get('client_id') if task.data else None
+        for client_id, outbox in self._outboxes.items():
+            if outbox.scope == SCOPE_NONE:
+                continue
+            if outbox.scope == SCOPE_ALL or client_id == owner or self.task_manager.client_has_task(client_id, task.uid):
+                outbox.push_task(task)
+
+    @staticmethod
+    def _task_update_message(task) -> Dict[str, Any]:
+        # Собирается при отправке: клиент получает последнее состояние задачи
+        return {
             "type": "task_update",
             "uid": task.uid,
             "status": task.status.value,
             "body": task.to_dict()
         }
-        await self.send_json(writer, message)
+
+    async def send_task_update(self, client_id: str, task):
+        outbox = self._outboxes.get(client_id)
+        if outbox:
+            outbox.push_task(task)
 
     def broadcast_loaded_settings(self, body: Dict[str, Any]):
         if not (self._loop and self._loop.is_running()):
             return
 
-        async def _push():
-            if not self.active_connections:
+        def _push():
+            if not self._outboxes:
                 return
             message = {
                 "type": "loaded_settings",
                 "body": body
             }
-            writers = list(self.active_connections.values())
-            await asyncio.gather(*(self.send_json(w, message) for w in writers), return_exceptions=True)
-            logger.debug(f"Broadcasted loaded_settings to {len(self.active_connections)} client(s)")
+            # Неотправленная рассылка заменяется более свежей
+            for outbox in self._outboxes.values():
+                outbox.push(message, key='loaded_settings')
+            logger.debug(f"Broadcasted loaded_settings to {len(self._outboxes)} client(s)")
 
         try:
-            asyncio.run_coroutine_threadsafe(_push(), self._loop)
+            self._loop.call_soon_threadsafe(_push)
         except Exception as e:
             logger.warning(f"Не удалось запланировать рассылку loaded_settings: {e}")
 
-    async def send_json(self, writer: asyncio.StreamWriter, data: Dict[str, Any]):
-        try:
-            json_str = json.dumps(data)
-            writer.write(json_str.encode('utf-8'))
-            writer.write(b'\n')
-            await writer.drain()
-        except Exception as e:
-            logger.error(f"Ошибка отправки JSON: {e}")
+    def _send(self, client_id: str, data: Dict[str, Any], key=None):
+        outbox = self._outboxes.get(client_id)
+        if outbox:
+            outbox.push(data, key=key)
 
-    async def send_error(self, writer: asyncio.StreamWriter, error: str):
-        await self.send_json(writer, {"type": "error", "error": error})
+    async def send_error(self, client_id: str, error: str):
+        self._send(client_id, {"type": "error", "error": error})
 
     def stop(self):
         self.running = False
@@ -463,6 +635,10 @@ class ChatServerNew:
             self.server.close()
             await self.server.wait_closed()
 
+        for outbox in list(self._outboxes.values()):
+            await outbox.close()
+        self._outboxes.clear()
+
         for writer in list(self.active_connections.values()):
             try:
                 writer.close()
@@ -480,4 +656,24 @@ class ChatServerNew:
         self.game_block_level = str(value) if value is not None else 'Idle events'
 
     def set_game_master_voice(self, value: bool):
-        self.game_master_voice = bool(value)
\ No newline at end of file
+        self.game_master_voice = bool(value)
+
+    def set_coalesce_window_ms(self, value: int):
+        self.coalesce_window_ms = max(0, int(value))
+
+    def set_max_parallel_generations(self, value: int):
+        # Каждая генерация держит поток пула long (GENERATE_RESPONSE); часть пула оставляем
+        # генерации из окна чата, диалогам и установкам моделей
+        limit = max(1, self.event_bus.lane_workers(LANE_LONG) - LONG_LANE_RESERVE)
+        value = max(1, int(value))
+        if value > limit:
+            logger.warning(f"GAME_MAX_PARALLEL_GENERATIONS={value} больше допустимого, используется {limit}")
+            value = limit
+        self.max_parallel_generations = value
+        # Ожидающие очереди персонажей перепроверяют лимит
+        if self._loop and self._loop.is_running() and self._generation_slots is not None:
+            asyncio.run_coroutine_threadsafe(self._notify_generation_slots(), self._loop)
+
+    async def _notify_generation_slots(self):
+        async with self._generation_slots:
+            self._generation_slots.notify_all()
\ No newline at end of file
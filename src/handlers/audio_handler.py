@@ -1,21 +1,26 @@
 import asyncio
 import os
 import threading
+from typing import AsyncIterable, Optional, Tuple
 
-import pygame
+import numpy as np
 
 from main_logger import logger
+from handlers.audio_output_stream import AudioOutputStream
 
 
 class AudioHandler:
     _lock = threading.Lock()
+    # Общий поток вывода: открывается при первом проигрывании и живёт между репликами
+    _output: Optional[AudioOutputStream] = None
+    _output_unavailable = False
 
     @classmethod
     async def handle_voice_file(cls, file_path, delete :bool = True):
-        """Проигрывает звуковой файл (MP3 или OGG)."""
+        """Проигрывает звуковой файл (WAV, OGG, MP3)."""
         try:
             logger.info(f"Проигрываю файл: {file_path}")
-            await cls.play_audio_with_pygame(file_path)
+            await cls.play_audio_file(file_path)
             if os.path.exists(file_path) and delete:
                 try:
                     await asyncio.sleep(0.02)
@@ -26,11 +31,59 @@ class AudioHandler:
         except Exception as e:
             logger.info(f"Ошибка при воспроизведении файла: {e}")
 
+    @classmethod
+    def get_output(cls) -> Optional[AudioOutputStream]:
+        """Постоянный поток вывода или None, если sounddevice недоступен (тогда играет pygame)."""
+        if cls._output is None and not cls._output_unavailable:
+            try:
+                import sounddevice  # noqa: F401
+                cls._output = AudioOutputStream()
+            except Exception as e:
+                logger.warning(f"sounddevice недоступен, воспроизведение через pygame: {e}")
+                cls._output_unavailable = True
+        return cls._output
+
+    @classmethod
+    async def play_audio_file(cls, file_path):
+        """Декодирует файл в память и проигрывает через общий поток; при ошибке - через pygame."""
+        output = cls.get_output()
+        if output is not None:
+            try:
+                audio, sample_rate = await asyncio.to_thread(cls.read_audio, file_path)
+                await output.enqueue(audio, sample_rate).wait()
+                return
+            except Exception as e:
+                logger.warning(f"Не удалось проиграть {file_path} через поток вывода ({e}), пробую pygame.")
+        await cls.play_audio_with_pygame(file_path)
+
+    @classmethod
+    async def play_segments(cls, segments: AsyncIterable[Tuple[np.ndarray, int]]):
+        """
+        Проигрывает сегменты (например, предложения) по мере их готовности: первый начинает звучать сразу,
+        следующие встают в очередь вплотную к предыдущим и играют без пауз. Используется локальной
+        озвучкой в чате: предложения синтезируются по одному, пока звучат предыдущие.
+        """
+        output = cls.get_output()
+        if output is None:
+            raise RuntimeError("Поток вывода звука недоступен.")
+        last_handle = None
+        async for audio, sample_rate in segments:
+            last_handle = output.enqueue(audio, sample_rate)
+        if last_handle is not None:
+            await last_handle.wait()
+
+    @staticmethod
+    def read_audio(file_path):
+        import soundfile as sf
+        audio, sample_rate = sf.read(file_path, dtype="float32", always_2d=True)
+        return audio, sample_rate
+
     @classmethod
     async def play_audio_with_pygame(self, file_path):
-        """Проигрывает аудиофайл."""
+        """Проигрывает аудиофайл через pygame (запасной путь для форматов, которые не читает soundfile)."""
 
         def play():
+            import pygame
             with AudioHandler._lock:
                 pygame.mixer.init()
                 pygame.mixer.music.load(file_path)  # Pygame поддерживает MP3 и OGG
@@ -40,4 +93,4 @@ class AudioHandler:
                 pygame.mixer.music.stop()
                 pygame.mixer.quit()
 
-        await asyncio.to_thread(play)  # Запуск в отдельном потоке
\ No newline at end of file
+        await asyncio.to_thread(play)  # Запуск в отдельном потоке
@@ -0,0 +1,218 @@
+# handlers/audio_output_stream.py
+"""
+AudioOutputStream - постоянный поток вывода звука с очередью PCM-буферов.
+
+Раньше каждый файл проигрывался так: pygame.mixer.init() -> load -> play -> опрос get_busy() -> quit(),
+под общим замком. Открытие устройства на каждую реплику давало задержку и щелчки, а играть можно
+было только готовый файл целиком. Здесь устройство открывается один раз (sounddevice/PortAudio),
+буферы складываются в очередь и проигрываются подряд без пауз между ними - сегменты одной реплики
+(предложения) склеиваются бесшовно, а воспроизведение начинается, как только пришёл первый буфер.
+
+Поток закрывается сам после простоя, чтобы не держать устройство занятым.
+Для проверок без звуковой карты есть NullOutputStream - та же схема с колбэком, но кадры
+складываются в память (stream_factory=NullOutputStream).
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from main_logger import logger
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCK_SIZE = 1024
+IDLE_CLOSE_SECONDS = 30.0
+
+
+class PlaybackHandle:
+    """Отметка о проигрывании одного буфера: done выставляется, когда последний кадр ушёл в устройство."""
+
+    def __init__(self, frames: int):
+        self.frames = frames
+        self.done = threading.Event()
+        self.cancelled = False
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        return await asyncio.to_thread(self.done.wait, timeout)
+
+
+class NullOutputStream:
+    """Замена sd.OutputStream без устройства: колбэк вызывается в своём потоке, вывод копится в captured."""
+
+    def __init__(self, samplerate: int, channels: int, dtype: str, blocksize: int, callback: Callable,
+                 realtime: bool = False, **_kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.callback = callback
+        self.realtime = realtime
+        self.captured = []
+        self.active = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="NullAudioOutput", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        block_duration = self.blocksize / self.samplerate
+        while self.active:
+            outdata = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+            self.callback(outdata, self.blocksize, None, None)
+            self.captured.append(outdata.copy())
+            time.sleep(block_duration if self.realtime else 0.001)
+
+    def stop(self):
+        self.active = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def close(self):
+        self.stop()
+
+
+def _sounddevice_stream(**kwargs):
+    import sounddevice as sd
+    return sd.OutputStream(**kwargs)
+
+
+def fit_to_stream(audio, sample_rate: int) -> np.ndarray:
+    """Приводит аудио к формату потока: float32, (кадры, 2), 44100 Гц."""
+    from handlers.voice_models.pipelines.audio_chain import resample
+
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 1:
+        audio = audio[:, np.newaxis]
+    elif audio.shape[0] <= 8 < audio.shape[1]:
+        # (каналы, кадры) от torch
+        audio = audio.T
+    if sample_rate != SAMPLE_RATE:
+        audio = np.stack([resample(np.ascontiguousarray(audio[:, ch]), sample_rate, SAMPLE_RATE)
+                          for ch in range(audio.shape[1])], axis=1)
+    if audio.shape[1] == 1:
+        audio = np.repeat(audio, CHANNELS, axis=1)
+    elif audio.shape[1] > CHANNELS:
+        audio = audio[:, :CHANNELS]
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+class AudioOutputStream:
+    def __init__(self, stream_factory: Callable = None, idle_close_seconds: float = IDLE_CLOSE_SECONDS):
+        self._stream_factory = stream_factory or _sounddevice_stream
+        self.idle_close_seconds = idle_close_seconds
+        self._stream = None
+        # (буфер, позиция, handle)
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._idle_timer: Optional[threading.Timer] = None
+
+    # ---------- публичное API ----------
+
+    def enqueue(self, audio, sample_rate: int) -> PlaybackHandle:
+        """Ставит буфер в очередь сразу за предыдущими (без паузы) и открывает устройство при необходимости."""
+        buffer = fit_to_stream(audio, sample_rate)
+        handle = PlaybackHandle(buffer.shape[0])
+        if buffer.shape[0] == 0:
+            handle.done.set()
+            return handle
+        with self._lock:
+            self._cancel_idle_timer_locked()
+            self._queue.append([buffer, 0, handle])
+            self._ensure_stream_locked()
+        return handle
+
+    def clear(self):
+        """Прерывает текущее воспроизведение и выбрасывает очередь."""
+        with self._lock:
+            for _buffer, _pos, handle in self._queue:
+                handle.cancelled = True
+                handle.done.set()
+            self._queue.clear()
+            if self._stream is not None:
+                self._schedule_idle_close_locked()
+
+    def close(self):
+        self.clear()
+        with self._lock:
+            self._cancel_idle_timer_locked()
+            stream, self._stream = self._stream, None
+        self._shutdown_stream(stream)
+
+    @property
+    def is_playing(self) -> bool:
+        with self._lock:
+            return bool(self._queue)
+
+    @property
+    def stream(self):
+        return self._stream
+
+    # ---------- внутреннее ----------
+
+    def _ensure_stream_locked(self):
+        if self._stream is not None:
+            return
+        self._stream = self._stream_factory(
+            samplerate=SAMPLE_RATE, channels=CHANNELS, dtype="float32",
+            blocksize=BLOCK_SIZE, callback=self._callback
+        )
+        self._stream.start()
+        logger.info("Открыт поток вывода звука")
+
+    @staticmethod
+    def _shutdown_stream(stream):
+        # stop() ждёт завершения колбэка, а колбэк берёт _lock - поэтому вызывается вне замка
+        if stream is None:
+            return
+        try:
+            stream.stop()
+            stream.close()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии потока вывода звука: {e}")
+        logger.info("Поток вывода звука закрыт")
+
+    def _callback(self, outdata, frames, _time_info, _status):
+        written = 0
+        finished = []
+        with self._lock:
+            while written < frames and self._queue:
+                item = self._queue[0]
+                buffer, position, handle = item
+                chunk = min(frames - written, buffer.shape[0] - position)
+                outdata[written:written + chunk] = buffer[position:position + chunk]
+                written += chunk
+                item[1] = position + chunk
+                if item[1] >= buffer.shape[0]:
+                    self._queue.popleft()
+                    finished.append(handle)
+            if written < frames:
+                outdata[written:] = 0
+            if finished and not self._queue:
+                self._schedule_idle_close_locked()
+        for handle in finished:
+            handle.done.set()
+
+    def _schedule_idle_close_locked(self):
+        self._cancel_idle_timer_locked()
+        if self.idle_close_seconds is None:
+            return
+        self._idle_timer = threading.Timer(self.idle_close_seconds, self._close_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer_locked(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _close_if_idle(self):
+        with self._lock:
+            if self._queue:
+                return
+            stream, self._stream = self._stream, None
+        self._shutdown_stream(stream)
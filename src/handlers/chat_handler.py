@@ -7,10 +7,13 @@ import time
 #import tiktoken
 import re
 import importlib
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Callable
 from io import BytesIO # Добавлено для обработки изображений
 from tools.manager import ToolManager,mk_tool_call_msg,mk_tool_resp_msg
-from main_logger import logger
+from main_logger import get_logger, lazy
+
+logger = get_logger("chat")
 
 from characters import CrazyMita, KindMita, ShortHairMita, \
     CappyMita, MilaMita, CreepyMita, SleepyMita, GameMaster, \
@@ -18,12 +21,21 @@ from characters import CrazyMita, KindMita, ShortHairMita, \
 from characters.character import Character
 from utils.pip_installer import PipInstaller
 
-from utils import SH, save_combined_messages # Keep utils
+from utils import SH # Keep utils
+from utils.request_dump import request_dumper
 from utils import _ as translate
 
 from core.events import get_event_bus, Events
 
+
+class GenerationCancelled(Exception):
+    """Задачу генерации отменили (например, ответ игрока сделал idle-реплику неактуальной)."""
+
+
 class ChatModel:
+    # Как часто ожидание ответа API проверяет отмену задачи, сек
+    CANCEL_POLL_INTERVAL = 0.25
+
     def __init__(self, settings, pip_installer: PipInstaller):
         self.last_key = 0
         self.pip_installer = pip_installer
@@ -80,11 +92,17 @@ class ChatModel:
         self.history_compression_prompt_template = str(self.settings.get("HISTORY_COMPRESSION_PROMPT_TEMPLATE", "Prompts/System/compression_prompt.txt"))
         self.history_compression_output_target = str(self.settings.get("HISTORY_COMPRESSION_OUTPUT_TARGET", "memory"))
 
-        self._messages_since_last_periodic_compression = 0
+        # Счётчик периодического сжатия у каждого персонажа свой: char_id -> сообщений с последнего сжатия
+        self._messages_since_last_periodic_compression: Dict[str, int] = {}
 
         self.current_character: Character = None
         self.current_character_to_change = str(self.settings.get("CHARACTER"))
         self.characters: Dict[str, Character] = {}
+        # Запросы одного персонажа сериализуются, разных - идут параллельно
+        self._character_locks: Dict[str, threading.Lock] = {}
+        self._character_locks_guard = threading.Lock()
+        # Общее состояние модели, которое трогают параллельные генерации (смена персонажа, парсер, счётчики)
+        self._state_lock = threading.Lock()
 
         # Настройки для снижения качества изображений в истории
         self.image_quality_reduction_enabled = bool(self.settings.get("IMAGE_QUALITY_REDUCTION_ENABLED", False))
@@ -265,6 +283,7 @@ class ChatModel:
         self.characters = {}
         for char_class in character_classes:
             character = char_class()
+            character.memory_system.set_embedding_provider(self._get_embedding_handler)
             self.characters[character.char_id] = character
         
         self.crazy_mita_character = self.characters.get("Crazy")
@@ -299,39 +318,96 @@ class ChatModel:
         system_input : str = "",
         image_data : list[bytes] | None = None,
         stream_callback: callable = None,
-        message_id: int | None = None
+        message_id: int | None = None,
+        character_id: str | None = None,
+        game_data: dict | None = None,
+        cancel_check: Optional[Callable[[], bool]] = None
     ):
+        """
+        Генерирует ответ персонажа.
+
+        Без character_id отвечает текущий персонаж (окно чата). Запросы из игры передают
+        character_id и снимок игрового контекста game_data: такой запрос не переключает
+        current_character, поэтому разные персонажи могут генерировать параллельно. Запросы
+        одного персонажа выполняются по очереди - они читают и дописывают одну историю.
+
+        cancel_check() проверяется перед попытками и во время ожидания ответа API: отменённая
+        генерация возвращает None и ничего не пишет в историю и память персонажа.
+        """
         if image_data is None:
             image_data = []
 
-        self.check_change_current_character()
+        if character_id:
+            character = self.characters.get(character_id)
+            if character is None:
+                logger.warning(f"Unknown character for generation: {character_id}, using current")
+                self.check_change_current_character()
+                character = self.current_character
+        else:
+            self.check_change_current_character()
+            character = self.current_character
+
+        with self._get_character_lock(character.char_id):
+            if cancel_check and cancel_check():
+                logger.info(f"Generation for {character.char_id} cancelled before start")
+                return None
+            return self._generate_character_response(
+                character, user_input, system_input, image_data, stream_callback, game_data, cancel_check
+            )
+
+    def _get_character_lock(self, char_id: str) -> threading.Lock:
+        with self._character_locks_guard:
+            lock = self._character_locks.get(char_id)
+            if lock is None:
+                lock = self._character_locks[char_id] = threading.Lock()
+            return lock
 
-        history_data           = self.current_character.history_manager.load_history()
+    def _generate_character_response(
+        self,
+        character: Character,
+        user_input: str,
+        system_input: str,
+        image_data: list[bytes],
+        stream_callback: callable,
+        game_data: dict | None,
+        cancel_check: Optional[Callable[[], bool]] = None
+    ):
+        history_data           = character.history_manager.load_history()
         llm_messages_history   = history_data.get("messages", [])
 
-        if self.infos_to_add_to_history:
+        # Временная информация из окна чата относится к текущему персонажу
+        if self.infos_to_add_to_history and character is self.current_character:
             llm_messages_history.extend(self.infos_to_add_to_history)
             self.infos_to_add_to_history.clear()
 
-        self.current_character.set_variable("GAME_DISTANCE",self.distance)
-        self.current_character.set_variable("GAME_ROOM_PLAYER",self.get_room_name(self.roomPlayer))
-        self.current_character.set_variable("GAME_ROOM_MITA",self.get_room_name(self.roomMita))
-        self.current_character.set_variable("GAME_NEAR_OBJECTS",self.nearObjects)
-        self.current_character.set_variable("GAME_ACTUAL_INFO",self.actualInfo)
+        if game_data is None:
+            game_data = {
+                'distance': self.distance,
+                'roomPlayer': self.roomPlayer,
+                'roomMita': self.roomMita,
+                'nearObjects': self.nearObjects,
+                'actualInfo': self.actualInfo,
+            }
+        character.set_variable("GAME_DISTANCE", game_data.get('distance', 0.0))
+        character.set_variable("GAME_ROOM_PLAYER", self.get_room_name(game_data.get('roomPlayer', -1)))
+        character.set_variable("GAME_ROOM_MITA", self.get_room_name(game_data.get('roomMita', -1)))
+        character.set_variable("GAME_NEAR_OBJECTS", game_data.get('nearObjects', ''))
+        character.set_variable("GAME_ACTUAL_INFO", game_data.get('actualInfo', ''))
 
         game_state_prompt_content: Optional[str] = None
-        if self.current_character.get_variable("playingGame", False):
-            if hasattr(self.current_character, 'game_manager'):
-                game_state_prompt_content = self.current_character.game_manager.get_active_game_state_prompt()
+        if character.get_variable("playingGame", False):
+            if hasattr(character, 'game_manager'):
+                game_state_prompt_content = character.game_manager.get_active_game_state_prompt()
                 if game_state_prompt_content:
-                    logger.info(f"[{self.current_character.char_id}] Сформирован промпт состояния игры.")
+                    logger.info(f"[{character.char_id}] Сформирован промпт состояния игры.")
             else:
-                logger.warning(f"[{self.current_character.char_id}] Игра активна, но GameManager отсутствует.")
+                logger.warning(f"[{character.char_id}] Игра активна, но GameManager отсутствует.")
 
         combined_messages = []
 
         separate_prompts =  bool(self.settings.get("SEPARATE_PROMPTS", True))
-        messages = self.current_character.get_full_system_setup_for_llm(separate_prompts)
+        memory_query, memory_top_k = self._get_memory_retrieval_params(user_input, system_input, llm_messages_history)
+        messages = character.get_full_system_setup_for_llm(separate_prompts, memory_query, memory_top_k)
         combined_messages.extend(messages)
 
         if game_state_prompt_content:
@@ -342,9 +418,9 @@ class ChatModel:
         #     combined_messages.extend(prehistory)
         #     logger.info(f"Added {len(prehistory)} prehistory messages to combined messages")
 
-        llm_messages_history = self.process_history_compression(llm_messages_history)
+        llm_messages_history = self.process_history_compression(llm_messages_history, character)
 
-        if self.current_character != self.GameMaster:
+        if character != self.GameMaster:
             missed_messages = llm_messages_history[:-self.memory_limit]
             llm_messages_history_limited = llm_messages_history[-self.memory_limit:]
         else:
@@ -352,20 +428,22 @@ class ChatModel:
             llm_messages_history_limited = llm_messages_history[-8:]
 
         if missed_messages and bool(self.settings.get("SAVE_MISSED_HISTORY", True)):
-            logger.info(f"Сохраняю {len(missed_messages)} пропущенных сообщений для персонажа {self.current_character.char_id}.")
-            self.current_character.history_manager.save_missed_history(missed_messages)
+            logger.info(f"Сохраняю {len(missed_messages)} пропущенных сообщений для персонажа {character.char_id}.")
+            character.history_manager.save_missed_history(missed_messages)
 
         if self.image_quality_reduction_enabled:
             llm_messages_history_limited = self._apply_history_image_quality_reduction(llm_messages_history_limited)
 
         # ВАЖНО: system infos — это строки -> оборачиваем в {role, content}
-        event_system_infos = self.current_character.get_system_infos()
+        event_system_infos = character.get_system_infos()
         if event_system_infos:
             llm_messages_history_limited.extend(
                 [{"role": "system", "content": s} if isinstance(s, str) else s for s in event_system_infos]
             )
 
         combined_messages.extend(llm_messages_history_limited)
+        # Системный промпт и история одинаковы на всех попытках хода: провайдеры кэшируют их сериализацию
+        stable_prefix_len = len(combined_messages)
 
         current_time = datetime.datetime.now()
         current_state_message = {
@@ -397,7 +475,7 @@ class ChatModel:
             user_message_for_history["time"] = datetime.datetime.now().strftime("%d.%m.%Y_%H.%M")
             llm_messages_history_limited.append(user_message_for_history)
 
-        char_provider = self.get_character_provider()
+        char_provider = self.get_character_provider(character)
         preset_id = None
         if char_provider != "Current":
             try:
@@ -407,14 +485,21 @@ class ChatModel:
                 logger.warning(f"Invalid preset ID in CHAR_PROVIDER: {char_provider}, using current")
         
         try:
-            llm_response_content, success = self._generate_chat_response(combined_messages, stream_callback, preset_id)
+            llm_response_content, success = self._generate_chat_response(combined_messages, stream_callback, preset_id,
+                                                                          stable_prefix_len=stable_prefix_len,
+                                                                          cancel_check=cancel_check)
+
+            # Ответ отменённой задачи не попадает ни в память (команды ниже), ни в историю
+            if cancel_check and cancel_check():
+                logger.info(f"Generation for {character.char_id} cancelled, response discarded")
+                return None
 
             if not success or not llm_response_content:
                 logger.warning("LLM generation failed or returned empty.")
                 self.event_bus.emit(Events.Model.ON_FAILED_RESPONSE, {'error': translate("Не удалось получить ответ.", "Text generation failed.")})
                 return None
 
-            processed_response_text = self.current_character.process_response_nlp_commands(
+            processed_response_text = character.process_response_nlp_commands(
                 llm_response_content, self.settings.get("SAVE_MISSED_MEMORY", False)
             )
 
@@ -422,12 +507,10 @@ class ChatModel:
             try:
                 use_cmd_replacer  = self.settings.get("USE_COMMAND_REPLACER", False)
                 if use_cmd_replacer:
-                    if not hasattr(self, 'model_handler'):
-                        from handlers.embedding_handler import EmbeddingModelHandler
-                        self.model_handler = EmbeddingModelHandler()
-                    if not hasattr(self, 'parser'):
-                        from utils.command_parser import CommandParser
-                        self.parser = CommandParser(model_handler=self.model_handler)
+                    with self._state_lock:
+                        if not hasattr(self, 'parser'):
+                            from utils.command_parser import CommandParser
+                            self.parser = CommandParser(model_handler=self._get_embedding_handler())
 
                     min_sim     = float(self.settings.get("MIN_SIMILARITY_THRESHOLD", 0.40))
                     cat_switch  = float(self.settings.get("CATEGORY_SWITCH_THRESHOLD", 0.18))
@@ -460,7 +543,7 @@ class ChatModel:
 
             llm_messages_history_limited.append(assistant_message)
 
-            self.current_character.save_character_state_to_history(llm_messages_history_limited)
+            character.save_character_state_to_history(llm_messages_history_limited)
 
             self.event_bus.emit(Events.Model.ON_SUCCESSFUL_RESPONSE)
             logger.success(translate("Получен успешный ответ от API.", "Successful response from API."))
@@ -471,8 +554,40 @@ class ChatModel:
             self.event_bus.emit(Events.Model.ON_FAILED_RESPONSE, {'error': str(e)})
             return f"Ошибка: {e}"
 
-    def process_history_compression(self,llm_messages_history):
+    def _get_embedding_handler(self):
+        """Лениво создаёт общую модель эмбеддингов (команды, индекс памяти)."""
+        if not hasattr(self, 'model_handler'):
+            from handlers.embedding_handler import EmbeddingModelHandler
+            self.model_handler = EmbeddingModelHandler()
+        return self.model_handler
+
+    def _get_memory_retrieval_params(self, user_input: str, system_input: str, llm_messages_history: List[Dict]):
+        """
+        Возвращает (query, top_k) для выборки долговременной памяти.
+        В режиме "all" память выводится целиком: ("", 0).
+        """
+        if self.settings.get("MEMORY_RETRIEVAL_MODE", "all") != "top_k":
+            return "", 0
+
+        top_k = int(self.settings.get("MEMORY_RETRIEVAL_TOP_K", 15))
+        context_messages = int(self.settings.get("MEMORY_RETRIEVAL_CONTEXT_MESSAGES", 4))
+
+        # Текущий ввод идёт первым: при обрезке запроса токенизатором теряется хвост
+        query_parts = [user_input, system_input]
+        recent = llm_messages_history[-context_messages:] if context_messages > 0 else []
+        for msg in reversed(recent):
+            content = msg.get("content", "")
+            if isinstance(content, list):
+                content = " ".join(item.get("text", "") for item in content if item.get("type") == "text")
+            query_parts.append(content if isinstance(content, str) else "")
+
+        query = "\n".join(part for part in query_parts if part)
+        return query, top_k
+
+    def process_history_compression(self, llm_messages_history, character: Character = None):
         """Сжимает старые воспоминания"""
+        if character is None:
+            character = self.current_character
 
         compress_percent = float(self.settings.get("HISTORY_COMPRESSION_MIN_PERCENT_TO_COMPRESS",0.85))
         if self.enable_history_compression_on_limit and len(llm_messages_history) >= self.memory_limit*compress_percent:
@@ -480,13 +595,13 @@ class ChatModel:
             messages_to_compress = llm_messages_history[:round(-self.memory_limit*compress_percent)]
             logger.info(f"История превышает лимит. Попытка сжать {len(messages_to_compress)} сообщений.")
 
-            compressed_summary = self._compress_history(messages_to_compress)
+            compressed_summary = self._compress_history(messages_to_compress, character)
 
             if compressed_summary:
                 if self.history_compression_output_target == "memory":
                     # Добавляем в MemorySystem
-                    if hasattr(self.current_character, 'memory_system') and self.current_character.memory_system:
-                        self.current_character.memory_system.add_memory(content=compressed_summary,memory_type="summary")
+                    if hasattr(character, 'memory_system') and character.memory_system:
+                        character.memory_system.add_memory(content=compressed_summary,memory_type="summary")
                         logger.info("Сжатая сводка добавлена в MemorySystem.")
                     else:
                         logger.warning("MemorySystem недоступен для добавления сжатой сводки.")
@@ -506,23 +621,27 @@ class ChatModel:
 
         # Логика периодического сжатия
         if self.enable_history_compression_periodic:
-            self._messages_since_last_periodic_compression += 1
-            if self._messages_since_last_periodic_compression >= self.history_compression_periodic_interval:
+            char_id = character.char_id if character else ""
+            with self._state_lock:
+                count = self._messages_since_last_periodic_compression.get(char_id, 0) + 1
+                compression_due = count >= self.history_compression_periodic_interval
+                # Сжатие запускается один раз на интервал, даже если не удастся
+                self._messages_since_last_periodic_compression[char_id] = 0 if compression_due else count
+            if compression_due:
                 # Берем самые старые сообщения для периодического сжатия
                 messages_to_compress = llm_messages_history[:self.history_compression_periodic_interval]
 
                 if not messages_to_compress:
                     logger.info("Нет сообщений для периодического сжатия.")
-                    self._messages_since_last_periodic_compression = 0 # Сбрасываем счетчик
                     return llm_messages_history # Возвращаем текущую историю без изменений
 
                 logger.info(f"Периодическое сжатие: попытка сжать {len(messages_to_compress)} сообщений.")
-                compressed_summary = self._compress_history(messages_to_compress)
+                compressed_summary = self._compress_history(messages_to_compress, character)
 
                 if compressed_summary:
                     if self.history_compression_output_target == "memory":
-                        if hasattr(self.current_character, 'memory_system') and self.current_character.memory_system:
-                            self.current_character.memory_system.add_memory(compressed_summary, memory_type="summary")
+                        if hasattr(character, 'memory_system') and character.memory_system:
+                            character.memory_system.add_memory(compressed_summary, memory_type="summary")
                             logger.info("Сжатая сводка добавлена в MemorySystem.")
                         else:
                             logger.warning("MemorySystem недоступен для добавления сжатой сводки.")
@@ -543,21 +662,27 @@ class ChatModel:
                     logger.info(f"История сокращена до {len(llm_messages_history)} сообщений после периодического сжатия.")
                 else:
                     logger.warning("Периодическое сжатие истории не удалось.")
-
-                self._messages_since_last_periodic_compression = 0  # Сбрасываем счетчик
         return llm_messages_history
 
     def check_change_current_character(self):
-        if not self.current_character_to_change:
-            return
-        if self.current_character_to_change in self.characters:
-            logger.info(f"Changing character to {self.current_character_to_change}")
-            self.current_character = self.characters[self.current_character_to_change]
-            self.current_character.reload_character_data()
-            self.current_character_to_change = ""
-        else:
-            logger.warning(f"Attempted to change to unknown character: {self.current_character_to_change}")
+        with self._state_lock:
+            character_to_change = self.current_character_to_change
+            if not character_to_change:
+                return
             self.current_character_to_change = ""
+            character = self.characters.get(character_to_change)
+            if character is None:
+                logger.warning(f"Attempted to change to unknown character: {character_to_change}")
+                return
+            logger.info(f"Changing character to {character_to_change}")
+            self.current_character = character
+        # Перезагрузка вне _state_lock: замок персонажа может быть занят его генерацией
+        self.reload_character(character)
+
+    def reload_character(self, character: Character):
+        """Перечитывает конфиг, историю и память персонажа, дождавшись его текущей генерации."""
+        with self._get_character_lock(character.char_id):
+            character.reload_character_data()
     
     def load_preset_settings(self, preset_id: Optional[int] = None) -> Dict[str, Any]:
         """
@@ -607,7 +732,9 @@ class ChatModel:
                 'preset_name': 'Fallback',
             }
         
-    def _generate_chat_response(self, combined_messages, stream_callback: callable = None, preset_id: Optional[int] = None):
+    def _generate_chat_response(self, combined_messages, stream_callback: callable = None, preset_id: Optional[int] = None,
+                                stable_prefix_len: Optional[int] = None,
+                                cancel_check: Optional[Callable[[], bool]] = None):
         max_attempts = self.max_request_attempts
         retry_delay = self.request_delay
         request_timeout = 45
@@ -626,13 +753,21 @@ class ChatModel:
             tools_desc = json.dumps(self.tool_manager.json_schema())
             legacy_prompt = self.tool_manager.tools_prompt().format(tools_json=tools_desc)
             combined_messages.insert(0, {"role": "system", "content": legacy_prompt})
+            if stable_prefix_len is not None:
+                stable_prefix_len += 1
+
+        from handlers.llm_providers.payload_cache import PayloadCache
+        payload_cache = PayloadCache(combined_messages, stable_prefix_len)
 
         for attempt in range(1, max_attempts + 1):
+            if cancel_check and cancel_check():
+                logger.info("Generation cancelled, remaining attempts skipped")
+                return None, False
             logger.info(f"Generation attempt {attempt}/{max_attempts}")
             
             response_text = None
 
-            save_combined_messages(combined_messages, "SavedMessages/last_attempt_log")
+            request_dumper.capture(combined_messages, "last_attempt_log")
 
             try:
                 logger.info("Generating response...")
@@ -691,10 +826,11 @@ class ChatModel:
                     tools_mode=tools_mode,
                     tools_payload=tools_payload,
                     extra=params,
-                    tool_manager=self.tool_manager
+                    tool_manager=self.tool_manager,
+                    payload_cache=payload_cache
                 )
                 
-                logger.notify(f"req: {json.dumps(preset_settings)}")
+                logger.debug("req: %s", lazy(json.dumps, preset_settings))
                 
                 req.extra['tool_manager'] = self.tool_manager
                 
@@ -704,7 +840,8 @@ class ChatModel:
                 response_text = self._execute_with_timeout(
                     pm.generate,
                     args=(req,),
-                    timeout=request_timeout
+                    timeout=request_timeout,
+                    cancel_check=cancel_check
                 )
 
                 if response_text and tools_on and tools_mode == "legacy":
@@ -720,6 +857,9 @@ class ChatModel:
                 else:
                     logger.warning(f"Attempt {attempt} yielded no response or an error handled within generation.")
 
+            except GenerationCancelled:
+                logger.info(f"Attempt {attempt} abandoned: generation cancelled")
+                return None, False
             except concurrent.futures.TimeoutError:
                 logger.error(f"Attempt {attempt} timed out after {request_timeout}s.")
             except Exception as e:
@@ -730,20 +870,38 @@ class ChatModel:
                 self.event_bus.emit(Events.Model.ON_FAILED_RESPONSE_ATTEMPT)
                 time.sleep(retry_delay)
 
+        logger.debug("Payload cache: %d hits, %d misses", payload_cache.hits, payload_cache.misses)
         logger.error("All generation attempts failed.")
         return None, False
 
-    def _execute_with_timeout(self, func, args=(), kwargs={}, timeout=30):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(func, *args, **kwargs)
-            try:
+    def _execute_with_timeout(self, func, args=(), kwargs={}, timeout=30, cancel_check=None):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(func, *args, **kwargs)
+        abandoned = False
+        try:
+            if cancel_check is None:
                 return future.result(timeout=timeout)
-            except concurrent.futures.TimeoutError:
-                logger.error(f"Function {func.__name__} timed out after {timeout} seconds.")
-                raise
-            except Exception as e:
-                logger.error(f"Exception in function {func.__name__} executed with timeout: {e}")
-                raise
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    return future.result(timeout=min(self.CANCEL_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+                except concurrent.futures.TimeoutError:
+                    if time.monotonic() >= deadline:
+                        raise
+                    if cancel_check():
+                        # Запрос к API прервать нельзя: поток доработает сам, его результат выбрасывается
+                        abandoned = True
+                        raise GenerationCancelled()
+        except GenerationCancelled:
+            raise
+        except concurrent.futures.TimeoutError:
+            logger.error(f"Function {func.__name__} timed out after {timeout} seconds.")
+            raise
+        except Exception as e:
+            logger.error(f"Exception in function {func.__name__} executed with timeout: {e}")
+            raise
+        finally:
+            executor.shutdown(wait=not abandoned)
 
     def GetReserveKey(self, current_key: str, reserve_keys: List[str], attempt_index: int) -> str | None:
         """
@@ -875,9 +1033,12 @@ class ChatModel:
         # Убедимся, что start_index не выходит за пределы истории
         actual_start_index = max(0, min(actual_start_index, history_length))
 
-        logger.info(f"Применение снижения качества изображений: длина истории {history_length}, фактический старт {actual_start_index}")
+        logger.debug("Применение снижения качества изображений: длина истории %d, фактический старт %d",
+                     history_length, actual_start_index)
 
         updated_messages = []
+        processed_images = 0
+        removed_images = 0
         for i, msg in enumerate(messages):
             # Сообщения до actual_start_index остаются без изменений
             if i < actual_start_index:
@@ -913,9 +1074,11 @@ class ChatModel:
                             # Ограничиваем качество минимальным значением
                             target_quality = max(self.image_quality_reduction_min_quality, calculated_quality)
 
-                            logger.info(f"Сообщение {i}: относительный индекс {relative_index}, рассчитанное качество {calculated_quality}, целевое качество {target_quality}")
+                            logger.debug("Сообщение %d: относительный индекс %d, рассчитанное качество %s, целевое качество %s",
+                                         i, relative_index, calculated_quality, target_quality)
 
                             processed_bytes = self._process_image_quality(img_bytes, target_quality)
+                            processed_images += 1
 
                             if processed_bytes:
                                 new_content_chunks.append({
@@ -925,7 +1088,8 @@ class ChatModel:
                                     }
                                 })
                             else:
-                                logger.info(f"Изображение в сообщении {i} удалено (качество <= 0).")
+                                removed_images += 1
+                                logger.debug("Изображение в сообщении %d удалено (качество <= 0).", i)
                                 # Если processed_bytes None, изображение удаляется, не добавляем его в new_content_chunks
                         except Exception as e:
                             logger.error(f"Ошибка при обработке изображения в истории сообщения {i}: {e}", exc_info=True)
@@ -952,6 +1116,9 @@ class ChatModel:
             else:
                 updated_messages.append(msg) # Добавляем сообщения без изображений как есть
 
+        if processed_images:
+            logger.info(f"Снижение качества изображений в истории: обработано {processed_images}, удалено {removed_images} "
+                        f"(старт {actual_start_index} из {history_length})")
         return updated_messages
 
     def _get_provider_key(self, model_name: str) -> str:
@@ -964,7 +1131,7 @@ class ChatModel:
         logger.info(f"Unknown provider for model '{model_name}', defaulting to 'openai' parameter naming conventions.")
         return 'openai'
 
-    def _compress_history(self, messages_to_compress: List[Dict]) -> Optional[str]:
+    def _compress_history(self, messages_to_compress: List[Dict], character: Character = None) -> Optional[str]:
         """
         Сжимает историю диалога, используя LLM для создания краткой сводки.
         """
@@ -983,7 +1150,7 @@ class ChatModel:
 
             # 3. Формирование полного промпта
             full_prompt = prompt_template.replace("{history_messages}", formatted_messages)
-            full_prompt = full_prompt.replace("{your character}", self.current_character.name)
+            full_prompt = full_prompt.replace("{your character}", (character or self.current_character).name)
 
             # 4. Вызов LLM для получения сжатой сводки
             system_message = {"role": "system", "content": full_prompt}
@@ -1014,7 +1181,7 @@ class ChatModel:
     def reload_promts(self):
         logger.info("Reloading current character data.")
         if self.current_character:
-            self.current_character.reload_character_data()
+            self.reload_character(self.current_character)
             logger.info(f"Character {self.current_character.name} data reloaded.")
         else:
             logger.warning("No current character selected to reload.")
@@ -1280,31 +1447,34 @@ class ChatModel:
         if not matches:
             return response_text  # Нет вызовов — возвращаем как есть
 
+        calls = []
         for tool_name, args_str in matches:
             try:
                 args = json.loads(args_str)
                 logger.info(f"Legacy tool call: {tool_name}({args})")
-                tool_result = self.tool_manager.run(tool_name, args)
-
-                # Добавляем служебные сообщения
-                messages.append(mk_tool_call_msg(tool_name, args))
-                messages.append(mk_tool_resp_msg(tool_name, tool_result))
-
-                # Удаляем вызов из ответа (чтобы не путать)
-                response_text = re.sub(parse_regex, "", response_text).strip()
-
+                calls.append((tool_name, args))
             except Exception as e:
                 logger.error(f"Ошибка legacy tool: {e}")
                 self.add_temporary_system_message(messages, f"Tool call failed: {e}")
 
+        # Независимые вызовы выполняются параллельно
+        for (tool_name, args), tool_result in zip(calls, self.tool_manager.run_many(calls)):
+            # Добавляем служебные сообщения
+            messages.append(mk_tool_call_msg(tool_name, args))
+            messages.append(mk_tool_resp_msg(tool_name, tool_result))
+
+        # Удаляем вызовы из ответа (чтобы не путать)
+        response_text = re.sub(parse_regex, "", response_text).strip()
+
         # Рекурсивно генерируем новый ответ с обновленными messages
         new_response, _ = self._generate_chat_response(messages, stream_callback)
         return new_response or response_text
 
 
 
-    def get_character_provider(self) -> str:
-        if not self.current_character:
+    def get_character_provider(self, character: Character = None) -> str:
+        character = character or self.current_character
+        if not character:
             return "Current"  # По умолчанию, если персонаж не выбран
-        key = f"CHAR_PROVIDER_{self.current_character.char_id}"
+        key = f"CHAR_PROVIDER_{character.char_id}"
         return self.settings.get(key, "Current")  # 'Current' по умолчанию
\ No newline at end of file
@@ -21,6 +21,8 @@ class LLMRequest:
     settings: Optional[Any] = None
     depth: int = 0
     tool_manager: Optional[Any] = None
+    # PayloadCache хода: сериализованный префикс сообщений, общий для всех попыток
+    payload_cache: Optional[Any] = None
 
 class BaseProvider(ABC):
     name: str
@@ -3,7 +3,8 @@ import requests
 import json
 import re
 from main_logger import logger
-from utils import save_combined_messages
+from utils.request_dump import request_dumper
+from .payload_cache import RawJSON, encode_json, encode_object, join_fragments
 
 class CommonProvider(BaseProvider):
     name = "common"
@@ -25,7 +26,7 @@ class CommonProvider(BaseProvider):
 
         data = {
             "model": req.model,
-            "messages": [{"role": m["role"], "content": m["content"]} for m in req.messages]
+            "messages": RawJSON(b"[" + self._encode_messages(req) + b"]")
         }
 
         params = {k: v for k, v in req.extra.items() if isinstance(v, (str, int, float, bool, list, dict, type(None)))}
@@ -35,10 +36,10 @@ class CommonProvider(BaseProvider):
         if req.tools_on and req.tools_mode == "native" and req.tools_payload:
             data["tools"] = req.tools_payload
 
-        save_combined_messages(data["messages"], "SavedMessages/last_request_common_log")
+        request_dumper.capture(req.messages, "last_request_common_log")
 
         headers = {"Content-Type": "application/json", "Authorization": f"Bearer {req.api_key}"}
-        response = requests.post(req.api_url, headers=headers, json=data, stream=req.stream)
+        response = requests.post(req.api_url, headers=headers, data=encode_object(data), stream=req.stream)
         if response.status_code != 200:
             try:
                 err = response.json()
@@ -56,10 +57,10 @@ class CommonProvider(BaseProvider):
             # Только если реально есть вызовы инструментов и есть tool_manager
             if tool_calls and req.tool_manager:
                 from tools.manager import mk_tool_call_msg, mk_tool_resp_msg
-                for call in tool_calls:
-                    name = call["function"]["name"]
-                    args = json.loads(call["function"]["arguments"])
-                    tool_result = req.tool_manager.run(name, args)
+                calls = [(call["function"]["name"], json.loads(call["function"]["arguments"])) for call in tool_calls]
+                # Независимые вызовы одного ответа выполняются параллельно
+                tool_results = req.tool_manager.run_many(calls)
+                for (name, args), tool_result in zip(calls, tool_results):
                     req.messages.append(mk_tool_call_msg(name, args))
                     req.messages.append(mk_tool_resp_msg(name, tool_result))
                 req.depth += 1
@@ -71,6 +72,18 @@ class CommonProvider(BaseProvider):
             logger.error(f"Произошла ошибка: {ex}") 
         return ""
 
+    def _encode_messages(self, req: LLMRequest) -> bytes:
+        """Элементы массива messages; префикс хода кодируется один раз на все попытки."""
+        cache = req.payload_cache
+        split = cache.split(req.messages) if cache else None
+        if split is None:
+            return self._encode_message_list(req.messages)
+        return join_fragments(cache.fragment("common", self._encode_message_list), self._encode_message_list(split[1]))
+
+    @staticmethod
+    def _encode_message_list(messages) -> bytes:
+        return join_fragments(*(encode_json({"role": m["role"], "content": m["content"]}) for m in messages))
+
     def _handle_common_stream(self, response, stream_callback: callable = None) -> str:
         full_response_parts = []
         try:
@@ -1,8 +1,8 @@
 from .base import BaseProvider, LLMRequest
 import requests
 import json
-import copy
 from main_logger import logger
+from .payload_cache import RawJSON, encode_json, encode_object, join_fragments
 
 class GeminiProvider(BaseProvider):
     name = "gemini"
@@ -97,52 +97,22 @@ class GeminiProvider(BaseProvider):
         params = {k: v for k, v in req.extra.items() if isinstance(v, (str, int, float, bool, list, dict, type(None)))}
         self.clear_endline_sim(params)
 
-        # Форматируем сообщения согласно Gemini API
-        formatted = self._format_messages_for_gemini_api(req.messages)
-        
-        # Базовый payload
-        data = {}
-        
-        # Добавляем system_instruction если есть
-        if "system_instruction" in formatted:
-            data["system_instruction"] = formatted["system_instruction"]
-        
-        # Добавляем contents
-        data["contents"] = formatted["contents"]
-        
-        # Gemini требует, чтобы последнее сообщение было от user
-        if data["contents"] and data["contents"][-1].get("role") != "user":
-            logger.info("Корректировка: последнее сообщение должно быть от user для Gemini")
-            last_msg = data["contents"][-1]
-            last_msg["role"] = "user"
-            # Добавляем префикс [SYSTEM INFO] к тексту
-            for part in last_msg.get("parts", []):
-                if "text" in part:
-                    part["text"] = f"[SYSTEM INFO] {part['text']}"
-        
-        # Добавляем generationConfig если есть параметры
-        if params:
-            data["generationConfig"] = params
-        
-        # Добавляем tools если включены
-        if req.tools_on and req.tools_payload:
-            data["tools"] = req.tools_payload
+        body, has_tools = self._build_payload(req, params)
 
-        # Логируем для отладки (специфично для Gemini)
+        # Логируем для отладки (специфично для Gemini): пишем уже готовое тело, без повторной сериализации
         try:
-            json_data = json.dumps(data, ensure_ascii=False, indent=2)
-            with open("wtf.json", "w", encoding="utf-8") as f:
-                f.write(json_data)
+            with open("wtf.json", "wb") as f:
+                f.write(body)
             logger.debug("Gemini request payload сохранен в wtf.json")
         except Exception as e:
             logger.warning(f"Не удалось сохранить wtf.json: {e}")
 
-        need_stream = req.stream and "tools" not in data
+        need_stream = req.stream and not has_tools
         
         response = requests.post(
             req.api_url, 
             headers={"Content-Type": "application/json"}, 
-            json=data, 
+            data=body, 
             stream=need_stream
         )
         
@@ -156,30 +126,84 @@ class GeminiProvider(BaseProvider):
         # Обработка обычного ответа
         try:
             response_data = response.json()
-            first_part = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0]
+            parts = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}]) or [{}]
+            first_part = parts[0]
             
-            # Обработка function call
-            func_call = first_part.get("functionCall")
-            if func_call:
-                name = func_call.get("name")
-                args = func_call.get("args", {})
-                tm = req.tool_manager
-                if tm:
-                    logger.info(f"Gemini вызвал tool: {name} с args: {args}")
-                    tool_result = tm.run(name, args)
-                    from tools.manager import mk_tool_call_msg, mk_tool_resp_msg
-                    new_messages = copy.deepcopy(req.messages)
+            # Обработка function call (Gemini может вернуть несколько вызовов в одном ответе)
+            func_calls = [p["functionCall"] for p in parts if p.get("functionCall")]
+            tm = req.tool_manager
+            if func_calls and tm:
+                calls = [(fc.get("name"), fc.get("args", {})) for fc in func_calls]
+                logger.info(f"Gemini вызвал tools: {calls}")
+                tool_results = tm.run_many(calls)
+                from tools.manager import mk_tool_call_msg, mk_tool_resp_msg
+                # Неглубокая копия: сообщения не меняются, а префикс хода остаётся теми же объектами для кэша
+                new_messages = list(req.messages)
+                for (name, args), tool_result in zip(calls, tool_results):
                     new_messages.append(mk_tool_call_msg(name, args))
                     new_messages.append(mk_tool_resp_msg(name, tool_result))
-                    req.messages = new_messages
-                    req.depth += 1
-                    return self.generate_request_gemini(req)
+                req.messages = new_messages
+                req.depth += 1
+                return self.generate_request_gemini(req)
             
             return first_part.get("text", "") or "…"
         except Exception as e:
             logger.error(f"Ошибка парсинга Gemini response: {e}", exc_info=True)
             return None
 
+    def _build_payload(self, req: LLMRequest, params: dict):
+        """
+        Тело запроса в байтах. Системные части и contents префикса хода берутся из req.payload_cache,
+        заново форматируется и кодируется только хвост.
+        """
+        cache = req.payload_cache
+        split = cache.split(req.messages) if cache else None
+        tail_formatted = None
+        if split is not None:
+            tail_formatted = self._format_messages_for_gemini_api(split[1])
+            # Корректировка роли последнего сообщения должна затронуть только хвост
+            if split[0] and not tail_formatted["contents"]:
+                split = None
+
+        if split is None:
+            prefix_system, prefix_contents = b"", b""
+            tail_formatted = self._format_messages_for_gemini_api(req.messages)
+        else:
+            prefix_system, prefix_contents = cache.fragment("gemini", self._encode_prefix)
+
+        tail_system = tail_formatted.get("system_instruction", {}).get("parts", [])
+        tail_contents = tail_formatted["contents"]
+
+        # Gemini требует, чтобы последнее сообщение было от user
+        if tail_contents and tail_contents[-1].get("role") != "user":
+            logger.info("Корректировка: последнее сообщение должно быть от user для Gemini")
+            last_msg = tail_contents[-1]
+            last_msg["role"] = "user"
+            # Добавляем префикс [SYSTEM INFO] к тексту
+            for part in last_msg.get("parts", []):
+                if "text" in part:
+                    part["text"] = f"[SYSTEM INFO] {part['text']}"
+
+        fields = {}
+        system_parts = join_fragments(prefix_system, *(encode_json(part) for part in tail_system))
+        if system_parts:
+            fields["system_instruction"] = RawJSON(b'{"parts":[' + system_parts + b"]}")
+        fields["contents"] = RawJSON(
+            b"[" + join_fragments(prefix_contents, *(encode_json(msg) for msg in tail_contents)) + b"]"
+        )
+        if params:
+            fields["generationConfig"] = params
+        if req.tools_on and req.tools_payload:
+            fields["tools"] = req.tools_payload
+
+        return encode_object(fields), "tools" in fields
+
+    def _encode_prefix(self, messages):
+        formatted = self._format_messages_for_gemini_api(messages)
+        system_parts = formatted.get("system_instruction", {}).get("parts", [])
+        return (join_fragments(*(encode_json(part) for part in system_parts)),
+                join_fragments(*(encode_json(msg) for msg in formatted["contents"])))
+
     def _handle_gemini_stream(self, response, stream_callback: callable = None) -> str:
         full_response_parts = []
         json_buffer = ''
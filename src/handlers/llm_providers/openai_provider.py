@@ -1,4 +1,5 @@
 from .base import BaseProvider, LLMRequest
+from .payload_cache import strip_message_times
 from openai import OpenAI
 import json
 from main_logger import logger
@@ -44,10 +45,12 @@ class OpenAIProvider(BaseProvider):
         try:
             self.change_last_message_to_user_for_gemini(model_to_use, req.messages)
 
-            cleaned_messages = []
-            for msg in req.messages:
-                cleaned_msg = {k: v for k, v in msg.items() if k != "time"}
-                cleaned_messages.append(cleaned_msg)
+            # Очищенные копии префикса хода переиспользуются на повторных попытках
+            split = req.payload_cache.split(req.messages) if req.payload_cache else None
+            if split and split[1]:
+                cleaned_messages = req.payload_cache.fragment("openai", strip_message_times) + strip_message_times(split[1])
+            else:
+                cleaned_messages = strip_message_times(req.messages)
 
             final_params = self.get_final_params(model_to_use, cleaned_messages, req)
 
@@ -63,18 +66,18 @@ class OpenAIProvider(BaseProvider):
                 return self._handle_openai_stream(completion, req.stream_cb)
             elif completion and completion.choices:
                 message = completion.choices[0].message
-                if message.tool_calls:
-                    for tool_call in message.tool_calls:
-                        name = tool_call.function.name
-                        args = json.loads(tool_call.function.arguments)
-                        from tools.manager import mk_tool_call_msg, mk_tool_resp_msg
-                        tool_manager = req.extra.get('tool_manager')
-                        if tool_manager:
-                            tool_result = tool_manager.run(name, args)
-                            req.messages.append(mk_tool_call_msg(name, args))
-                            req.messages.append(mk_tool_resp_msg(name, tool_result))
-                            req.depth += 1
-                            return self._generate_openapi_response(req)
+                tool_manager = req.extra.get('tool_manager')
+                if message.tool_calls and tool_manager:
+                    from tools.manager import mk_tool_call_msg, mk_tool_resp_msg
+                    calls = [(tool_call.function.name, json.loads(tool_call.function.arguments))
+                             for tool_call in message.tool_calls]
+                    # Независимые вызовы одного ответа выполняются параллельно
+                    tool_results = tool_manager.run_many(calls)
+                    for (name, args), tool_result in zip(calls, tool_results):
+                        req.messages.append(mk_tool_call_msg(name, args))
+                        req.messages.append(mk_tool_resp_msg(name, tool_result))
+                    req.depth += 1
+                    return self._generate_openapi_response(req)
 
                 response_content = completion.choices[0].message.content
                 logger.info("Completion successful.")
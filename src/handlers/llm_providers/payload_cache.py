@@ -0,0 +1,69 @@
+"""
+Кэш сериализованной части запроса на время одного хода.
+
+Между попытками генерации (повторы, резервные ключи) меняются только ключ/URL и параметры,
+а провайдеры каждый раз заново переводили весь список сообщений в свой формат, снова обходили
+base64-картинки истории и делали json.dumps всего тела. PayloadCache создаётся на ход:
+стабильный префикс (системный промпт + история) переводится в формат провайдера и кодируется
+в байты один раз, а на каждой попытке кодируются только хвост хода и параметры.
+
+Префикс считается тем же, если в списке сообщений на его местах стоят те же объекты: после
+deepcopy (рекурсия tool calls у Gemini) или вставки в начало кэш просто не используется.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class RawJSON(bytes):
+    """Уже сериализованное значение: encode_object вставляет его как есть."""
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def join_fragments(*fragments: bytes) -> bytes:
+    """Склеивает уже закодированные элементы JSON-массива, пропуская пустые."""
+    return b",".join(fragment for fragment in fragments if fragment)
+
+
+def encode_object(fields: Dict[str, Any]) -> bytes:
+    return b"{" + b",".join(
+        encode_json(key) + b":" + (value if isinstance(value, RawJSON) else encode_json(value))
+        for key, value in fields.items()
+    ) + b"}"
+
+
+def strip_message_times(messages: List[Dict]) -> List[Dict]:
+    """Копии сообщений без служебного поля time (OpenAI-совместимые API его не принимают)."""
+    return [{k: v for k, v in msg.items() if k != "time"} for msg in messages]
+
+
+class PayloadCache:
+    def __init__(self, messages: List[Dict], prefix_len: Optional[int] = None):
+        if prefix_len is None:
+            prefix_len = len(messages) - 1
+        self.prefix_len = max(0, min(prefix_len, len(messages)))
+        self._prefix = list(messages[:self.prefix_len])
+        self._fragments: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def split(self, messages: List[Dict]) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """(префикс, хвост), если начало messages - тот же префикс, иначе None."""
+        n = self.prefix_len
+        if len(messages) < n:
+            return None
+        for cached, current in zip(self._prefix, messages):
+            if cached is not current:
+                return None
+        return self._prefix, messages[n:]
+
+    def fragment(self, fmt: str, build: Callable[[List[Dict]], Any]) -> Any:
+        """Результат build(префикс) для формата fmt; считается один раз за ход."""
+        if fmt in self._fragments:
+            self.hits += 1
+            return self._fragments[fmt]
+        self.misses += 1
+        value = self._fragments[fmt] = build(self._prefix)
+        return value
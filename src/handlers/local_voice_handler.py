@@ -23,6 +23,7 @@ import gc
 import soundfile as sf
 import re
 from xml.sax.saxutils import escape
+from concurrent.futures import Future
 from typing import Dict, Optional, Any, List
 
 from packaging.utils import canonicalize_name, NormalizedName
@@ -34,6 +35,9 @@ from handlers.voice_models.base_model import IVoiceModel
 from handlers.voice_models.edge_tts_rvc_model import EdgeTTS_RVC_Model
 from handlers.voice_models.fish_speech_model import FishSpeechModel
 from handlers.voice_models.f5_tts_model import F5TTSModel
+from handlers.voice_models.inference_executor import InferenceExecutor
+from handlers.voice_models.voice_line_cache import VoiceLineCache
+from handlers.voice_models.residency import ModelResidencyManager, GB, release_freed_memory
 
 from docs import DocsManager
 from main_logger import logger
@@ -52,6 +56,15 @@ class LocalVoice:
 
         self.current_model_id: Optional[str] = None
         self.active_model_instance: Optional[IVoiceModel] = None
+        # Потоки инференса моделей (по одному на обработчик), чтобы синтез не блокировал общий цикл событий
+        self.inference_executor = InferenceExecutor()
+        # Кэш готовых реплик (создаётся при первой озвучке)
+        self.voice_line_cache: Optional[VoiceLineCache] = None
+        # Несколько моделей могут оставаться загруженными одновременно в пределах бюджета памяти
+        self.residency = ModelResidencyManager(budget_bytes=self._get_residency_budget(),
+                                               unload=self._unload_on_inference_thread)
+        # inference_key -> выгрузка, ещё стоящая в очереди инференса этого обработчика
+        self._pending_unloads: Dict[str, Future] = {}
         
         # Создаем один экземпляр для всех RVC-моделей
         edge_rvc_handler = EdgeTTS_RVC_Model(self, "edge_rvc_handler")
@@ -216,6 +229,9 @@ class LocalVoice:
         self.clone_voice_text = voice_paths['clone_voice_text']
         self.current_character_name = voice_paths['character_name']
 
+        # Выгрузка по бюджету идёт в очереди инференса: дожидаемся её, чтобы она не выгрузила модель после загрузки
+        self._wait_pending_unloads(self._handlers_in_use(model_id))
+
         # Шаг 3: Вызываем инициализацию. Дочерний метод теперь достаточно умен,
         # чтобы догрузить/выгрузить компоненты по необходимости.
         success = model_to_init.initialize(init=init)
@@ -231,9 +247,62 @@ class LocalVoice:
         # Шаг 4: Если все прошло успешно, устанавливаем модель как активную.
         self.active_model_instance = model_to_init
         logger.success(f"Модель '{model_id}' успешно установлена как активная.")
+
+        # Шаг 5: Учитываем память модели; при превышении бюджета выгружаются давно неиспользуемые
+        self.residency.budget_bytes = self._get_residency_budget()
+        in_use = self._handlers_in_use(model_id)
+        for handler in in_use:
+            if handler.initialized:
+                self.residency.loaded(handler, pinned=in_use)
+        logger.info(self.residency.report())
         
         return True
 
+    def _handlers_in_use(self, model_id: str) -> List[IVoiceModel]:
+        """Обработчики, нужные режиму: сама модель и общий RVC для комбинированных режимов (medium+low, high+low)."""
+        model = self.models.get(model_id)
+        if model is None:
+            return []
+        handlers = [model]
+        rvc_handler = getattr(model, "rvc_handler", None)
+        if model_id.endswith("+low") and rvc_handler is not None:
+            handlers.append(rvc_handler)
+        return handlers
+
+    def preload_character_voice(self, character: Optional[Any] = None) -> None:
+        """Хук на смену персонажа: в режимах с RVC заранее загружает его голос."""
+        if self.current_model_id not in ("low", "low+", "medium+low", "high+low"):
+            return
+        rvc_handler = self.models["low"]
+        if rvc_handler.initialized:
+            rvc_handler.preload_voice(character)
+
+    def _unload_on_inference_thread(self, handler: IVoiceModel) -> None:
+        """Выгрузка по бюджету ставится в очередь инференса обработчика, чтобы не выгрузить модель посреди синтеза."""
+        key = handler.inference_key
+
+        def unload():
+            handler.unload()
+            release_freed_memory()
+
+        self._pending_unloads[key] = self.inference_executor.submit(key, unload)
+
+    def _wait_pending_unloads(self, handlers: List[IVoiceModel]) -> None:
+        for handler in handlers:
+            future = self._pending_unloads.pop(handler.inference_key, None)
+            if future is None:
+                continue
+            try:
+                future.result(timeout=60)
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки модели озвучки '{handler.inference_key}': {e}", exc_info=True)
+
+    def _get_residency_budget(self) -> int:
+        try:
+            return int(float(self.settings.get("LOCAL_VOICE_RAM_BUDGET_GB", 0)) * GB)
+        except (TypeError, ValueError):
+            return 0
+
     async def voiceover(self, text: str, output_file="output.wav", character: Optional[Any] = None) -> Optional[str]:
         if self.active_model_instance is None or not self.active_model_instance.initialized:
             if self.current_model_id:
@@ -261,8 +330,40 @@ class LocalVoice:
             self.index_path = voice_paths['index_path']
             self.clone_voice_filename = voice_paths['clone_voice_filename']
             self.clone_voice_text = voice_paths['clone_voice_text']
-        
-        return await self.active_model_instance.voiceover(text, character)
+
+        cache = self._get_voice_line_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = VoiceLineCache.make_key(
+                text, self.current_character_name, self.current_model_id, self.voice_language,
+                self.load_model_settings(self.current_model_id)
+            )
+            cached_path = cache.get(cache_key)
+            if cached_path:
+                logger.info(f"Реплика взята из кэша озвучки: {cached_path}")
+                return cached_path
+
+        self.residency.touch(*self._handlers_in_use(self.current_model_id))
+        result_path = await self.active_model_instance.voiceover(text, character)
+
+        if cache is not None and result_path:
+            try:
+                cache.put(cache_key, result_path, text)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить реплику в кэш озвучки: {e}")
+        return result_path
+
+    def _get_voice_line_cache(self) -> Optional[VoiceLineCache]:
+        if not self.settings.get("LOCAL_VOICE_CACHE", True):
+            return None
+        try:
+            max_bytes = int(float(self.settings.get("LOCAL_VOICE_CACHE_MB", 512)) * 1024 * 1024)
+        except (TypeError, ValueError):
+            max_bytes = 512 * 1024 * 1024
+        if self.voice_line_cache is None:
+            self.voice_line_cache = VoiceLineCache(max_bytes=max_bytes)
+        self.voice_line_cache.max_bytes = max_bytes
+        return self.voice_line_cache
 
     # =========================================================================
     # Методы для управления и проверки состояния
@@ -307,6 +408,7 @@ class LocalVoice:
         if self.active_model_instance:
             logger.info(f"Сброс состояния активной модели '{self.active_model_instance.model_id}' из-за смены языка.")
             self.active_model_instance.cleanup_state()
+            self.residency.forget(self.active_model_instance)
             self.active_model_instance = None
         logger.info("Изменение языка завершено.")
 
@@ -343,6 +445,7 @@ class LocalVoice:
         for model_id in model_to_reset_ids:
             if model := self.models.get(model_id):
                 model.cleanup_state()
+                self.residency.forget(model)
                 if self.active_model_instance and self.active_model_instance.model_id == model_id:
                     self.active_model_instance = None
                     self.current_model_id = None
@@ -367,6 +470,7 @@ class LocalVoice:
             raise RuntimeError(f"Model '{model_id}' is not initialised")
         self.current_model_id      = model_id
         self.active_model_instance = model
+        self.residency.touch(*self._handlers_in_use(model_id))
         logger.info(f"Active local voice model set to '{model_id}'")
 
     def is_cuda_available(self):
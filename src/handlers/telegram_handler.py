@@ -4,6 +4,7 @@ import sys
 import time
 import random
 import asyncio
+from collections import deque
 
 from telethon.tl.types import MessageMediaDocument, DocumentAttributeAudio
 from telethon.errors import SessionPasswordNeededError
@@ -15,6 +16,24 @@ from utils import SH
 import platform
 from core.events import get_event_bus, Events
 
+# Пауза между сообщениями боту (как между служебными командами в start)
+MIN_SEND_INTERVAL = 0.35
+# Сколько фраз может одновременно ждать озвучки у бота
+MAX_IN_FLIGHT = 3
+
+
+class _PendingReply:
+    """Запрос, ждущий голосовой ответ бота. После таймаута остаётся заглушкой до expires_at."""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.sent_id = None
+        self.expires_at = None
+
+    def expired(self, now: float) -> bool:
+        return self.expires_at is not None and now > self.expires_at
+
+
 class TelegramBotHandler:
 
     def __init__(
@@ -61,6 +80,13 @@ class TelegramBotHandler:
         self.message_limit_per_minute = message_limit_per_minute
         self.message_count = 0
         self.start_time = time.time()
+        # Время отправки сообщений за последнюю минуту (скользящее окно лимита)
+        self._send_times = deque()
+
+        # Ответы бота приходят через events.NewMessage и сопоставляются с запросами по очереди
+        self._pending = deque()
+        self._send_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
 
         self.client = None
         try:
@@ -82,134 +108,164 @@ class TelegramBotHandler:
             self.message_count = 0
             self.start_time = time.time()
 
-    async def send_and_receive(self, input_message, speaker_command, message_id, voice_future : asyncio.Future | None = None,):
-        logger.info(f"Отправка сообщения на озвучку Telegram: {speaker_command} {input_message}")
-        if not input_message or not speaker_command:
-            return
-
-        time_between_messages = 1.5
-        current_time = time.time()
-        if self.last_send_time > 0:
-            time_since_last = current_time - self.last_send_time
-            if time_since_last < time_between_messages:
-                logger.info(f"Слишком быстро пришел некст войс, ждем {time_between_messages - time_since_last:.2f} сек")
-                await asyncio.sleep(time_between_messages - time_since_last)
-        self.last_send_time = time.time()
+    # ---------- Сопоставление ответов бота с запросами ----------
 
-        if self.last_speaker_command != speaker_command:
-            await self.client.send_message(self.tg_bot, speaker_command)
-            self.last_speaker_command = speaker_command
-            await asyncio.sleep(0.7)
-
-        self.last_speaker_command = speaker_command
-        self.reset_message_count()
+    @staticmethod
+    def _is_voice_reply(message) -> bool:
+        if not (message.media and isinstance(message.media, MessageMediaDocument)):
+            return False
+        doc = message.media.document
+        return "audio/mpeg" in doc.mime_type or (
+            "audio/ogg" in doc.mime_type
+            and any(isinstance(attr, DocumentAttributeAudio) and attr.voice for attr in doc.attributes)
+        )
 
-        if self.message_count >= self.message_limit_per_minute:
-            logger.warning("Превышен лимит сообщений. Ожидаем...")
-            await asyncio.sleep(random.uniform(10, 15))
+    async def _on_bot_message(self, event):
+        """Новое сообщение от бота (events.NewMessage): отдаём голосовой ответ ожидающему запросу."""
+        message = event.message
+        if not self._is_voice_reply(message):
+            if message.text:
+                logger.info(f"Ответ от бота: {message.text}")
             return
 
-        if self.tg_bot == "@CrazyMitaAIbot":
-            input_message = f"/voice {input_message}"
-        await self.client.send_message(self.tg_bot, input_message)
-        self.message_count += 1
+        now = time.time()
+        # Просроченные заглушки в голове очереди больше не ждут ответа
+        while self._pending and self._pending[0].expired(now):
+            self._pending.popleft()
+
+        pending = None
+        reply_to = getattr(message, "reply_to_msg_id", None)
+        if reply_to is not None:
+            pending = next((p for p in self._pending if p.sent_id == reply_to), None)
+        if pending is None and self._pending:
+            # Бот отвечает по порядку: ответ принадлежит самому старому запросу
+            pending = self._pending[0]
+        if pending is None:
+            logger.info("Получен голосовой ответ бота без ожидающего запроса, пропускаю.")
+            return
 
-        logger.info("Ожидание ответа от бота...")
-        response = None
-        attempts = 0
-        attempts_per_second = 3
-        attempts_max = self.silero_time_limit * attempts_per_second
-
-        await asyncio.sleep(0.5)
-        while attempts <= attempts_max:
-            async for message in self.client.iter_messages(self.tg_bot, limit=1):
-                if message.media and isinstance(message.media, MessageMediaDocument):
-                    doc = message.media.document
-                    if "audio/mpeg" in doc.mime_type or ("audio/ogg" in doc.mime_type and any(isinstance(attr, DocumentAttributeAudio) and attr.voice for attr in doc.attributes)):
-                        response = message
-                        break
-            if response:
+        self._pending.remove(pending)
+        if pending.future.done():
+            logger.info(f"Запоздалый ответ бота на сообщение {pending.sent_id} отброшен.")
+            return
+        pending.future.set_result(message)
+
+    async def _wait_for_send_slot(self):
+        """Соблюдает лимит бота: не больше message_limit_per_minute в минуту и паузу между сообщениями."""
+        while True:
+            now = time.time()
+            while self._send_times and now - self._send_times[0] > 60:
+                self._send_times.popleft()
+            if len(self._send_times) < self.message_limit_per_minute:
                 break
-            logger.info(f"Попытка {attempts + 1}/{attempts_max}. Ответ от бота не найден.")
-            attempts += 1
-            await asyncio.sleep(1 / attempts_per_second)
+            wait = 60 - (now - self._send_times[0])
+            logger.warning(f"Превышен лимит сообщений. Ожидаем {wait:.1f} сек...")
+            await asyncio.sleep(wait)
 
-        if not response:
-            logger.info(f"Ответ от бота не получен после {attempts_max} попыток.")
-            return
-        
-        logger.info("Ответ получен")
+        since_last = time.time() - self.last_send_time
+        if self.last_send_time > 0 and since_last < MIN_SEND_INTERVAL:
+            await asyncio.sleep(MIN_SEND_INTERVAL - since_last)
 
-        path_to_file: str | None = None
+    async def _send_to_bot(self, text: str):
+        await self._wait_for_send_slot()
+        sent = await self.client.send_message(self.tg_bot, text)
+        self.last_send_time = time.time()
+        self._send_times.append(self.last_send_time)
+        self.message_count = len(self._send_times)
+        return sent
 
-        if response.media and isinstance(response.media, MessageMediaDocument):
-            # Качаем в ./temp (создаём при необходимости)
-            temp_dir = os.path.join(os.getcwd(), "temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            file_path = await self.client.download_media(response.media, file=temp_dir)
-            logger.info(f"Файл загружен: {file_path}")
+    async def send_and_receive(self, input_message, speaker_command, message_id, voice_future : asyncio.Future | None = None,):
+        logger.info(f"Отправка сообщения на озвучку Telegram: {speaker_command} {input_message}")
+        if not input_message or not speaker_command:
+            return
 
-            # Ждём, пока файл появится и стабилизируется по размеру
-            start_time = time.time()
-            last_size = -1
-            while True:
+        loop = asyncio.get_running_loop()
+        async with self._in_flight:
+            async with self._send_lock:
+                if self.last_speaker_command != speaker_command:
+                    # Спикер у бота общий: ждём ответы на уже отправленные фразы, иначе они озвучатся новым голосом
+                    await self._drain_pending()
+                    await self._send_to_bot(speaker_command)
+                    self.last_speaker_command = speaker_command
+
+                if self.tg_bot == "@CrazyMitaAIbot":
+                    input_message = f"/voice {input_message}"
+                pending = _PendingReply(loop.create_future())
+                # В очередь до отправки: ответ может прийти раньше, чем вернётся send_message
+                self._pending.append(pending)
                 try:
-                    if os.path.exists(file_path):
-                        size = os.path.getsize(file_path)
-                        if size > 0 and size == last_size:
-                            break
-                        last_size = size
-                except OSError:
-                    pass
-                if time.time() - start_time > 10.0:
-                    break
-                await asyncio.sleep(0.1)
-
-            sound_absolute_path = os.path.abspath(file_path)
-
-            # Получаем статус подключения к игре через событие
-            connection_result = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                self.event_bus.emit_and_wait,
-                Events.Server.GET_GAME_CONNECTION,
-                {},
-                1.0
-            )
-            connected_to_game = connection_result[0] if connection_result else False
+                    sent = await self._send_to_bot(input_message)
+                except Exception:
+                    self._pending.remove(pending)
+                    raise
+                pending.sent_id = sent.id
 
-            if connected_to_game:
-                logger.info("Подключен к игре, нужна конвертация")
-                base_name = os.path.splitext(os.path.basename(file_path))[0]
-                wav_path = os.path.join(os.path.dirname(file_path), f"{base_name}.wav")
-                absolute_wav_path = os.path.abspath(wav_path)
-                
-                await AudioConverter.convert_to_wav(sound_absolute_path, absolute_wav_path)
+            logger.info("Ожидание ответа от бота...")
+            try:
+                response = await asyncio.wait_for(asyncio.shield(pending.future), timeout=self.silero_time_limit)
+            except asyncio.TimeoutError:
+                logger.info(f"Ответ от бота не получен за {self.silero_time_limit} сек.")
+                # Запрос остаётся в очереди заглушкой, чтобы запоздалый ответ не достался следующему
+                pending.expires_at = time.time() + self.silero_time_limit
+                pending.future.cancel()
+                return
 
-                try:
-                    os.remove(sound_absolute_path)
-                except OSError as remove_error:
-                    logger.info(f"Ошибка при удалении файла {sound_absolute_path}: {remove_error}")
-
-                # Устанавливаем данные через события
-                self.event_bus.emit(Events.Server.SET_PATCH_TO_SOUND_FILE, absolute_wav_path)
-                logger.info(f"Файл установлен серверу: {absolute_wav_path}")
-                self.event_bus.emit_and_wait(Events.Server.SET_ID_SOUND, {'id': message_id})
-                logger.info(f"Установленный файлу message_Id: {message_id}")
-                
-                path_to_file = absolute_wav_path
-            else:
-                logger.info(f"Отправлен воспроизводится: {sound_absolute_path}")
-                path_to_file = sound_absolute_path
-                await AudioHandler.handle_voice_file(file_path)
-        elif response.text:
-            logger.info(f"Ответ от бота: {response.text}")
-        return path_to_file
-        
+        logger.info("Ответ получен")
+        return await self._handle_voice_reply(response, message_id)
+
+    async def _drain_pending(self):
+        futures = [p.future for p in self._pending if not p.future.done()]
+        if futures:
+            await asyncio.wait(futures, timeout=self.silero_time_limit)
+
+    async def _handle_voice_reply(self, response, message_id) -> str | None:
+        # Качаем сразу в память: для игры ответ декодируется из байтов, на диск пишется только готовый WAV
+        data = await self.client.download_media(response.media, file=bytes)
+        if not data:
+            logger.info("Не удалось скачать голосовой ответ бота.")
+            return None
+        extension = ".mp3" if "audio/mpeg" in response.media.document.mime_type else ".ogg"
+        temp_dir = os.path.join(os.getcwd(), "temp")
+        os.makedirs(temp_dir, exist_ok=True)
+        base_path = os.path.abspath(os.path.join(temp_dir, f"tg_{response.id}"))
+
+        # Получаем статус подключения к игре через событие
+        connection_result = await asyncio.get_event_loop().run_in_executor(
+            None,
+            self.event_bus.emit_and_wait,
+            Events.Server.GET_GAME_CONNECTION,
+            {},
+            1.0
+        )
+        connected_to_game = connection_result[0] if connection_result else False
+
+        if connected_to_game:
+            absolute_wav_path = base_path + ".wav"
+            if not await AudioConverter.bytes_to_wav(data, absolute_wav_path, source_extension=extension):
+                logger.error("Не удалось сконвертировать ответ бота в WAV.")
+                return None
+
+            # Устанавливаем данные через события
+            self.event_bus.emit(Events.Server.SET_PATCH_TO_SOUND_FILE, absolute_wav_path)
+            logger.info(f"Файл установлен серверу: {absolute_wav_path}")
+            self.event_bus.emit_and_wait(Events.Server.SET_ID_SOUND, {'id': message_id})
+            logger.info(f"Установленный файлу message_Id: {message_id}")
+            return absolute_wav_path
+
+        sound_absolute_path = base_path + extension
+        with open(sound_absolute_path, "wb") as f:
+            f.write(data)
+        logger.info(f"Отправлен воспроизводится: {sound_absolute_path}")
+        await AudioHandler.handle_voice_file(sound_absolute_path)
+        return sound_absolute_path
 
     async def start(self):
         logger.info("Запуск коннектора ТГ!")
         try:
             await self.client.connect()
+            self.client.add_event_handler(
+                self._on_bot_message, events.NewMessage(chats=self.tg_bot, incoming=True)
+            )
 
             # Получаем event loop и auth_signals через событие
             loop_results = await asyncio.get_event_loop().run_in_executor(
@@ -1,5 +1,6 @@
 import abc
-from typing import Optional, Any, Dict, List
+import asyncio
+from typing import Optional, Any, Callable, Dict, List
 
 class IVoiceModel(abc.ABC):
     """
@@ -55,10 +56,32 @@ class IVoiceModel(abc.ABC):
         """Возвращает конфигурации моделей, которые обрабатывает данный класс."""
         pass
     
+    @property
+    def inference_key(self) -> str:
+        """Имя очереди инференса: у каждого обработчика моделей свой поток."""
+        return type(self).__name__
+
+    async def run_inference(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Выполняет синхронный вызов модели в её выделенном потоке (см. InferenceExecutor),
+        чтобы не блокировать общий цикл событий. voiceover-реализации должны звать модели только так.
+        """
+        executor = getattr(self.parent, "inference_executor", None)
+        if executor is None:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return await executor.run(self.inference_key, func, *args, **kwargs)
+
     def cleanup_state(self):
         """Сбрасывает состояние инциализации модели."""
         self.initialized = False
 
+    def unload(self):
+        """
+        Выгружает модель из памяти, не трогая другие обработчики (используется менеджером резидентности).
+        После выгрузки модель можно снова инициализировать. По умолчанию - сброс состояния.
+        """
+        self.cleanup_state()
+
     def load_model_settings(self) -> Dict[str, Any]:
         """Загружает настройки для этой конкретной модели из общего файла настроек."""
         return self.parent.load_model_settings(self.model_id)
\ No newline at end of file
@@ -8,7 +8,11 @@ import asyncio
 import re
 from xml.sax.saxutils import escape
 
+import numpy as np
+
 from .base_model import IVoiceModel
+from .pipelines import audio_chain
+from .rvc_voice_cache import RVCVoiceCache, SharedRVCComponents, DEFAULT_CAPACITY
 from typing import Optional, Any
 from main_logger import logger
 
@@ -22,7 +26,7 @@ from managers.settings_manager import SettingsManager
 
 from utils import getTranslationVariant as _, get_character_voice_paths
 
-from typing import Optional, Any, List, Dict
+from typing import Optional, Any, List, Dict, Tuple
 
 class EdgeTTS_RVC_Model(IVoiceModel):
     def __init__(self, parent: 'LocalVoice', model_id: str):
@@ -34,7 +38,13 @@ class EdgeTTS_RVC_Model(IVoiceModel):
         self.current_silero_model = None
         self.current_silero_sample_rate = 48000
         self.events = get_event_bus()
-        self._load_module()
+        # Загруженные голоса RVC по персонажам; current_tts_rvc - голос, используемый сейчас
+        self.rvc_cache = RVCVoiceCache(self._create_rvc_instance)
+        # HuBERT и rmvpe одни на все голоса в кэше
+        self.rvc_shared = SharedRVCComponents()
+        self._rvc_device: Optional[str] = None
+        self._rvc_f0_method: Optional[str] = None
+        # tts_with_rvc импортируется лениво (is_installed / initialize): импорт тянет torch и fairseq
         
     MODEL_CONFIGS = [
         {
@@ -302,10 +312,21 @@ class EdgeTTS_RVC_Model(IVoiceModel):
     def cleanup_state(self):
         super().cleanup_state()
         self.current_tts_rvc = None
+        self.rvc_shared.clear()
+        self.rvc_cache.invalidate()
         self.current_silero_model = None
         self.tts_rvc_module = None
         self._import_attempted = True
         logger.info(f"Состояние для обработчика EdgeTTS/Silero+RVC сброшено.")
+
+    def unload(self):
+        # В отличие от cleanup_state (удаление пакета) модуль tts_with_rvc остаётся импортированным
+        IVoiceModel.cleanup_state(self)
+        self.current_tts_rvc = None
+        self.rvc_shared.clear()
+        self.rvc_cache.invalidate()
+        self.current_silero_model = None
+        logger.info("Модели EdgeTTS/Silero+RVC выгружены из памяти.")
     
     
     def initialize(self, init: bool = False) -> bool:
@@ -315,6 +336,8 @@ class EdgeTTS_RVC_Model(IVoiceModel):
         # Шаг 1: Инициализация базового RVC, если его еще нет
         if self.current_tts_rvc is None:
             logger.info("Инициализация базового компонента RVC...")
+            if self.tts_rvc_module is None:
+                self._load_module()
             if self.tts_rvc_module is None:
                 logger.error("Модуль tts_with_rvc не установлен.")
                 return False
@@ -337,15 +360,12 @@ class EdgeTTS_RVC_Model(IVoiceModel):
                 logger.error(f"Не найден файл RVC модели: {model_path_to_use}")
                 return False
 
-            self.current_tts_rvc = self.tts_rvc_module(model_path=model_path_to_use, device=device, f0_method=f0_method)
-            self._adjust_sampling_rate_for_amd()
+            self._rvc_device, self._rvc_f0_method = device, f0_method
+            self._use_rvc_voice(model_path_to_use)
             logger.info(f"Базовый компонент RVC инициализирован с device={device}, f0_method={f0_method}")
         
         # Обновляем голос EdgeTTS в RVC
-        if self.parent.voice_language == "ru":
-            self.current_tts_rvc.set_voice("ru-RU-SvetlanaNeural")
-        else:
-            self.current_tts_rvc.set_voice("en-US-MichelleNeural")
+        self.current_tts_rvc.set_voice(self._edge_voice_name())
 
         # Шаг 2: Silero для режима low+
         if current_mode == "low+":
@@ -437,6 +457,144 @@ class EdgeTTS_RVC_Model(IVoiceModel):
         else:
             raise ValueError(f"Обработчик вызван с неизвестным режимом: {current_mode}")
 
+    def _run_rvc(self, filepath: str,
+                 character: Optional[Any] = None,
+                 pitch: float = 0,
+                 index_rate: float = 0.75,
+                 protect: float = 0.33,
+                 filter_radius: int = 3,
+                 rms_mix_rate: float = 0.5,
+                 is_half: bool = True,
+                 f0method: Optional[str] = None,
+                 use_index_file: bool = True) -> Optional[str]:
+        """
+        Настраивает RVC под персонажа и прогоняет через него файл. Возвращает путь к результату RVC.
+        Вызывается в потоке инференса (run_inference) целиком, вместе с настройкой модели и индекса.
+        """
+        logger.info(f"Вызов RVC для файла: {filepath}")
+
+        # Обновляем пути в parent
+        self._update_parent_paths(character)
+
+        # Получаем пути для персонажа
+        voice_paths = get_character_voice_paths(character, self.parent.provider)
+        model_path = voice_paths['pth_path']
+        index_path = voice_paths['index_path']
+
+        # Подготовка параметров инференса
+        inference_params = {
+            "pitch": pitch,
+            "index_rate": index_rate,
+            "protect": protect,
+            "filter_radius": filter_radius,
+            "rms_mix_rate": rms_mix_rate
+        }
+
+        if self.parent.provider == "NVIDIA":
+            inference_params["is_half"] = is_half
+
+        if f0method:
+            inference_params["f0method"] = f0method
+
+        # Голос персонажа и индекс (недавно использованные голоса не перезагружаются)
+        use_index = use_index_file and index_path and os.path.exists(index_path)
+        self._use_rvc_voice(model_path, index_path if use_index else None)
+
+        # Применение RVC
+        output_file_rvc = self.current_tts_rvc.voiceover_file(input_path=filepath, **inference_params)
+
+        if not output_file_rvc or not os.path.exists(output_file_rvc) or os.path.getsize(output_file_rvc) == 0:
+            return None
+        return output_file_rvc
+
+    def _edge_voice_name(self) -> str:
+        return "ru-RU-SvetlanaNeural" if self.parent.voice_language == "ru" else "en-US-MichelleNeural"
+
+    def _create_rvc_instance(self, model_path: str):
+        """Фабрика для кэша голосов: отдельный экземпляр TTS_RVC на голос с настройками из initialize."""
+        instance = self.tts_rvc_module(model_path=model_path, device=self._rvc_device, f0_method=self._rvc_f0_method)
+        instance.set_voice(self._edge_voice_name())
+        if not self.rvc_shared.attach(instance):
+            logger.debug("HuBERT/rmvpe не удалось сделать общими для голосов RVC - экземпляр со своими копиями")
+        return instance
+
+    def _use_rvc_voice(self, model_path: str, index_path: Optional[str] = None):
+        """
+        Делает голос model_path текущим. Вызывается из потока инференса RVC (озвучка) и из initialize()
+        в потоке вызывающего - поэтому кэш голосов защищён своей блокировкой.
+        """
+        try:
+            self.rvc_cache.capacity = max(1, int(self.parent.settings.get("LOCAL_VOICE_RVC_CACHE_SIZE", DEFAULT_CAPACITY)))
+        except (TypeError, ValueError):
+            self.rvc_cache.capacity = DEFAULT_CAPACITY
+        self.current_tts_rvc = self.rvc_cache.acquire(model_path, index_path)
+        self.current_tts_rvc.set_voice(self._edge_voice_name())
+        self._adjust_sampling_rate_for_amd()
+
+    def preload_voice(self, character: Optional[Any] = None) -> None:
+        """
+        Хук на смену персонажа: заранее загружает его голос RVC в потоке инференса,
+        чтобы первая реплика не ждала чтения .pth и индекса.
+        """
+        if self.current_tts_rvc is None:
+            return
+        voice_paths = get_character_voice_paths(character, self.parent.provider)
+        model_path = voice_paths['pth_path']
+        if not os.path.exists(model_path) or model_path in self.rvc_cache:
+            return
+        index_path = voice_paths['index_path'] if os.path.exists(voice_paths['index_path']) else None
+        executor = getattr(self.parent, "inference_executor", None)
+        if executor is None:
+            return
+
+        def preload():
+            try:
+                self.rvc_cache.acquire(model_path, index_path)
+            except Exception as e:
+                logger.warning(f"Не удалось заранее загрузить голос RVC {model_path}: {e}")
+
+        logger.info(f"Предзагрузка голоса RVC для персонажа '{voice_paths['character_name']}'")
+        executor.submit(self.inference_key, preload)
+
+    def _ensure_rvc_initialized(self) -> bool:
+        if not self.initialized:
+            logger.info("Инициализация RVC компонента на лету...")
+            if not self.initialize(init=False):
+                logger.error("Не удалось инициализировать RVC компонент.")
+                return False
+        return True
+
+    async def apply_rvc_to_audio(self, audio, sample_rate: int,
+                                 character: Optional[Any] = None,
+                                 **rvc_params) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Применяет RVC к аудио в памяти и возвращает (моно float32, частота) без постобработки.
+        tts_with_rvc принимает только путь, поэтому вход один раз пишется во временный WAV,
+        а результат сразу читается обратно в массив - все остальные стадии идут в памяти.
+        Параметры rvc_params - те же, что у apply_rvc_to_file (кроме volume).
+        """
+        if not self._ensure_rvc_initialized():
+            return None
+        os.makedirs("temp", exist_ok=True)
+        with tempfile.NamedTemporaryFile(suffix=".wav", dir="temp", delete=False) as temp_wav_file:
+            input_path = temp_wav_file.name
+        output_file_rvc = None
+        try:
+            audio_chain.write_wav(input_path, audio_chain.to_mono(audio), sample_rate)
+            output_file_rvc = await self.run_inference(self._run_rvc, input_path, character, **rvc_params)
+            if output_file_rvc is None:
+                return None
+            return audio_chain.read_wav(output_file_rvc)
+        except Exception as error:
+            traceback.print_exc()
+            logger.info(f"Ошибка при применении RVC к аудио: {error}")
+            return None
+        finally:
+            for path in (input_path, output_file_rvc):
+                if path:
+                    try: os.remove(path)
+                    except OSError: pass
+
     async def apply_rvc_to_file(self, filepath: str, 
                                character: Optional[Any] = None,
                                pitch: float = 0,
@@ -465,90 +623,32 @@ class EdgeTTS_RVC_Model(IVoiceModel):
         - use_index_file: использовать индексный файл если доступен
         - original_model_id: ID исходной модели для конфигурации (устарело)
         """
-        if not self.initialized:
-            logger.info("Инициализация RVC компонента на лету...")
-            if not self.initialize(init=False):
-                logger.error("Не удалось инициализировать RVC компонент.")
-                return None
-
-        logger.info(f"Вызов RVC для файла: {filepath}")
-        
+        if not self._ensure_rvc_initialized():
+            return None
         try:
-            # Обновляем пути в parent
-            self._update_parent_paths(character)
-            
-            # Получаем пути для персонажа
-            voice_paths = get_character_voice_paths(character, self.parent.provider)
-            model_path = voice_paths['pth_path']
-            index_path = voice_paths['index_path']
-            
-            # Подготовка параметров инференса
-            inference_params = {
-                "pitch": pitch,
-                "index_rate": index_rate,
-                "protect": protect,
-                "filter_radius": filter_radius,
-                "rms_mix_rate": rms_mix_rate
-            }
-            
-            if self.parent.provider == "NVIDIA":
-                inference_params["is_half"] = is_half
-                
-            if f0method:
-                inference_params["f0method"] = f0method
-            
-            # Установка индексного файла
-            if use_index_file and index_path and os.path.exists(index_path):
-                self.current_tts_rvc.set_index_path(index_path)
-            else:
-                self.current_tts_rvc.set_index_path("")
-            
-            self._adjust_sampling_rate_for_amd()
-
-            # Обновление модели если необходимо
-            if os.path.abspath(model_path) != os.path.abspath(self.current_tts_rvc.current_model):
-                if self.parent.provider in ["NVIDIA"]:
-                    self.current_tts_rvc.current_model = model_path
-                elif self.parent.provider in ["AMD"]:
-                    if hasattr(self.current_tts_rvc, 'set_model'):
-                        self.current_tts_rvc.set_model(model_path)
-                        logger.info(f'RVC модель изменена на: {model_path}')
-                    else:
-                        self.current_tts_rvc.current_model = model_path
-                        logger.info(f'RVC модель изменена на: {model_path}')
-                        logger.warning("Метод 'set_model' не найден, используется прямое присваивание (может не работать на AMD).")
-            else:
-                logger.info(f'RVC модель не изменилась: {model_path}')
-            
-            # Применение RVC
-            output_file_rvc = self.current_tts_rvc.voiceover_file(input_path=filepath, **inference_params)
-            
-            if not output_file_rvc or not os.path.exists(output_file_rvc) or os.path.getsize(output_file_rvc) == 0:
-                return None
-            
-            # Конвертация в стерео
-            stereo_output_file = output_file_rvc.replace(".wav", "_stereo.wav")
-            converted_file = self.parent.convert_wav_to_stereo(
-                output_file_rvc, 
-                stereo_output_file, 
-                atempo=1.0, 
-                volume=volume,
+            output_file_rvc = await self.run_inference(
+                self._run_rvc, filepath, character,
+                pitch=pitch, index_rate=index_rate, protect=protect, filter_radius=filter_radius,
+                rms_mix_rate=rms_mix_rate, is_half=is_half, f0method=f0method, use_index_file=use_index_file,
             )
-
-            if converted_file and os.path.exists(converted_file):
-                final_output_path = stereo_output_file
-                try: os.remove(output_file_rvc)
-                except OSError: pass
-            else:
-                final_output_path = output_file_rvc
-            
-            return final_output_path
-            
+            if output_file_rvc is None:
+                return None
+            return await asyncio.to_thread(self._finalize_rvc_output, output_file_rvc, volume)
         except Exception as error:
             traceback.print_exc()
             logger.info(f"Ошибка при применении RVC к файлу: {error}")
             return None
 
+    def _finalize_rvc_output(self, output_file_rvc: str, volume: str) -> str:
+        """Стерео 44100 + громкость в памяти (вместо convert_wav_to_stereo), результат - *_stereo.wav."""
+        audio, sample_rate = audio_chain.read_wav(output_file_rvc)
+        stereo, stereo_rate = audio_chain.postprocess(audio, sample_rate, volume=volume)
+        stereo_output_file = output_file_rvc.replace(".wav", "_stereo.wav")
+        final_output_path = audio_chain.write_wav(stereo_output_file, stereo, stereo_rate)
+        try: os.remove(output_file_rvc)
+        except OSError: pass
+        return final_output_path
+
     async def _voiceover_edge_tts_rvc(self, text, character=None, TEST_WITH_DONE_AUDIO: str = None, settings_model_id: Optional[str] = None):
         if self.current_tts_rvc is None:
             raise Exception("Компонент RVC не инициализирован.")
@@ -578,56 +678,31 @@ class EdgeTTS_RVC_Model(IVoiceModel):
             tts_rate = int(settings.get("tts_rate", 0)) if config_id != "medium+low" else 0
             vol = str(settings.get("volume", "1.0")) 
 
-            if use_index_file and index_path and os.path.exists(index_path):
-                self.current_tts_rvc.set_index_path(index_path)
-            else:
-                self.current_tts_rvc.set_index_path("")
-            
-            if self.parent.provider in ["NVIDIA"]:
-                inference_params = {"pitch": pitch, "index_rate": index_rate, "protect": protect, "filter_radius": filter_radius, "rms_mix_rate": rms_mix_rate, "is_half": is_half}
-            else:
-                inference_params = {"pitch": pitch, "index_rate": index_rate, "protect": protect, "filter_radius": filter_radius, "rms_mix_rate": rms_mix_rate}
-            if f0method_override:
-                inference_params["f0method"] = f0method_override
+            # Настройка RVC и сам инференс - одна задача в потоке модели, чтобы параллельный запрос
+            # не переключил модель/индекс между настройкой и вызовом
+            def infer():
+                use_index = use_index_file and index_path and os.path.exists(index_path)
+                self._use_rvc_voice(model_path, index_path if use_index else None)
             
-            # Локальная переменная для отслеживания смены модели
-            current_model_abs = os.path.abspath(self.current_tts_rvc.current_model)
-            model_path_abs = os.path.abspath(model_path)
-            
-            if current_model_abs != model_path_abs:
                 if self.parent.provider in ["NVIDIA"]:
-                    self.current_tts_rvc.current_model = model_path
-                elif self.parent.provider in ["AMD"]:
-                    if hasattr(self.current_tts_rvc, 'set_model'):
-                        self.current_tts_rvc.set_model(model_path)
-                    else:
-                        self.current_tts_rvc.current_model = model_path
-                        logger.warning("Метод 'set_model' не найден, используется прямое присваивание (может не работать на AMD).")
-                logger.info(f"RVC модель изменена на: {model_path}")
-
-            self._adjust_sampling_rate_for_amd()
-
-            if not TEST_WITH_DONE_AUDIO:
-                inference_params["tts_rate"] = tts_rate
-                output_file_rvc = self.current_tts_rvc(text=text, **inference_params)
-            else:
-                output_file_rvc = self.current_tts_rvc.voiceover_file(input_path=TEST_WITH_DONE_AUDIO, **inference_params)
+                    inference_params = {"pitch": pitch, "index_rate": index_rate, "protect": protect, "filter_radius": filter_radius, "rms_mix_rate": rms_mix_rate, "is_half": is_half}
+                else:
+                    inference_params = {"pitch": pitch, "index_rate": index_rate, "protect": protect, "filter_radius": filter_radius, "rms_mix_rate": rms_mix_rate}
+                if f0method_override:
+                    inference_params["f0method"] = f0method_override
+
+                if not TEST_WITH_DONE_AUDIO:
+                    inference_params["tts_rate"] = tts_rate
+                    return self.current_tts_rvc(text=text, **inference_params)
+                else:
+                    return self.current_tts_rvc.voiceover_file(input_path=TEST_WITH_DONE_AUDIO, **inference_params)
+
+            output_file_rvc = await self.run_inference(infer)
 
             if not output_file_rvc or not os.path.exists(output_file_rvc) or os.path.getsize(output_file_rvc) == 0:
                 return None
             
-            stereo_output_file = output_file_rvc.replace(".wav", "_stereo.wav")
-            converted_file = self.parent.convert_wav_to_stereo(output_file_rvc, 
-                                                               stereo_output_file, 
-                                                               atempo=1.0, 
-                                                               volume=vol)
-
-            if converted_file and os.path.exists(converted_file):
-                final_output_path = stereo_output_file
-                try: os.remove(output_file_rvc)
-                except OSError: pass
-            else:
-                final_output_path = output_file_rvc
+            final_output_path = await asyncio.to_thread(self._finalize_rvc_output, output_file_rvc, vol)
 
             connected_to_game = self.events.emit_and_wait(Events.Server.GET_GAME_CONNECTION)[0]
             if connected_to_game and TEST_WITH_DONE_AUDIO is None:
@@ -718,7 +793,8 @@ class EdgeTTS_RVC_Model(IVoiceModel):
             settings = self.parent.load_model_settings('low+')
             
             # Параметры для Silero TTS
-            audio_tensor = self.current_silero_model.apply_tts(
+            audio_tensor = await self.run_inference(
+                self.current_silero_model.apply_tts,
                 ssml_text=ssml_text, 
                 speaker=character_speaker, 
                 sample_rate=self.current_silero_sample_rate,
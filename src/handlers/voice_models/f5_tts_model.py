@@ -7,6 +7,8 @@ from datetime import datetime
 import asyncio
 
 from .base_model import IVoiceModel
+from .pipelines import audio_chain
+from .reference_cache import ReferenceCache
 from typing import Optional, Any, List, Dict
 from main_logger import logger
 
@@ -31,6 +33,7 @@ class F5TTSModel(IVoiceModel):
         self.events = get_event_bus()
         self.rvc_handler = rvc_handler
         self.ruaccent_instance = None
+        self.reference_cache = ReferenceCache()
 
     MODEL_CONFIGS = [
         {
@@ -381,12 +384,21 @@ class F5TTSModel(IVoiceModel):
         self.current_f5_pipeline = None
         self.f5_pipeline_module = None
         self.ruaccent_instance = None
+        self.reference_cache.invalidate()
         
         if self.rvc_handler and self.rvc_handler.initialized:
             self.rvc_handler.cleanup_state()
         
         logger.info(f"Состояние для модели {self.model_id} сброшено.")
 
+    def unload(self):
+        # Общий RVC-обработчик не трогаем: он может быть нужен другим режимам и выгружается отдельно
+        IVoiceModel.cleanup_state(self)
+        self.current_f5_pipeline = None
+        self.ruaccent_instance = None
+        self.reference_cache.invalidate()
+        logger.info(f"Модель {self.model_id} выгружена из памяти.")
+
     def initialize(self, init: bool = False) -> bool:
         if self.initialized:
             return True
@@ -491,6 +503,71 @@ class F5TTSModel(IVoiceModel):
             logger.warning(f"Ошибка при применении RUAccent: {e}")
             return text
 
+    def _resolve_reference_files(self, character, reference_postfix: str):
+        """
+        Ищет референс персонажа: <char>_Cuts с постфиксом -> F5-референс -> обычный клон-голос -> Mila.
+        Возвращает (путь к аудио, путь к тексту или None).
+        """
+        # Используем get_character_voice_paths для получения путей
+        voice_paths = get_character_voice_paths(character, self.parent.provider)
+        default_voice_paths = get_character_voice_paths(None, self.parent.provider)
+
+        candidates = []
+        # Пробуем найти файлы персонажа с постфиксом
+        if character and hasattr(character, 'short_name'):
+            char_name = character.short_name
+            candidates.append((
+                os.path.join("Models", f"{char_name}_Cuts", f"{char_name}_{reference_postfix}.wav"),
+                os.path.join("Models", f"{char_name}_Cuts", f"{char_name}_{reference_postfix}.txt"),
+            ))
+        # Стандартные пути для F5, затем обычные файлы персонажа, затем Mila
+        candidates += [
+            (voice_paths['f5_voice_filename'], voice_paths['f5_voice_text']),
+            (voice_paths['clone_voice_filename'], voice_paths['clone_voice_text']),
+            (default_voice_paths['f5_voice_filename'], default_voice_paths['f5_voice_text']),
+            (default_voice_paths['clone_voice_filename'], default_voice_paths['clone_voice_text']),
+        ]
+
+        for audio_path, text_path in candidates:
+            if os.path.exists(audio_path):
+                return audio_path, (text_path if os.path.exists(text_path) else None)
+
+        raise FileNotFoundError("Для F5-TTS требуется референсное аудио, но оно не найдено.")
+
+    def _reference_watch_paths(self, character) -> List[str]:
+        """Папки, где ищутся референсы: появление/удаление файла в них сбрасывает кэш."""
+        names = ["Mila"]
+        if character and hasattr(character, 'short_name'):
+            names.insert(0, str(character.short_name))
+        return ["Models"] + [os.path.join("Models", f"{name}_Cuts") for name in names]
+
+    def _get_reference(self, character, reference_postfix: str) -> Dict[str, Any]:
+        """
+        Референс для генерации из кэша: найденные файлы, текст после RUAccent и результат
+        prepare_reference пайплайна. Пересчитывается только при изменении файлов референса.
+        Вызывается в потоке инференса модели.
+        """
+        char_name = getattr(character, 'short_name', None) if character else None
+        accented = self.ruaccent_instance is not None
+        key = (char_name, reference_postfix, accented)
+
+        def build():
+            audio_path, text_path = self._resolve_reference_files(character, reference_postfix)
+            ref_text = ""
+            if text_path:
+                with open(text_path, "r", encoding="utf-8") as f:
+                    ref_text = f.read().strip()
+            if accented and ref_text:
+                ref_text = self._apply_ruaccent(ref_text)
+            prepared_audio, prepared_text = self.current_f5_pipeline.prepare_reference(audio_path, ref_text)
+            return {"source_audio": audio_path, "source_text": text_path,
+                    "audio": prepared_audio, "text": prepared_text}
+
+        return self.reference_cache.get(
+            key, self._reference_watch_paths(character), build,
+            extra_watch=lambda ref: [p for p in (ref["source_audio"], ref["source_text"], ref["audio"]) if p]
+        )
+
     async def voiceover(self, text: str, character: Optional[Any] = None, **kwargs) -> Optional[str]:
         if not self.initialized:
             raise Exception(f"Модель {self.model_id} не инициализирована.")
@@ -500,8 +577,8 @@ class F5TTSModel(IVoiceModel):
             settings = self.parent.load_model_settings(mode)
             is_combined_model = mode == "high+low"
             
-            # Загружаем RUAccent если нужно
-            self._load_ruaccent_if_needed(settings)
+            # Загружаем RUAccent если нужно (первая загрузка тяжёлая - тоже в потоке модели)
+            await self.run_inference(self._load_ruaccent_if_needed, settings)
             
             # Определяем ключи параметров в зависимости от режима
             speed_key = "f5rvc_f5_speed" if is_combined_model else "speed"
@@ -510,101 +587,47 @@ class F5TTSModel(IVoiceModel):
             seed_key = "f5rvc_f5_seed" if is_combined_model else "seed"
 
             reference_postfix = kwargs.get("reference_postfix", "default")
+            reference = await self.run_inference(self._get_reference, character, reference_postfix)
+            ref_audio_path = reference["audio"]
+            ref_text_content = reference["text"]
 
-            # Используем get_character_voice_paths для получения путей
-            voice_paths = get_character_voice_paths(character, self.parent.provider)
-            
-            ref_audio_path = None
-            ref_text_content = ""
-            
-            # Пробуем найти файлы персонажа с постфиксом
-            if character and hasattr(character, 'short_name'):
-                char_name = character.short_name
-                potential_audio_path = os.path.join("Models", f"{char_name}_Cuts", f"{char_name}_{reference_postfix}.wav")
-                potential_text_path = os.path.join("Models", f"{char_name}_Cuts", f"{char_name}_{reference_postfix}.txt")
-                if os.path.exists(potential_audio_path):
-                    ref_audio_path = potential_audio_path
-                    if os.path.exists(potential_text_path):
-                        with open(potential_text_path, "r", encoding="utf-8") as f: 
-                            ref_text_content = f.read().strip()
-            
-            # Если не нашли с постфиксом, используем стандартные пути из voice_paths для F5
-            if not ref_audio_path and os.path.exists(voice_paths['f5_voice_filename']):
-                ref_audio_path = voice_paths['f5_voice_filename']
-                if os.path.exists(voice_paths['f5_voice_text']):
-                    with open(voice_paths['f5_voice_text'], "r", encoding="utf-8") as f: 
-                        ref_text_content = f.read().strip()
-            
-            # Fallback на обычные файлы персонажа
-            if not ref_audio_path and os.path.exists(voice_paths['clone_voice_filename']):
-                ref_audio_path = voice_paths['clone_voice_filename']
-                if os.path.exists(voice_paths['clone_voice_text']):
-                    with open(voice_paths['clone_voice_text'], "r", encoding="utf-8") as f: 
-                        ref_text_content = f.read().strip()
-            
-            # Fallback на Mila если персонаж не найден
-            if not ref_audio_path:
-                default_voice_paths = get_character_voice_paths(None, self.parent.provider)
-                if os.path.exists(default_voice_paths['f5_voice_filename']):
-                    ref_audio_path = default_voice_paths['f5_voice_filename']
-                    if os.path.exists(default_voice_paths['f5_voice_text']):
-                        with open(default_voice_paths['f5_voice_text'], "r", encoding="utf-8") as f: 
-                            ref_text_content = f.read().strip()
-                elif os.path.exists(default_voice_paths['clone_voice_filename']):
-                    ref_audio_path = default_voice_paths['clone_voice_filename']
-                    if os.path.exists(default_voice_paths['clone_voice_text']):
-                        with open(default_voice_paths['clone_voice_text'], "r", encoding="utf-8") as f: 
-                            ref_text_content = f.read().strip()
-            
-            if not ref_audio_path:
-                raise FileNotFoundError("Для F5-TTS требуется референсное аудио, но оно не найдено.")
-            
-            # Применяем RUAccent к текстам если включено
+            # Применяем RUAccent к тексту реплики если включено (референс уже акцентирован в кэше)
             if self.ruaccent_instance is not None:
-                text = self._apply_ruaccent(text)
-                if ref_text_content:
-                    ref_text_content = self._apply_ruaccent(ref_text_content)
+                text = await self.run_inference(self._apply_ruaccent, text)
             
-            hash_object = hashlib.sha1(f"{text[:20]}_{datetime.now().timestamp()}".encode())
-            output_path = os.path.join("temp", f"f5_raw_{hash_object.hexdigest()[:10]}.wav")
-            os.makedirs("temp", exist_ok=True)
-
             seed_processed = int(settings.get(seed_key, 0))
             vol = str(settings.get("volume", "1.0"))
             if seed_processed <= 0 or seed_processed > 2**31 - 1: seed_processed = 42
             
-            await asyncio.to_thread(
-                self.current_f5_pipeline.generate,
+            result = await self.run_inference(
+                self.current_f5_pipeline.generate_audio,
                 text_to_generate=text,
-                output_path=output_path,
                 ref_audio=ref_audio_path,
                 ref_text=ref_text_content,
+                ref_prepared=True,
                 speed=float(settings.get(speed_key, 1.0)),
-                remove_silence=settings.get(remove_silence_key, True),
                 nfe_step=int(settings.get(nfe_step_key, 32)),
                 seed=seed_processed
             )
-
-            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            if result is None:
                 return None
-            
-            stereo_output_path = output_path.replace("_raw", "_stereo")
-            converted_file = self.parent.convert_wav_to_stereo(output_path, stereo_output_path, volume=vol)
 
-            processed_output_path = stereo_output_path if converted_file and os.path.exists(converted_file) else output_path
-            if processed_output_path == stereo_output_path:
-                try: os.remove(output_path)
-                except OSError: pass
-            
-            final_output_path = processed_output_path
+            # Дальше всё в памяти: удаление пауз, громкость, RVC (для high+low), стерео 44100 - и одна запись на диск
+            audio, sample_rate = result
+            audio = audio_chain.to_mono(audio)
+            if settings.get(remove_silence_key, True):
+                audio = audio_chain.remove_long_silences(audio, sample_rate)
+            if audio.size == 0:
+                return None
+            audio = audio_chain.apply_gain(audio, vol)
 
             if mode == "high+low":
                 if self.rvc_handler:
-                    logger.info(f"Применяем RVC с параметрами F5+RVC к файлу: {final_output_path}")
+                    logger.info("Применяем RVC с параметрами F5+RVC к аудио")
                     
                     # Получаем f5_rvc параметры из настроек
-                    rvc_output_path = await self.rvc_handler.apply_rvc_to_file(
-                        filepath=final_output_path,
+                    rvc_result = await self.rvc_handler.apply_rvc_to_audio(
+                        audio, sample_rate,
                         character=character,  # Передаем персонажа
                         pitch=float(settings.get("f5rvc_rvc_pitch", 0)),
                         index_rate=float(settings.get("f5rvc_index_rate", 0.75)),
@@ -614,18 +637,20 @@ class F5TTSModel(IVoiceModel):
                         is_half=settings.get("f5rvc_is_half", "True").lower() == "true",
                         f0method=settings.get("f5rvc_f0method", None),
                         use_index_file=settings.get("f5rvc_use_index_file", True),
-                        volume=vol
                     )
                     
-                    if rvc_output_path and os.path.exists(rvc_output_path):
-                        if final_output_path != rvc_output_path:
-                            try: os.remove(final_output_path)
-                            except OSError: pass
-                        final_output_path = rvc_output_path
+                    if rvc_result is not None:
+                        audio, sample_rate = rvc_result
+                        audio = audio_chain.apply_gain(audio, vol)
                     else:
                         logger.warning("Ошибка во время обработки RVC. Возвращается результат до RVC.")
                 else:
                     logger.warning("Модель 'high+low' требует RVC, но обработчик не был предоставлен.")
+
+            stereo, stereo_rate = audio_chain.postprocess(audio, sample_rate)
+            hash_object = hashlib.sha1(f"{text[:20]}_{datetime.now().timestamp()}".encode())
+            stereo_output_path = os.path.join("temp", f"f5_stereo_{hash_object.hexdigest()[:10]}.wav")
+            final_output_path = audio_chain.write_wav(stereo_output_path, stereo, stereo_rate)
             
             connected_to_game = self.events.emit_and_wait(Events.Server.GET_GAME_CONNECTION)[0]
             if connected_to_game:
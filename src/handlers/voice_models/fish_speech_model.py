@@ -11,6 +11,8 @@ from typing import Optional, Any, List, Dict
 from main_logger import logger
 
 from .edge_tts_rvc_model import EdgeTTS_RVC_Model
+from .pipelines import audio_chain
+from .reference_cache import ReferenceCache
 import importlib.util
 
 import subprocess
@@ -31,6 +33,7 @@ class FishSpeechModel(IVoiceModel):
         self.current_fish_speech = None
         self.events = get_event_bus()
         self.rvc_handler = rvc_handler
+        self.reference_cache = ReferenceCache()
 
     MODEL_CONFIGS = [
         {
@@ -484,6 +487,7 @@ class FishSpeechModel(IVoiceModel):
         super().cleanup_state()
         self.current_fish_speech = None
         self.fish_speech_module = None
+        self.reference_cache.invalidate()
         if self.parent.first_compiled is not None:
             logger.info("Сброс состояния компиляции Fish Speech из-за удаления.")
             self.parent.first_compiled = None
@@ -493,6 +497,13 @@ class FishSpeechModel(IVoiceModel):
 
         logger.info(f"Состояние для модели {self.model_id} сброшено.")
 
+    def unload(self):
+        # Общий RVC-обработчик не трогаем, first_compiled тоже: режим компиляции нельзя сменить без перезапуска
+        IVoiceModel.cleanup_state(self)
+        self.current_fish_speech = None
+        self.reference_cache.invalidate()
+        logger.info(f"Модель {self.model_id} выгружена из памяти.")
+
     def initialize(self, init: bool = False) -> bool:
         if self.initialized:
             return True
@@ -579,14 +590,7 @@ class FishSpeechModel(IVoiceModel):
             max_tokens_key = "fsprvc_fsp_max_tokens" if is_combined_model else "max_new_tokens"
             seed_key = "fsprvc_fsp_seed" if is_combined_model else "seed"
 
-            voice_paths = get_character_voice_paths(character, self.parent.provider)
-            reference_audio_path = None
-            reference_text = ""
-            if os.path.exists(voice_paths['clone_voice_filename']):
-                reference_audio_path = voice_paths['clone_voice_filename']
-                if os.path.exists(voice_paths['clone_voice_text']):
-                    with open(voice_paths['clone_voice_text'], "r", encoding="utf-8") as file:
-                        reference_text = file.read().strip()
+            reference_audio_path, reference_text = self._get_reference(character)
 
             seed_processed = int(settings.get(seed_key, 0))
             if seed_processed <= 0 or seed_processed > 2**31 - 1:
@@ -594,7 +598,8 @@ class FishSpeechModel(IVoiceModel):
 
             vol = str(settings.get("volume", "1.0"))
 
-            sample_rate, audio_data = self.current_fish_speech(
+            sample_rate, audio_data = await self.run_inference(
+                self.current_fish_speech,
                 text=text,
                 reference_audio=reference_audio_path,
                 reference_audio_text=reference_text,
@@ -607,33 +612,15 @@ class FishSpeechModel(IVoiceModel):
                 use_memory_cache=True,
             )
 
-            hash_object = hashlib.sha1(f"{text[:20]}_{datetime.now().timestamp()}".encode())
-            raw_output_filename = f"fish_raw_{hash_object.hexdigest()[:10]}.wav"
-            raw_output_path = os.path.abspath(os.path.join("temp", raw_output_filename))
-            os.makedirs("temp", exist_ok=True)
-            
-            import soundfile as sf
-            sf.write(raw_output_path, audio_data, sample_rate)
-
-            if not os.path.exists(raw_output_path) or os.path.getsize(raw_output_path) == 0:
+            # Дальше всё в памяти: громкость, RVC (для medium+low), стерео 44100 - и одна запись на диск
+            audio = audio_chain.apply_gain(audio_chain.to_mono(audio_data), 0.5 + float(vol))
+            if audio.size == 0:
                 return None
 
-            stereo_output_path = raw_output_path.replace("_raw", "_stereo")
-            converted_file = self.parent.convert_wav_to_stereo(raw_output_path, stereo_output_path, volume=str(0.5+float(vol)))
-            
-            processed_output_path = stereo_output_path if converted_file and os.path.exists(converted_file) else raw_output_path
-            if processed_output_path == stereo_output_path:
-                try:
-                    os.remove(raw_output_path)
-                except OSError:
-                    pass
-            
-            final_output_path = processed_output_path
-
             if mode == "medium+low" and self.rvc_handler:
-                logger.info(f"Применяем RVC с параметрами FSP+RVC к файлу: {final_output_path}")
-                rvc_output_path = await self.rvc_handler.apply_rvc_to_file(
-                    filepath=final_output_path,
+                logger.info("Применяем RVC с параметрами FSP+RVC к аудио")
+                rvc_result = await self.rvc_handler.apply_rvc_to_audio(
+                    audio, sample_rate,
                     character=character,
                     pitch=float(settings.get("fsprvc_rvc_pitch", 0)),
                     index_rate=float(settings.get("fsprvc_index_rate", 0.75)),
@@ -643,20 +630,20 @@ class FishSpeechModel(IVoiceModel):
                     is_half=settings.get("fsprvc_is_half", "True").lower() == "true",
                     f0method=settings.get("fsprvc_f0method", None),
                     use_index_file=settings.get("fsprvc_use_index_file", True),
-                    volume=vol
                 )
-                if rvc_output_path and os.path.exists(rvc_output_path):
-                    if final_output_path != rvc_output_path:
-                        try:
-                            os.remove(final_output_path)
-                        except OSError:
-                            pass
-                    final_output_path = rvc_output_path
+                if rvc_result is not None:
+                    audio, sample_rate = rvc_result
+                    audio = audio_chain.apply_gain(audio, vol)
                 else:
                     logger.warning("Ошибка во время обработки RVC. Возвращается результат до RVC.")
             elif mode == "medium+low" and not self.rvc_handler:
                 logger.warning("Модель 'medium+low' требует RVC, но обработчик не был предоставлен.")
 
+            stereo, stereo_rate = audio_chain.postprocess(audio, sample_rate)
+            hash_object = hashlib.sha1(f"{text[:20]}_{datetime.now().timestamp()}".encode())
+            stereo_output_path = os.path.join("temp", f"fish_stereo_{hash_object.hexdigest()[:10]}.wav")
+            final_output_path = audio_chain.write_wav(stereo_output_path, stereo, stereo_rate)
+
             res_conn = self.events.emit_and_wait(Events.Server.GET_GAME_CONNECTION)
             connected_to_game = res_conn[0] if res_conn else False
             if connected_to_game:
@@ -668,5 +655,25 @@ class FishSpeechModel(IVoiceModel):
             logger.info(f"Ошибка при создании озвучки с Fish Speech ({self.model_id}): {error}")
             return None
         
+    def _get_reference(self, character):
+        """
+        (путь к референсному аудио или None, текст референса) для персонажа, из кэша.
+        Закодированный референс fish_speech_lib держит сам (use_memory_cache=True).
+        """
+        voice_paths = get_character_voice_paths(character, self.parent.provider)
+        audio_path = voice_paths['clone_voice_filename']
+        text_path = voice_paths['clone_voice_text']
+
+        def build():
+            if not os.path.exists(audio_path):
+                return None, ""
+            reference_text = ""
+            if os.path.exists(text_path):
+                with open(text_path, "r", encoding="utf-8") as file:
+                    reference_text = file.read().strip()
+            return audio_path, reference_text
+
+        return self.reference_cache.get(voice_paths['character_name'], (audio_path, text_path), build)
+
     def _mode(self) -> str:
         return (self.parent.current_model_id or "medium")
\ No newline at end of file
@@ -0,0 +1,48 @@
+# handlers/voice_models/inference_executor.py
+"""
+Выделенные потоки для инференса TTS/RVC.
+
+Вызовы моделей (Fish Speech, F5, Silero, RVC) синхронные и занимают секунды. Если делать их прямо
+в корутине, они блокируют общий цикл LoopController, на котором живут сервер игры, Telegram и ASR.
+Здесь у каждой модели свой однопоточный исполнитель с очередью: вызовы одной модели идут строго
+по очереди (модели не потокобезопасны), а разные модели (например, Fish и RVC) не мешают друг другу.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from main_logger import logger
+
+
+class InferenceExecutor:
+    def __init__(self):
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self, model_key: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(model_key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"TTS-{model_key}")
+                self._executors[model_key] = executor
+                logger.info(f"Создан поток инференса для модели '{model_key}'")
+            return executor
+
+    async def run(self, model_key: str, func: Callable, *args, **kwargs) -> Any:
+        """Ставит вызов в очередь модели и ждёт результата, не блокируя текущий цикл событий."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(model_key), functools.partial(func, *args, **kwargs))
+
+    def submit(self, model_key: str, func: Callable, *args, **kwargs) -> Future:
+        """Ставит фоновую задачу (например, предзагрузку) в очередь модели, не дожидаясь результата."""
+        return self._get_executor(model_key).submit(func, *args, **kwargs)
+
+    def shutdown(self, model_key: str = None):
+        """Останавливает поток одной модели (после выгрузки) или все потоки."""
+        with self._lock:
+            keys = [model_key] if model_key else list(self._executors)
+            executors = [self._executors.pop(key) for key in keys if key in self._executors]
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
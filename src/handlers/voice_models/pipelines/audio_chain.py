@@ -0,0 +1,134 @@
+# handlers/voice_models/pipelines/audio_chain.py
+"""
+Постобработка озвучки в памяти, без промежуточных WAV и запусков ffmpeg.
+
+Раньше каждая реплика проходила через convert_wav_to_stereo (ffmpeg: rubberband/atempo/volume,
+44100 Гц, стерео) после TTS и ещё раз после RVC. Теперь модели отдают numpy-массив,
+цепочка ниже делает то же самое над массивом, и на диск пишется только итоговый файл.
+"""
+import os
+from typing import Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from main_logger import logger
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+TARGET_SAMPLE_RATE = 44100
+
+
+def to_mono(audio) -> np.ndarray:
+    """Любой вход (список, тензор.numpy(), int16, стерео) -> float32 моно в диапазоне [-1, 1]."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / np.iinfo(audio.dtype).max
+    else:
+        audio = audio.astype(np.float32, copy=False)
+    audio = np.squeeze(audio)
+    if audio.ndim == 2:
+        # (каналы, отсчёты) от torch или (отсчёты, каналы) от soundfile
+        channel_axis = 0 if audio.shape[0] < audio.shape[1] else 1
+        audio = audio.mean(axis=channel_axis)
+    return audio
+
+
+def resample(audio: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    if source_rate == target_rate or audio.size == 0:
+        return audio
+    if soxr is not None:
+        return soxr.resample(audio, source_rate, target_rate, quality="HQ").astype(np.float32, copy=False)
+    # Запасной вариант без soxr: линейная интерполяция
+    duration = audio.shape[0] / source_rate
+    target_len = int(round(duration * target_rate))
+    source_x = np.linspace(0.0, duration, num=audio.shape[0], endpoint=False)
+    target_x = np.linspace(0.0, duration, num=target_len, endpoint=False)
+    return np.interp(target_x, source_x, audio).astype(np.float32)
+
+
+def apply_gain(audio: np.ndarray, volume: Union[str, float]) -> np.ndarray:
+    """Линейный множитель громкости, как фильтр volume у ffmpeg."""
+    volume = float(volume)
+    if volume == 1.0:
+        return audio
+    return audio * np.float32(volume)
+
+
+def change_pitch_tempo(audio: np.ndarray, sample_rate: int, pitch: float = 0.0, atempo: float = 1.0) -> np.ndarray:
+    """Сдвиг тона (в полутонах) и темпа. Нужен librosa (ставится вместе с моделями озвучки)."""
+    if pitch == 0.0 and atempo == 1.0:
+        return audio
+    try:
+        import librosa
+    except ImportError:
+        logger.warning("librosa не установлена, изменение тона/темпа пропущено.")
+        return audio
+    if pitch != 0.0:
+        audio = librosa.effects.pitch_shift(audio, sr=sample_rate, n_steps=pitch)
+    if atempo != 1.0:
+        audio = librosa.effects.time_stretch(audio, rate=atempo)
+    return audio.astype(np.float32, copy=False)
+
+
+def remove_long_silences(audio: np.ndarray, sample_rate: int, min_silence: float = 1.0,
+                         threshold_db: float = -50.0, keep: float = 0.5) -> np.ndarray:
+    """
+    Сокращает паузы длиннее min_silence секунд до keep секунд с каждой стороны от речи
+    (аналог remove_silence_for_generated_wav из f5_tts, но без pydub и файла).
+    """
+    frame = max(1, int(sample_rate * 0.01))
+    n_frames = audio.shape[0] // frame
+    if n_frames == 0:
+        return audio
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1) + 1e-12)
+    silent = 20.0 * np.log10(rms) < threshold_db
+
+    min_frames = int(min_silence * 100)
+    keep_frames = int(keep * 100)
+    mask = np.ones(audio.shape[0], dtype=bool)
+
+    start = None
+    for i in range(n_frames + 1):
+        is_silent = i < n_frames and silent[i]
+        if is_silent and start is None:
+            start = i
+        elif not is_silent and start is not None:
+            if i - start >= min_frames:
+                cut_from = start if start == 0 else start + keep_frames
+                cut_to = i if i == n_frames else i - keep_frames
+                if cut_to > cut_from:
+                    mask[cut_from * frame:cut_to * frame] = False
+            start = None
+    return audio[mask]
+
+
+def postprocess(audio, sample_rate: int, *, volume: Union[str, float] = 1.0, pitch: float = 0.0,
+                atempo: float = 1.0, target_rate: int = TARGET_SAMPLE_RATE) -> Tuple[np.ndarray, int]:
+    """
+    Полная цепочка: моно float32 -> тон/темп -> громкость -> ресемплинг -> стерео.
+    Возвращает массив формы (отсчёты, 2) и частоту дискретизации.
+    """
+    mono = to_mono(audio)
+    mono = change_pitch_tempo(mono, sample_rate, pitch=pitch, atempo=atempo)
+    mono = apply_gain(mono, volume)
+    mono = resample(mono, sample_rate, target_rate)
+    stereo = np.repeat(mono[:, np.newaxis], 2, axis=1)
+    return stereo, target_rate
+
+
+def write_wav(path: str, audio: np.ndarray, sample_rate: int) -> str:
+    """Пишет PCM 16 бит (как раньше pcm_s16le у ffmpeg) и возвращает абсолютный путь."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sf.write(path, np.clip(audio, -1.0, 1.0), sample_rate, subtype="PCM_16")
+    return os.path.abspath(path)
+
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    audio, sample_rate = sf.read(path, dtype="float32")
+    return to_mono(audio), sample_rate
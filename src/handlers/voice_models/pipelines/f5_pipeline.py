@@ -192,6 +192,45 @@ class F5TTSPipeline:
         Returns:
             str: Абсолютный путь к сгенерированному аудиофайлу.
         """
+        result = self.generate_audio(text_to_generate, output_path=output_path, **kwargs)
+        if result is None:
+            return None
+        final_wave, final_sample_rate = result
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        sf.write(output_path, final_wave, final_sample_rate)
+
+        if kwargs.get("remove_silence", self.config.get("remove_silence")):
+            logger.info(f"Removing silence from {output_path}...")
+            remove_silence_for_generated_wav(output_path)
+            
+        logger.info(f"\n✅ Audio generated successfully and saved to: {os.path.abspath(output_path)}")
+        return os.path.abspath(output_path)
+
+    def prepare_reference(self, ref_audio, ref_text):
+        """
+        Препроцессинг референса (обрезка аудио, нормализация/распознавание текста) отдельно от генерации,
+        чтобы результат можно было переиспользовать: generate_audio(..., ref_prepared=True).
+
+        Returns:
+            tuple[str, str]: Путь к подготовленному аудио и подготовленный текст.
+        """
+        return preprocess_ref_audio_text(ref_audio, ref_text)
+
+    def generate_audio(self, text_to_generate, output_path=None, **kwargs):
+        """
+        Генерирует аудио из текста и возвращает его в памяти, без записи итогового файла.
+        Удаление тишины (remove_silence) здесь не применяется - это делает вызывающий код.
+
+        Args:
+            text_to_generate (str): Текст для озвучивания. Может быть строкой или путем к файлу.
+            output_path (str, optional): Нужен только для save_chunk (папка для отдельных кусков).
+            **kwargs: Параметры для переопределения настроек генерации.
+                ref_prepared=True - ref_audio/ref_text уже получены из prepare_reference.
+
+        Returns:
+            tuple[np.ndarray, int] | None: Аудио (float32, моно) и частота дискретизации.
+        """
         # Создаем локальную копию конфига для этого запуска, чтобы не менять состояние объекта
         run_config = self.config.copy()
         run_config.update(kwargs)
@@ -210,6 +249,9 @@ class F5TTSPipeline:
 
         logger.info("Preprocessing reference voices...")
         for voice_name, voice_data in voices.items():
+            if voice_name == "main" and run_config.get("ref_prepared"):
+                # Референс уже прошёл prepare_reference (кэшируется вызывающим кодом)
+                continue
             logger.info(f"  - Voice: {voice_name}")
             voices[voice_name]["ref_audio"], voices[voice_name]["ref_text"] = preprocess_ref_audio_text(
                 voice_data["ref_audio"], voice_data["ref_text"]
@@ -221,10 +263,9 @@ class F5TTSPipeline:
         chunks = re.split(reg1, gen_text)
         reg2 = r"\[(\w+)\]"
 
-        output_dir = Path(output_path).parent
-        output_filename = Path(output_path).name
-
-        if run_config.get("save_chunk"):
+        if run_config.get("save_chunk") and output_path:
+            output_dir = Path(output_path).parent
+            output_filename = Path(output_path).name
             output_chunk_dir = output_dir / f"{Path(output_filename).stem}_chunks"
             output_chunk_dir.mkdir(parents=True, exist_ok=True)
 
@@ -266,7 +307,7 @@ class F5TTSPipeline:
             )
             generated_audio_segments.append(audio_segment)
 
-            if run_config.get("save_chunk"):
+            if run_config.get("save_chunk") and output_path:
                 chunk_filename = f"{i}_{voice_name}_{clean_text[:50].replace(' ', '_')}.wav"
                 sf.write(output_chunk_dir / chunk_filename, audio_segment, final_sample_rate)
 
@@ -274,15 +315,4 @@ class F5TTSPipeline:
             logger.info("No audio was generated.")
             return None
 
-        # Сохранение итогового файла
-        final_wave = np.concatenate(generated_audio_segments)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        sf.write(output_path, final_wave, final_sample_rate)
-
-        if run_config.get("remove_silence"):
-            logger.info(f"Removing silence from {output_path}...")
-            remove_silence_for_generated_wav(output_path)
-            
-        logger.info(f"\n✅ Audio generated successfully and saved to: {os.path.abspath(output_path)}")
-        return os.path.abspath(output_path)
+        return np.concatenate(generated_audio_segments), final_sample_rate
@@ -0,0 +1,64 @@
+# handlers/voice_models/reference_cache.py
+"""
+ReferenceCache - кэш референсов голоса (клонирование F5 / Fish) по персонажу.
+
+На каждую реплику модели заново искали файлы Models/<char>_Cuts/..., читали текст референса,
+прогоняли его через RUAccent и отдавали сырой WAV в препроцессинг. Теперь всё это считается
+один раз на персонажа, а запись в кэше проверяется по времени изменения:
+ • самих выбранных файлов (подменили WAV/текст - пересчёт);
+ • папок, где ищутся кандидаты (добавили/удалили файл - пересчёт, вдруг нашёлся лучший референс).
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from main_logger import logger
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class ReferenceCache:
+    def __init__(self):
+        # ключ -> (отпечаток mtime, значение)
+        self._entries: Dict[Hashable, Tuple[tuple, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(watch_paths: Iterable[str]) -> tuple:
+        return tuple((path, _mtime(path)) for path in watch_paths)
+
+    def get(self, key: Hashable, watch_paths: Iterable[str], build: Callable[[], Any],
+            extra_watch: Callable[[Any], Iterable[str]] = None) -> Any:
+        """
+        Возвращает значение для key, пересчитывая его через build(), если изменился любой из watch_paths
+        (или файлов, которые вернул extra_watch(value) - обычно это сами выбранные файлы референса).
+        """
+        watch_paths = tuple(watch_paths)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            stamp, value = entry
+            current = self._stamp(watch_paths + tuple(extra_watch(value) if extra_watch else ()))
+            if current == stamp:
+                return value
+
+        value = build()
+        stamp = self._stamp(watch_paths + tuple(extra_watch(value) if extra_watch else ()))
+        with self._lock:
+            self._entries[key] = (stamp, value)
+        logger.info(f"Референс голоса подготовлен и закэширован: {key}")
+        return value
+
+    def invalidate(self, key: Hashable = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,195 @@
+# handlers/voice_models/residency.py
+"""
+ModelResidencyManager - какие обработчики озвучки держать загруженными одновременно.
+
+Edge+RVC, Fish и F5 могут быть инициализированы одновременно, чтобы персонажи с разными голосовыми
+бэкендами (например, в сценах GameMaster) чередовались без перезагрузки моделей. Менеджер помнит
+порядок использования и оценку занимаемой памяти каждого обработчика; если сумма превышает бюджет,
+выгружается самый давно использованный (кроме тех, что нужны прямо сейчас).
+
+Оценка памяти не зависит от torch: обходятся атрибуты обработчика и суммируются тензоры
+(element_size * nelement), модули (parameters + buffers) и numpy-массивы (nbytes). Поэтому менеджер
+проверяется на CPU с маленькими заглушками вместо моделей.
+"""
+import gc
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from main_logger import logger
+
+GB = 1024 ** 3
+
+# Глубина обхода атрибутов при оценке памяти
+MAX_WALK_DEPTH = 4
+
+
+def _tensor_bytes(obj) -> Optional[int]:
+    if hasattr(obj, "element_size") and hasattr(obj, "nelement"):
+        try:
+            return int(obj.element_size() * obj.nelement())
+        except Exception:
+            return None
+    if hasattr(obj, "nbytes") and hasattr(obj, "dtype"):
+        try:
+            return int(obj.nbytes)
+        except Exception:
+            return None
+    return None
+
+
+def estimate_footprint(root: Any, skip: Iterable[Any] = ()) -> int:
+    """Оценка байт, занятых весами/тензорами, достижимыми из root (объекты из skip не обходятся)."""
+    seen = {id(obj) for obj in skip}
+    total = 0
+    stack = [(root, 0)]
+    while stack:
+        obj, depth = stack.pop()
+        if obj is None or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        size = _tensor_bytes(obj)
+        if size is not None:
+            total += size
+            continue
+
+        # torch.nn.Module и похожие: веса и буферы
+        if callable(getattr(obj, "parameters", None)) and callable(getattr(obj, "buffers", None)):
+            try:
+                for tensor in list(obj.parameters()) + list(obj.buffers()):
+                    if id(tensor) not in seen:
+                        seen.add(id(tensor))
+                        total += _tensor_bytes(tensor) or 0
+                continue
+            except Exception:
+                pass
+
+        if depth >= MAX_WALK_DEPTH or isinstance(obj, (str, bytes, int, float, bool, type, types.ModuleType)):
+            continue
+        if isinstance(obj, dict):
+            children = obj.values()
+        elif isinstance(obj, (list, tuple, set)):
+            children = obj
+        elif hasattr(obj, "__dict__"):
+            children = vars(obj).values()
+        else:
+            continue
+        stack.extend((child, depth + 1) for child in children)
+    return total
+
+
+def handler_footprint(handler) -> int:
+    """Память обработчика без ссылок на LocalVoice, EventBus и общий RVC-обработчик - они учитываются отдельно."""
+    shared = [getattr(handler, attr, None) for attr in ("parent", "rvc_handler", "events")]
+    return estimate_footprint(handler, skip=[obj for obj in shared if obj is not None])
+
+
+def release_freed_memory():
+    """Возвращает освобождённую память: сборка мусора и, если torch уже загружен, кэш CUDA."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+
+class ModelResidencyManager:
+    def __init__(self, budget_bytes: int = 0,
+                 measure: Callable[[Any], int] = None,
+                 unload: Callable[[Any], None] = None):
+        """
+        budget_bytes: бюджет памяти на все загруженные обработчики (0 - без ограничения).
+        measure: оценка памяти обработчика (по умолчанию handler_footprint).
+        unload: выгрузка обработчика (по умолчанию handler.unload()).
+        """
+        self.budget_bytes = budget_bytes
+        self._measure = measure or handler_footprint
+        self._unload = unload or (lambda handler: handler.unload())
+        # имя -> {"handler", "bytes", "last_used"}; порядок - от давно использованных к недавним
+        self._resident: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _name(handler) -> str:
+        return type(handler).__name__
+
+    def loaded(self, handler, pinned: Iterable[Any] = ()) -> None:
+        """Отмечает обработчик загруженным, меряет его память и освобождает место под бюджет."""
+        name = self._name(handler)
+        footprint = self._measure(handler)
+        with self._lock:
+            self._resident[name] = {"handler": handler, "bytes": footprint, "last_used": time.time()}
+            self._resident.move_to_end(name)
+        logger.info(f"Модель озвучки '{name}' загружена, ~{footprint / GB:.2f} ГБ")
+        self.enforce_budget(pinned=[handler, *pinned])
+
+    def touch(self, *handlers) -> None:
+        """Обработчик использован - переносим в конец LRU. Незнакомые инициализированные - регистрируем."""
+        for handler in handlers:
+            if handler is None:
+                continue
+            name = self._name(handler)
+            with self._lock:
+                entry = self._resident.get(name)
+                if entry is not None:
+                    entry["last_used"] = time.time()
+                    self._resident.move_to_end(name)
+                    continue
+            if getattr(handler, "initialized", False):
+                # Загрузился в обход менеджера (например, RVC «на лету»)
+                self.loaded(handler, pinned=handlers)
+
+    def forget(self, handler) -> None:
+        """Обработчик выгружен снаружи (удаление модели, смена языка) - перестаём его учитывать."""
+        with self._lock:
+            self._resident.pop(self._name(handler), None)
+
+    def enforce_budget(self, pinned: Iterable[Any] = ()) -> list:
+        """Выгружает самые давно использованные обработчики, пока не уложимся в бюджет. Возвращает выгруженные."""
+        if not self.budget_bytes:
+            return []
+        pinned_ids = {id(h) for h in pinned if h is not None}
+        evicted = []
+        with self._lock:
+            while self.total_bytes() > self.budget_bytes:
+                victim_name = next(
+                    (name for name, entry in self._resident.items() if id(entry["handler"]) not in pinned_ids),
+                    None
+                )
+                if victim_name is None:
+                    logger.warning(
+                        f"Бюджет памяти озвучки превышен ({self.total_bytes() / GB:.2f} > {self.budget_bytes / GB:.2f} ГБ), "
+                        f"но все загруженные модели сейчас нужны."
+                    )
+                    break
+                entry = self._resident.pop(victim_name)
+                try:
+                    self._unload(entry["handler"])
+                except Exception as e:
+                    logger.error(f"Ошибка выгрузки модели озвучки '{victim_name}': {e}", exc_info=True)
+                evicted.append(entry["handler"])
+                logger.info(f"Модель озвучки '{victim_name}' выгружена по бюджету памяти (~{entry['bytes'] / GB:.2f} ГБ)")
+        if evicted:
+            release_freed_memory()
+        return evicted
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._resident.values())
+
+    def footprints(self) -> Dict[str, int]:
+        """Оценка памяти по загруженным обработчикам, от давно использованных к недавним."""
+        with self._lock:
+            return {name: entry["bytes"] for name, entry in self._resident.items()}
+
+    def report(self) -> str:
+        lines = [f"  {name}: ~{size / GB:.2f} ГБ" for name, size in self.footprints().items()]
+        budget = f"{self.budget_bytes / GB:.2f} ГБ" if self.budget_bytes else "без ограничения"
+        return "\n".join([f"Загруженные модели озвучки ({self.total_bytes() / GB:.2f} ГБ, бюджет {budget}):"] + lines)
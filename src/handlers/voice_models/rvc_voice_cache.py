@@ -0,0 +1,158 @@
+# handlers/voice_models/rvc_voice_cache.py
+"""
+RVCVoiceCache - несколько загруженных голосов RVC одновременно.
+
+TTS_RVC держит одну модель голоса: при смене персонажа ему подменяли current_model и индекс,
+и библиотека заново читала .pth и FAISS-индекс с диска. В сценах с несколькими персонажами
+это происходило почти на каждой реплике. Теперь на каждый голос заводится свой экземпляр TTS_RVC,
+экземпляры хранятся в LRU по пути модели и отбрасываются, если файл модели изменился на диске.
+Индекс выставляется экземпляру только когда поменялся его путь или mtime.
+
+Голосу принадлежат только веса синтезатора (.pth) и индекс. HuBERT и модель F0 (rmvpe) от голоса
+не зависят, а каждый TTS_RVC загружал бы свои копии (~0.4 ГБ на голос). SharedRVCComponents
+подключает новые экземпляры к общим HuBERT и F0Extractor. Внутреннее устройство tts_with_rvc
+(RVCConverter -> VC -> Pipeline) проверяется по атрибутам; у сборок с другим устройством
+(например, ONNX для AMD) экземпляры остаются независимыми, как раньше.
+"""
+import gc
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from main_logger import logger
+
+DEFAULT_CAPACITY = 3
+
+
+class SharedRVCComponents:
+    """Общие для всех голосов HuBERT и F0Extractor; сбрасывается вместе с кэшем голосов."""
+
+    def __init__(self):
+        self.hubert = None
+        self.f0 = None
+        self._config = None
+
+    def clear(self):
+        self.hubert = None
+        self.f0 = None
+        self._config = None
+
+    @staticmethod
+    def _vc_of(instance) -> Any:
+        vc = getattr(getattr(instance, "_converter", None), "_vc", None)
+        if vc is None or not hasattr(vc, "hubert_model"):
+            return None
+        if not callable(getattr(vc, "_ensure_hubert", None)) or not callable(getattr(vc, "load_model", None)):
+            return None
+        return vc
+
+    def attach(self, instance) -> bool:
+        """Подключает экземпляр TTS_RVC к общим компонентам. False - устройство библиотеки не распознано."""
+        vc = self._vc_of(instance)
+        if vc is None:
+            return False
+        config = getattr(vc, "config", None)
+        if self._config is None:
+            self._config = config
+        elif config != self._config:
+            # Другое устройство/точность - веса общими быть не могут
+            return False
+
+        shared = self
+        own_ensure_hubert = vc._ensure_hubert
+        own_load_model = vc.load_model
+
+        def ensure_hubert():
+            if shared.hubert is None:
+                shared.hubert = own_ensure_hubert()
+            vc.hubert_model = shared.hubert
+            return shared.hubert
+
+        def load_model(model_path):
+            own_load_model(model_path)
+            # Pipeline создаётся при загрузке голоса вместе со своим (ещё пустым) F0Extractor
+            pipeline = getattr(vc, "pipeline", None)
+            if pipeline is None or not hasattr(pipeline, "_f0"):
+                return
+            if shared.f0 is None:
+                shared.f0 = pipeline._f0
+            else:
+                pipeline._f0 = shared.f0
+
+        vc._ensure_hubert = ensure_hubert
+        vc.load_model = load_model
+        return True
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class RVCVoiceCache:
+    def __init__(self, factory: Callable[[str], Any], capacity: int = DEFAULT_CAPACITY):
+        """
+        factory: создаёт экземпляр TTS_RVC для пути к модели голоса.
+        capacity: сколько голосов держать загруженными (минимум 1).
+        """
+        self._factory = factory
+        self.capacity = max(1, capacity)
+        # абсолютный путь модели -> {"instance", "mtime", "index"}; порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Обычно всё идёт из потока инференса RVC, но initialize вызывается из другого потока
+        self._lock = threading.RLock()
+
+    def acquire(self, model_path: str, index_path: Optional[str] = None) -> Any:
+        """Экземпляр TTS_RVC с загруженным голосом model_path и выставленным индексом (None/"" - без индекса)."""
+        with self._lock:
+            return self._acquire_locked(model_path, index_path)
+
+    def _acquire_locked(self, model_path: str, index_path: Optional[str]) -> Any:
+        key = os.path.abspath(model_path)
+        mtime = _mtime(model_path)
+        entry = self._entries.get(key)
+        if entry is not None and entry["mtime"] != mtime:
+            logger.info(f"Файл RVC модели изменился, голос будет загружен заново: {model_path}")
+            self._entries.pop(key)
+            entry = None
+
+        if entry is None:
+            logger.info(f"Загрузка голоса RVC: {model_path}")
+            entry = {"instance": self._factory(model_path), "mtime": mtime, "index": None}
+            self._entries[key] = entry
+            self._evict()
+        else:
+            logger.info(f"Голос RVC взят из кэша: {model_path}")
+        self._entries.move_to_end(key)
+
+        index_stamp = (index_path or "", _mtime(index_path))
+        if entry["index"] != index_stamp:
+            entry["instance"].set_index_path(index_path or "")
+            entry["index"] = index_stamp
+        return entry["instance"]
+
+    def __contains__(self, model_path: str) -> bool:
+        entry = self._entries.get(os.path.abspath(model_path))
+        return entry is not None and entry["mtime"] == _mtime(model_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+        gc.collect()
+
+    def _evict(self):
+        evicted = False
+        while len(self._entries) > self.capacity:
+            model_path, _entry = self._entries.popitem(last=False)
+            logger.info(f"Голос RVC выгружен из кэша: {model_path}")
+            evicted = True
+        if evicted:
+            gc.collect()
@@ -0,0 +1,158 @@
+# handlers/voice_models/voice_line_cache.py
+"""
+VoiceLineCache - дисковый кэш готовых реплик локальной озвучки.
+
+Персонажи постоянно повторяют короткие фразы (приветствия, реакции на простой), и каждую
+F5/Fish/EdgeTTS+RVC синтезировали заново. Кэш адресуется по содержимому:
+ • ключ - sha1 от (нормализованный текст, персонаж, модель, язык, хэш настроек модели вместе с seed);
+ • файлы лежат в Cache/voice_lines, индекс с LRU-порядком - в index.json;
+ • общий размер ограничен, самые давно использованные реплики вытесняются.
+
+Потребители (плеер чата, игра) удаляют полученный файл после проигрывания, поэтому наружу
+отдаётся не сам файл кэша, а жёсткая ссылка (или копия) на него по новому пути.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from main_logger import logger
+
+DEFAULT_CACHE_DIR = os.path.join("Cache", "voice_lines")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def normalize_voice_text(text: str) -> str:
+    """Текст уже прошёл process_text_to_voice; здесь только схлопываются пробелы."""
+    return " ".join((text or "").split())
+
+
+def settings_fingerprint(settings: Dict[str, Any]) -> str:
+    payload = json.dumps(settings or {}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class VoiceLineCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        # ключ -> {"file": имя файла, "size": байты, "text": начало реплики}
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, character_name: str, model_id: str, language: str,
+                 model_settings: Dict[str, Any]) -> str:
+        parts = [normalize_voice_text(text), character_name or "", model_id or "", language or "",
+                 settings_fingerprint(model_settings)]
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    # ---------- публичное API ----------
+
+    def get(self, key: str, output_dir: str = "temp") -> Optional[str]:
+        """Возвращает путь к свежей ссылке на закэшированную реплику или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_path = os.path.join(self.cache_dir, entry["file"])
+            if not os.path.exists(cached_path):
+                self._drop_locked(key)
+                self._save_locked()
+                return None
+            self._entries.move_to_end(key)
+            self._save_locked()
+
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.abspath(os.path.join(output_dir, f"cached_{uuid.uuid4().hex[:10]}.wav"))
+        self._link_or_copy(cached_path, output_path)
+        return output_path
+
+    def put(self, key: str, source_path: str, text: str = "") -> None:
+        """Кладёт готовый файл в кэш (исходный файл не трогает)."""
+        if not source_path or not os.path.exists(source_path):
+            return
+        size = os.path.getsize(source_path)
+        if size == 0 or size > self.max_bytes:
+            return
+
+        filename = f"{key}.wav"
+        cached_path = os.path.join(self.cache_dir, filename)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._link_or_copy(source_path, cached_path)
+        except OSError as e:
+            logger.warning(f"Не удалось положить реплику в кэш озвучки: {e}")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]["size"]
+            self._entries[key] = {"file": filename, "size": size, "text": normalize_voice_text(text)[:80]}
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest_key = next(iter(self._entries))
+                self._drop_locked(oldest_key)
+            self._save_locked()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop_locked(key)
+            self._save_locked()
+
+    # ---------- внутреннее ----------
+
+    @staticmethod
+    def _link_or_copy(source_path: str, target_path: str):
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            # другой диск / ФС без жёстких ссылок
+            shutil.copyfile(source_path, target_path)
+
+    def _drop_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry["size"]
+        try:
+            os.remove(os.path.join(self.cache_dir, entry["file"]))
+        except OSError:
+            pass
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, entry in data:
+                if os.path.exists(os.path.join(self.cache_dir, entry["file"])):
+                    self._entries[key] = entry
+                    self._total_bytes += entry["size"]
+            logger.info(f"Кэш озвучки загружен: {len(self._entries)} реплик, {self._total_bytes / 1024 / 1024:.1f} МБ")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Не удалось загрузить индекс кэша озвучки {self.index_path}: {e}")
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _save_locked(self):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения индекса кэша озвучки: {e}")
@@ -1,8 +1,11 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import colorlog
 import os
 import sys
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Optional, Union
 
 # -----------------------------------------------------------------------------
 # Кастомные уровни логирования
@@ -42,10 +45,6 @@ class CustomLogger(logging.Logger):
     Наследует все функции стандартного logging.Logger.
     """
     
-    def __init__(self, name: str, level: int = logging.NOTSET):
-        super().__init__(name, level)
-        self._setup_handlers()
-    
     def notify(self, message: str, *args: Any, **kwargs: Any) -> None:
         """
         Логирование уведомлений с уровнем NOTIFY (25).
@@ -74,44 +73,83 @@ class CustomLogger(logging.Logger):
         """
         if self.isEnabledFor(SUCCESS_LEVEL):
             self._log(SUCCESS_LEVEL, message, args, **kwargs)
-    
-    def _setup_handlers(self) -> None:
-        """Настройка обработчиков для логгера."""
-        # Консольный обработчик
-        console_handler = colorlog.StreamHandler()
-        console_handler.setFormatter(
-            colorlog.ColoredFormatter(
-                '%(log_color)s%(levelname)-8s %(location)-30s | %(message)s',
-                log_colors={
-                    'DEBUG':    'white',
-                    'PROGRESS': 'light_blue',
-                    'INFO':     'white',
-                    'NOTIFY':   'light_purple',
-                    'WARNING':  'yellow',
-                    'SUCCESS':  'light_green',
-                    'ERROR':    'red',
-                    'CRITICAL': 'red,bg_white',
-                },
-            )
+
+# -----------------------------------------------------------------------------
+# Ленивое форматирование
+# -----------------------------------------------------------------------------
+class LazyMessage:
+    """
+    Аргумент лога, который вычисляется только при форматировании записи:
+        logger.debug("req: %s", lazy(json.dumps, preset_settings))
+    Если уровень выключен, json.dumps не вызывается вовсе.
+    """
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        try:
+            return str(self.func(*self.args, **self.kwargs))
+        except Exception as e:
+            return f"<ошибка форматирования лога: {e}>"
+
+    __repr__ = __str__
+
+
+def lazy(func: Callable[..., Any], *args: Any, **kwargs: Any) -> LazyMessage:
+    return LazyMessage(func, *args, **kwargs)
+
+# -----------------------------------------------------------------------------
+# Обработчики: запись в консоль и файл - в фоновом потоке через очередь
+# -----------------------------------------------------------------------------
+def _create_output_handlers() -> list:
+    """Консольный и файловый обработчики; работают в потоке QueueListener."""
+    # Консольный обработчик
+    console_handler = colorlog.StreamHandler()
+    console_handler.setFormatter(
+        colorlog.ColoredFormatter(
+            '%(log_color)s%(levelname)-8s %(location)-30s | %(message)s',
+            log_colors={
+                'DEBUG':    'white',
+                'PROGRESS': 'light_blue',
+                'INFO':     'white',
+                'NOTIFY':   'light_purple',
+                'WARNING':  'yellow',
+                'SUCCESS':  'light_green',
+                'ERROR':    'red',
+                'CRITICAL': 'red,bg_white',
+            },
         )
-        console_handler.addFilter(ProjectFilter())
-        console_handler.addFilter(LocationFilter())
-        
-        # Файловый обработчик
-        file_handler = logging.FileHandler('NeuroMitaLogs.log', encoding='utf-8')
-        file_handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(levelname)-8s '
-                '[%(filename)s:%(lineno)d - %(funcName)s] '
-                '%(message)s'
-            )
+    )
+    console_handler.addFilter(ProjectFilter())
+    console_handler.addFilter(LocationFilter())
+
+    # Файловый обработчик
+    file_handler = logging.FileHandler('NeuroMitaLogs.log', encoding='utf-8')
+    file_handler.setFormatter(
+        logging.Formatter(
+            '%(asctime)s - %(levelname)-8s '
+            '[%(filename)s:%(lineno)d - %(funcName)s] '
+            '%(message)s'
         )
-        file_handler.addFilter(ProjectFilter())
-        
-        # Добавляем обработчики
-        self.addHandler(console_handler)
-        self.addHandler(file_handler)
-        self.propagate = False
+    )
+    file_handler.addFilter(ProjectFilter())
+    return [console_handler, file_handler]
+
+
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(_log_queue, *_create_output_handlers(), respect_handler_level=True)
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь логов и останавливает фоновый поток (вызывается при выходе)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 # -----------------------------------------------------------------------------
 # Создаем экземпляр логгера
@@ -122,6 +160,67 @@ logging.setLoggerClass(CustomLogger)
 # Создаем логгер
 logger: CustomLogger = logging.getLogger(__name__)  # type: ignore
 logger.setLevel(logging.INFO)
+# В вызывающем потоке - только постановка записи в очередь
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
+
+_subsystem_loggers: Dict[str, CustomLogger] = {}
+
+
+def get_logger(subsystem: str) -> CustomLogger:
+    """
+    Логгер подсистемы ("events", "chat", "commands", ...). Пишет через общие обработчики,
+    а уровень можно задать отдельно: configure_log_levels("events=WARNING,chat=DEBUG").
+    """
+    child = _subsystem_loggers.get(subsystem)
+    if child is None:
+        logging.setLoggerClass(CustomLogger)
+        try:
+            child = logging.getLogger(f"{__name__}.{subsystem}")  # type: ignore
+        finally:
+            logging.setLoggerClass(logging.Logger)
+        _subsystem_loggers[subsystem] = child
+    return child
+
+
+def configure_log_levels(spec: Union[str, Dict[str, Union[str, int]], None]) -> None:
+    """
+    Уровни по подсистемам: строка "events=WARNING, chat=DEBUG" или словарь.
+    Ключ "*" (или "root") задаёт общий уровень. Подсистемы, которых нет в spec, наследуют общий.
+    """
+    if isinstance(spec, str):
+        pairs = {}
+        for item in spec.replace(";", ",").split(","):
+            if "=" in item:
+                name, level = item.split("=", 1)
+                pairs[name.strip()] = level.strip()
+        spec = pairs
+    spec = dict(spec or {})
+
+    root_level = spec.pop("*", spec.pop("root", None))
+    logger.setLevel(_parse_level(root_level, logging.INFO))
+    for name, child in _subsystem_loggers.items():
+        if name not in spec:
+            child.setLevel(logging.NOTSET)
+    for name, level in spec.items():
+        get_logger(name).setLevel(_parse_level(level, logging.NOTSET))
+
+
+def _parse_level(level: Union[str, int, None], default: int) -> int:
+    if level is None or level == "":
+        return default
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).strip().upper())
+    if isinstance(value, int):
+        return value
+    logger.warning("Неизвестный уровень логирования: %s", level)
+    return default
+
+
+_listener.start()
+atexit.register(shutdown_logging)
+configure_log_levels(os.environ.get("NEUROMITA_LOG_LEVELS", ""))
 
 # Восстанавливаем стандартный класс логгера для других модулей
 logging.setLoggerClass(logging.Logger)
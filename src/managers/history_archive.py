@@ -0,0 +1,125 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from main_logger import logger
+
+
+class MissedHistoryArchive:
+    """
+    Append-only архив "потерянных" сообщений персонажа.
+
+    append() получает все сообщения, выпавшие из контекста (начало истории), и каждый ход их
+    становится на одно-два больше. Архив помнит позицию: сколько сообщений уже записано и отпечаток
+    последнего из них. Дописывается только хвост после этой позиции, поэтому одинаковые по
+    содержимому сообщения (повторяющиеся реплики, системные события) не теряются. Если начало
+    истории сдвинулось (сжатие истории) или история очищена, позиция ищется заново по отпечатку.
+    При превышении max_segment_bytes активный сегмент переименовывается и сжимается gzip'ом.
+    """
+
+    MAX_SEGMENT_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, archive_dir: str, base_name: str, max_segment_bytes: int = MAX_SEGMENT_BYTES):
+        self.archive_dir = archive_dir
+        self.base_name = base_name
+        self.max_segment_bytes = max_segment_bytes
+
+        self.segment_path = os.path.join(archive_dir, f"{base_name}.jsonl")
+        self.state_path = os.path.join(archive_dir, f"{base_name}.state.json")
+
+        # Позиция: сколько сообщений текущей истории уже в архиве и отпечаток последнего из них
+        self._archived_count = 0
+        self._last_fingerprint = None
+        # Отпечатки из старого формата состояния - нужны один раз, чтобы найти позицию
+        self._legacy_fingerprints = set()
+        self._load_state()
+
+    # ---------- state ----------
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._archived_count = int(state.get("archived_count", 0))
+            self._last_fingerprint = state.get("last_fingerprint")
+            self._legacy_fingerprints = set(state.get("fingerprints", []))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Не удалось загрузить состояние архива {self.state_path}: {e}")
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"archived_count": self._archived_count, "last_fingerprint": self._last_fingerprint}, f)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def fingerprint(message: dict) -> str:
+        payload = json.dumps(message, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _archived_prefix_length(self, messages: list) -> int:
+        """Сколько первых сообщений из messages уже записано в архив."""
+        if self._legacy_fingerprints:
+            # Старое состояние хранило отпечатки всех записанных: позиция - после последнего из них
+            for index in range(len(messages) - 1, -1, -1):
+                if self.fingerprint(messages[index]) in self._legacy_fingerprints:
+                    return index + 1
+            return 0
+        if self._last_fingerprint is None:
+            return 0
+        # Начало истории может только уйти (сжатие), поэтому ищем от прежней позиции к началу
+        for index in range(min(self._archived_count, len(messages)) - 1, -1, -1):
+            if self.fingerprint(messages[index]) == self._last_fingerprint:
+                return index + 1
+        # Записанных сообщений в истории больше нет (сжаты или история очищена) - всё новое
+        return 0
+
+    # ---------- archive ----------
+
+    def append(self, messages: list) -> int:
+        """Дописывает в архив сообщения после уже заархивированной позиции. Возвращает число записанных."""
+        if not messages:
+            return 0
+        start = self._archived_prefix_length(messages)
+        new_messages = messages[start:]
+        if not new_messages and not self._legacy_fingerprints and start == self._archived_count:
+            return 0
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if new_messages:
+            with open(self.segment_path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(message, ensure_ascii=False) + "\n" for message in new_messages))
+
+        self._archived_count = len(messages)
+        self._last_fingerprint = self.fingerprint(messages[-1])
+        self._legacy_fingerprints = set()
+        # Состояние - две величины, а не список отпечатков: запись постоянного размера
+        self._save_state()
+
+        if new_messages and os.path.getsize(self.segment_path) >= self.max_segment_bytes:
+            self.rotate()
+        return len(new_messages)
+
+    def rotate(self):
+        """Закрывает активный сегмент: переименовывает его и сжимает в .jsonl.gz."""
+        if not os.path.exists(self.segment_path):
+            return
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        rotated_path = os.path.join(self.archive_dir, f"{self.base_name}.{timestamp}.jsonl")
+        suffix = 1
+        while os.path.exists(rotated_path + ".gz"):
+            rotated_path = os.path.join(self.archive_dir, f"{self.base_name}.{timestamp}_{suffix}.jsonl")
+            suffix += 1
+        os.replace(self.segment_path, rotated_path)
+        try:
+            with open(rotated_path, 'rb') as src, gzip.open(rotated_path + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated_path)
+            logger.info(f"Сегмент архива истории сжат: {rotated_path}.gz")
+        except Exception as e:
+            logger.error(f"Ошибка сжатия сегмента архива {rotated_path}: {e}", exc_info=True)
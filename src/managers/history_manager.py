@@ -2,8 +2,10 @@ import json
 import os
 import datetime
 import shutil
+import threading
 
 from main_logger import logger
+from managers.history_archive import MissedHistoryArchive
 
 
 class HistoryManager:
@@ -18,11 +20,23 @@ class HistoryManager:
 
         os.makedirs(self.history_dir, exist_ok=True)
 
+        self.missed_archive = MissedHistoryArchive(self.history_dir, f"{character_name}_missed_history")
+
+        # Сообщения последнего прочитанного/записанного состояния файла для постраничного чтения:
+        # (stamp файла, список сообщений). Переразбирается, только если файл поменяли извне.
+        self._pages_lock = threading.Lock()
+        self._pages_cache = None
+
         if self.history_file_path != "":
             self.load_history()
 
     def load_history(self):
         """Загружаем историю из файла, создаем пустую структуру, если файл пуст или не существует."""
+        data = self._read_history_file()
+        self._remember_messages(data.get('messages', []))
+        return data
+
+    def _read_history_file(self):
         try:
             with open(self.history_file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -75,6 +89,48 @@ class HistoryManager:
         os.makedirs(self.history_dir, exist_ok=True)
         with open(self.history_file_path, 'w', encoding='utf-8') as f:
             json.dump(history_data, f, ensure_ascii=False, indent=4)
+        self._remember_messages(history_data['messages'])
+
+    # region Постраничное чтение (для окна чата)
+
+    def count(self) -> int:
+        """Количество сообщений в истории."""
+        return len(self._cached_messages())
+
+    def read_range(self, start: int, end: int) -> list[dict]:
+        """
+        Сообщения истории с индексами [start, end) без применения переменных персонажа.
+        Файл разбирается только при первом обращении или если он изменился с последнего чтения/записи,
+        поэтому листание назад стоит O(страницы).
+        """
+        messages = self._cached_messages()
+        start = max(0, start)
+        end = min(len(messages), end)
+        if start >= end:
+            return []
+        return messages[start:end]
+
+    def _history_stamp(self):
+        try:
+            stat = os.stat(self.history_file_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _remember_messages(self, messages: list):
+        with self._pages_lock:
+            self._pages_cache = (self._history_stamp(), list(messages))
+
+    def _cached_messages(self) -> list:
+        with self._pages_lock:
+            cache = self._pages_cache
+        if cache is None or cache[0] != self._history_stamp():
+            self.load_history()
+            with self._pages_lock:
+                cache = self._pages_cache
+        return cache[1]
+
+    # endregion
 
     def save_history_separate(self):
         """Нужно, чтобы история сохранилась отдельно"""
@@ -97,34 +153,15 @@ class HistoryManager:
 
     def save_missed_history(self, missed_messages: list):
         """
-        Сохраняет "потерянные" сообщения в отдельный файл для персонажа.
-        Сообщения добавляются к существующему файлу, если он есть.
+        Сохраняет "потерянные" сообщения в append-only архив персонажа.
+        Дописываются только сообщения после уже заархивированной позиции.
         """
-        missed_dir = os.path.join("Histories", self.character_name)
-        os.makedirs(missed_dir, exist_ok=True)
-        missed_file_path = os.path.join(missed_dir, f"{self.character_name}_missed_history.json")
-
-        existing_missed_messages = []
-        if os.path.exists(missed_file_path):
-            try:
-                with open(missed_file_path, 'r', encoding='utf-8') as f:
-                    existing_missed_messages = json.load(f)
-                    if not isinstance(existing_missed_messages, list):
-                        logger.warning(f"Файл пропущенной истории {missed_file_path} поврежден или имеет неверный формат. Создаю новый.")
-                        existing_missed_messages = []
-            except (json.JSONDecodeError, FileNotFoundError):
-                logger.warning(f"Не удалось загрузить существующую пропущенную историю из {missed_file_path}. Создаю новый файл.")
-                existing_missed_messages = []
-
-        # Добавляем новые пропущенные сообщения
-        existing_missed_messages.extend(missed_messages)
-
         try:
-            with open(missed_file_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_missed_messages, f, ensure_ascii=False, indent=4)
-            logger.info(f"Пропущенные сообщения сохранены в {missed_file_path}")
+            written = self.missed_archive.append(missed_messages)
+            if written:
+                logger.info(f"Пропущенные сообщения ({written}) сохранены в {self.missed_archive.segment_path}")
         except Exception as e:
-            logger.error(f"Ошибка при сохранении пропущенных сообщений в {missed_file_path}: {e}", exc_info=True)
+            logger.error(f"Ошибка при сохранении пропущенных сообщений в {self.missed_archive.segment_path}: {e}", exc_info=True)
 
     def clear_history(self):
         logger.info("Сброс файла истории")
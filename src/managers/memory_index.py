@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from main_logger import logger
+
+
+# Приоритеты, которые попадают в промпт всегда, вне зависимости от релевантности
+ALWAYS_INCLUDED_PRIORITIES = ("high", "critical")
+
+# Префикс для "документов" (воспоминаний). Для запросов используется QUERY_PREFIX модели.
+DOCUMENT_PREFIX = ""
+
+
+class MemoryIndex:
+    """
+    Эмбеддинг-индекс над долговременной памятью персонажа.
+
+    Эмбеддинги считаются через EmbeddingModelHandler (получаем его лениво через
+    embedding_provider, чтобы не тянуть torch при старте) и кэшируются на диске
+    по хэшу содержимого: пересчитываются только новые и изменённые воспоминания.
+
+    Недостающие эмбеддинги досчитываются порциями: за один sync не больше MAX_EMBEDDINGS_PER_SYNC,
+    начиная с самых новых воспоминаний, чтобы первый промпт после включения top-k (или смены модели)
+    не ждал пересчёта всей памяти. Пока индекс неполный, search добирает выборку самыми новыми
+    ещё не проиндексированными воспоминаниями.
+    """
+
+    # Сколько эмбеддингов считать за один ход
+    MAX_EMBEDDINGS_PER_SYNC = 16
+
+    def __init__(self, index_path: str, embedding_provider: Optional[Callable] = None):
+        self.index_path = index_path
+        self.embedding_provider = embedding_provider
+        self.model_name: Optional[str] = None
+        # N -> {"hash": str, "embedding": np.ndarray}
+        self._items: Dict[int, Dict] = {}
+        self._dirty = False
+        # Сколько воспоминаний осталось без актуального эмбеддинга после последнего sync
+        self.pending = 0
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.model_name = data.get("model")
+            for key, item in data.get("items", {}).items():
+                self._items[int(key)] = {
+                    "hash": item["hash"],
+                    "embedding": np.array(item["embedding"], dtype=np.float32),
+                }
+            logger.info(f"Индекс памяти загружен: {len(self._items)} эмбеддингов из {self.index_path}")
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить индекс памяти {self.index_path}: {e}. Индекс будет перестроен.")
+            self._items = {}
+
+    def save(self):
+        if not self._dirty:
+            return
+        data = {
+            "model": self.model_name,
+            "items": {
+                str(n): {"hash": item["hash"], "embedding": item["embedding"].tolist()}
+                for n, item in self._items.items()
+            },
+        }
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении индекса памяти {self.index_path}: {e}", exc_info=True)
+
+    def clear(self):
+        self._items = {}
+        self._dirty = True
+        self.save()
+
+    # ---------- indexing ----------
+
+    @staticmethod
+    def _content_hash(content: str) -> str:
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def _get_handler(self):
+        if self.embedding_provider is None:
+            return None
+        try:
+            return self.embedding_provider()
+        except Exception as e:
+            logger.error(f"Не удалось получить модель эмбеддингов для индекса памяти: {e}", exc_info=True)
+            return None
+
+    def sync(self, memories: List[Dict]) -> bool:
+        """
+        Приводит индекс в соответствие со списком воспоминаний.
+        Возвращает False, если модель эмбеддингов недоступна.
+        """
+        handler = self._get_handler()
+        if handler is None:
+            return False
+
+        handler_model = getattr(handler, "model_name", None)
+        if self.model_name != handler_model:
+            if self._items:
+                logger.info(f"Модель эмбеддингов изменилась ({self.model_name} -> {handler_model}), индекс памяти перестраивается.")
+            self._items = {}
+            self.model_name = handler_model
+            self._dirty = True
+
+        alive = set()
+        missing = []
+        for memory in memories:
+            n = memory["N"]
+            alive.add(n)
+            content_hash = self._content_hash(memory["content"])
+            item = self._items.get(n)
+            if item is None or item["hash"] != content_hash:
+                missing.append((memory, content_hash))
+
+        # Самые новые воспоминания - первыми: они вероятнее относятся к текущему разговору
+        budget = self.MAX_EMBEDDINGS_PER_SYNC
+        for memory, content_hash in reversed(missing[-budget:] if budget > 0 else missing):
+            embedding = handler.get_embedding(memory["content"], prefix=DOCUMENT_PREFIX)
+            if embedding is None:
+                continue
+            self._items[memory["N"]] = {"hash": content_hash, "embedding": np.asarray(embedding, dtype=np.float32)}
+            self._dirty = True
+        self.pending = max(0, len(missing) - budget) if budget > 0 else 0
+        if self.pending:
+            logger.info(f"Индекс памяти неполный: осталось {self.pending} эмбеддингов, досчитаются в следующих ходах.")
+
+        stale = [n for n in self._items if n not in alive]
+        for n in stale:
+            del self._items[n]
+        if stale:
+            self._dirty = True
+
+        self.save()
+        return True
+
+    # ---------- retrieval ----------
+
+    def _is_indexed(self, memory: Dict) -> bool:
+        item = self._items.get(memory["N"])
+        return item is not None and item["hash"] == self._content_hash(memory["content"])
+
+    def search(self, memories: List[Dict], query: str, top_k: int) -> Optional[List[Dict]]:
+        """
+        Возвращает top_k воспоминаний, наиболее близких к запросу, плюс все воспоминания
+        с приоритетом из ALWAYS_INCLUDED_PRIORITIES. Порядок исходного списка сохраняется.
+        Пока индекс досчитывается, недостающие до top_k места занимают самые новые воспоминания без эмбеддинга.
+        None - если поиск невозможен (нет модели), вызывающий код должен откатиться на полный вывод.
+        """
+        if not self.sync(memories):
+            return None
+
+        handler = self._get_handler()
+        query_embedding = handler.get_embedding(query) if query else None
+
+        selected = set()
+        for memory in memories:
+            if str(memory.get("priority", "")).lower() in ALWAYS_INCLUDED_PRIORITIES:
+                selected.add(memory["N"])
+
+        if top_k > 0:
+            indexed = [m for m in memories if m["N"] not in selected and self._is_indexed(m)]
+            ranked = []
+            if query_embedding is not None and indexed:
+                matrix = np.stack([self._items[m["N"]]["embedding"] for m in indexed])
+                scores = matrix @ np.asarray(query_embedding, dtype=np.float32)
+                ranked = [indexed[i]["N"] for i in np.argsort(-scores)]
+            chosen = ranked[:top_k]
+            if self.pending and len(chosen) < top_k:
+                # Индекс ещё неполный - добираем самыми новыми воспоминаниями без эмбеддинга
+                unindexed = [m["N"] for m in memories if m["N"] not in selected and not self._is_indexed(m)]
+                chosen += unindexed[-(top_k - len(chosen)):]
+            selected.update(chosen)
+
+        return [m for m in memories if m["N"] in selected]
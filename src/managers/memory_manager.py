@@ -2,47 +2,174 @@ import json
 import logging
 import os
 import datetime
+from contextlib import contextmanager
+
+from managers.memory_index import MemoryIndex
 
 
 class MemoryManager:
-    def __init__(self, character_name):
+    # Сколько операций копится в журнале изменений до пересборки основного файла
+    COMPACT_EVERY = 100
+
+    def __init__(self, character_name, embedding_provider=None):
         self.character_name = character_name
         self.history_dir = f"Histories\\{character_name}"
         os.makedirs(self.history_dir, exist_ok=True)
 
         self.filename = os.path.join(self.history_dir, f"{character_name}_memories.json")
-        self.memories = []
+        # Журнал изменений (JSONL): операции дописываются сюда, основной файл переписывается только при компакции
+        self.log_filename = os.path.join(self.history_dir, f"{character_name}_memories.log.jsonl")
+        self.missed_filename = os.path.join(self.history_dir, f"{character_name}_missed_memories.jsonl")
+        # Старый формат пропущенных воспоминаний (JSON-массив) переносится в JSONL при загрузке
+        self.legacy_missed_filename = os.path.join(self.history_dir, f"{character_name}_missed_memories.json")
+        self.index_filename = os.path.join(self.history_dir, f"{character_name}_memories_index.json")
+
+        self._memories = {}  # N -> memory, порядок вставки сохраняется
+        self._next_id = 1
+        self._log_size = 0
+        self._pending_ops = []
+        self._batch_depth = 0
+
         self.total_characters = 0  # Новый атрибут для подсчета символов
         self.last_memory_number = 1
 
+        # Индекс эмбеддингов создаётся лениво, только в режиме top-k выборки
+        self.embedding_provider = embedding_provider
+        self._index = None
+
         self.load_memories()
+        self._migrate_legacy_missed_memories()
+
+    @property
+    def memories(self):
+        return list(self._memories.values())
 
     def load_memories(self):
+        self._memories = {}
+        self._pending_ops = []
 
         if os.path.exists(self.filename):
             with open(self.filename, 'r', encoding='utf-8') as file:
-                self.memories = json.load(file)
-                self.last_memory_number = len(self.memories) + 1
-                self._calculate_total_characters()
+                for memory in json.load(file):
+                    self._memories[memory["N"]] = memory
         else:
             logging.warning(f"No memories file {self.filename} found!")
-            self.memories = []
             self.save_memories() # Создаем пустой файл
             logging.info(f"Created new memories file: {self.filename}")
 
+        replayed = self._replay_log()
+
+        self._next_id = max(self._memories, default=0) + 1
+        self.last_memory_number = len(self._memories) + 1
+        self._calculate_total_characters()
+
+        if replayed:
+            # Переносим накопленный журнал в основной файл
+            self.compact()
+
+    def _replay_log(self):
+        """Применяет операции из журнала изменений поверх основного файла."""
+        self._log_size = 0
+        if not os.path.exists(self.log_filename):
+            return 0
+
+        with open(self.log_filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная строка при аварийном завершении - всё, что после, тоже недостоверно
+                    logging.warning(f"Журнал памяти {self.log_filename} обрезан на повреждённой записи.")
+                    break
+                if op["op"] == "delete":
+                    self._memories.pop(op["N"], None)
+                else:
+                    self._memories[op["N"]] = op["memory"]
+                self._log_size += 1
+        return self._log_size
+
+    def set_embedding_provider(self, embedding_provider):
+        """Задаёт функцию, возвращающую EmbeddingModelHandler (вызывается лениво)."""
+        self.embedding_provider = embedding_provider
+        if self._index is not None:
+            self._index.embedding_provider = embedding_provider
+
+    @property
+    def index(self) -> MemoryIndex:
+        if self._index is None:
+            self._index = MemoryIndex(self.index_filename, self.embedding_provider)
+        return self._index
+
     def _calculate_total_characters(self):
         """Пересчитывает общее количество символов"""
-        self.total_characters = sum(len(memory["content"]) for memory in self.memories)
+        self.total_characters = sum(len(memory["content"]) for memory in self._memories.values())
+
+    # ---------- persistence ----------
 
     def save_memories(self):
-        with open(self.filename, 'w', encoding='utf-8') as file:
+        """Полностью переписывает основной файл памяти (атомарно)."""
+        tmp_path = self.filename + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
             json.dump(self.memories, file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.filename)
 
-    def add_memory(self, content, date=datetime.datetime.now().strftime("%d.%m.%Y_%H.%M"), priority="Normal", memory_type="fact"):
-        if not self.memories:
-            new_id = 1
-        else:
-            new_id = max(memory['N'] for memory in self.memories) + 1
+    def compact(self):
+        """Сбрасывает журнал изменений в основной файл и очищает журнал."""
+        self.save_memories()
+        if os.path.exists(self.log_filename):
+            os.remove(self.log_filename)
+        self._log_size = 0
+
+    @contextmanager
+    def batch(self):
+        """
+        Группирует несколько операций в одну запись на диск.
+        Все изменения внутри блока дописываются в журнал одним commit() в конце.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.commit()
+
+    def commit(self):
+        """Дописывает накопленные операции в журнал, при необходимости компактирует."""
+        if not self._pending_ops:
+            return
+        ops, self._pending_ops = self._pending_ops, []
+        try:
+            with open(self.log_filename, 'a', encoding='utf-8') as file:
+                file.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+            self._log_size += len(ops)
+        except Exception as e:
+            logging.error(f"Ошибка записи журнала памяти {self.log_filename}: {e}", exc_info=True)
+            self.save_memories()
+            return
+
+        if self._log_size >= self.COMPACT_EVERY:
+            self.compact()
+
+    def _record(self, op, number, memory=None):
+        entry = {"op": op, "N": number}
+        if memory is not None:
+            entry["memory"] = dict(memory)
+        self._pending_ops.append(entry)
+        if self._batch_depth == 0:
+            self.commit()
+
+    # ---------- operations ----------
+
+    def add_memory(self, content, date=None, priority="Normal", memory_type="fact"):
+        if date is None:
+            date = datetime.datetime.now().strftime("%d.%m.%Y_%H.%M")
+
+        new_id = self._next_id
+        self._next_id += 1
 
         memory = {
             "N": new_id,
@@ -51,85 +178,119 @@ class MemoryManager:
             "content": content,
             "memory_type": memory_type  # Добавляем тип памяти
         }
-        self.memories.append(memory)
+        self._memories[new_id] = memory
         self.total_characters += len(content)  # Обновляем счетчик
         self.last_memory_number += 1
-        self.save_memories()
+        self._record("add", new_id, memory)
 
     def update_memory(self, number, content, priority=None):
-        for memory in self.memories:
-            if memory["N"] == number:
-                # Обновляем счетчик символов
-                self.total_characters -= len(memory["content"])
-                self.total_characters += len(content)
-
-                memory["date"] = datetime.datetime.now().strftime("%d.%m.%Y_%H.%M")
-                memory["content"] = content
-                if priority:
-                    memory["priority"] = priority
-                self.save_memories()
-                return True
-        return False
+        memory = self._memories.get(number)
+        if memory is None:
+            return False
+
+        # Обновляем счетчик символов
+        self.total_characters -= len(memory["content"])
+        self.total_characters += len(content)
+
+        memory["date"] = datetime.datetime.now().strftime("%d.%m.%Y_%H.%M")
+        memory["content"] = content
+        if priority:
+            memory["priority"] = priority
+        self._record("update", number, memory)
+        return True
 
     def delete_memory(self, number, save_as_missing = False):
-        for i, memory in enumerate(self.memories):
-            if memory["N"] == number:
-                if save_as_missing:
-                    # Сохраняем копию в missed перед удалением
-                    missed_memory = memory.copy()  # Полная копия воспоминания
-                    self.save_missed_memory(missed_memory)
-
-                # Обновляем счетчик и удаляем
-                self.total_characters -= len(memory["content"])
-                del self.memories[i]
-                self.save_memories()
-                logging.info(f"Memory {number} deleted")
-                return True
-        logging.warning(f"Memory {number} not found for deletion.")
-        return False
+        memory = self._memories.pop(number, None)
+        if memory is None:
+            logging.warning(f"Memory {number} not found for deletion.")
+            return False
+
+        if save_as_missing:
+            # Сохраняем копию в missed перед удалением
+            self.save_missed_memory(memory.copy())
+
+        # Обновляем счетчик
+        self.total_characters -= len(memory["content"])
+        self._record("delete", number)
+        logging.info(f"Memory {number} deleted")
+        return True
+
+    def _migrate_legacy_missed_memories(self):
+        """Переносит <char>_missed_memories.json в начало JSONL-файла и удаляет старый файл."""
+        if not os.path.exists(self.legacy_missed_filename):
+            return
+        try:
+            with open(self.legacy_missed_filename, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            if not isinstance(legacy, list):
+                raise ValueError("ожидался список воспоминаний")
+
+            existing = ""
+            if os.path.exists(self.missed_filename):
+                with open(self.missed_filename, 'r', encoding='utf-8') as f:
+                    existing = f.read()
+
+            tmp_path = self.missed_filename + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("".join(json.dumps(memory, ensure_ascii=False) + "\n" for memory in legacy))
+                f.write(existing)
+            os.replace(tmp_path, self.missed_filename)
+            os.remove(self.legacy_missed_filename)
+            logging.info(f"Пропущенные воспоминания ({len(legacy)}) перенесены из {self.legacy_missed_filename} в {self.missed_filename}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось перенести пропущенные воспоминания из {self.legacy_missed_filename}: {e}")
 
     def save_missed_memory(self, missed_memory: dict):
         """
         Сохраняет удалённое воспоминание в отдельный файл для персонажа.
-        Воспоминание добавляется к существующему файлу, если он есть.
+        Файл в формате JSONL: воспоминание дописывается одной строкой, без перечитывания файла.
         """
-        missed_dir = self.history_dir  # Используем ту же директорию
-        os.makedirs(missed_dir, exist_ok=True)
-        missed_file_path = os.path.join(missed_dir, f"{self.character_name}_missed_memories.json")
-
-        existing_missed_memories = []
-        if os.path.exists(missed_file_path):
-            try:
-                with open(missed_file_path, 'r', encoding='utf-8') as f:
-                    existing_missed_memories = json.load(f)
-                    if not isinstance(existing_missed_memories, list):
-                        logging.warning(
-                            f"Файл пропущенных воспоминаний {missed_file_path} поврежден или имеет неверный формат. Создаю новый.")
-                        existing_missed_memories = []
-            except (json.JSONDecodeError, FileNotFoundError):
-                logging.warning(
-                    f"Не удалось загрузить существующие пропущенные воспоминания из {missed_file_path}. Создаю новый файл.")
-                existing_missed_memories = []
-
-        # Добавляем новое пропущенное воспоминание
-        existing_missed_memories.append(missed_memory)
-
         try:
-            with open(missed_file_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_missed_memories, f, ensure_ascii=False, indent=4)
-            logging.info(f"Пропущенное воспоминание сохранено в {missed_file_path}")
+            with open(self.missed_filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(missed_memory, ensure_ascii=False) + "\n")
+            logging.info(f"Пропущенное воспоминание сохранено в {self.missed_filename}")
         except Exception as e:
-            logging.error(f"Ошибка при сохранении пропущенного воспоминания в {missed_file_path}: {e}", exc_info=True)
+            logging.error(f"Ошибка при сохранении пропущенного воспоминания в {self.missed_filename}: {e}", exc_info=True)
 
     def clear_memories(self):
-        self.memories = []
+        self._memories = {}
+        self._pending_ops = []
+        self._next_id = 1
         self.total_characters = 0  # Сбрасываем счетчик
-        self.save_memories()
+        self.compact()
         self.last_memory_number = 1
+        if self._index is not None or os.path.exists(self.index_filename):
+            self.index.clear()
+
+    def get_relevant_memories(self, query: str, top_k: int):
+        """
+        Возвращает воспоминания, релевантные запросу (top-k по эмбеддингам), и все важные.
+        Если индекс недоступен - возвращает все воспоминания.
+        """
+        memories = self.memories
+        if len(memories) <= top_k:
+            return memories
+        try:
+            selected = self.index.search(memories, query, top_k)
+        except Exception as e:
+            logging.error(f"Ошибка поиска по индексу памяти: {e}", exc_info=True)
+            selected = None
+        if selected is None:
+            logging.warning("Индекс памяти недоступен, в промпт добавляется вся память.")
+            return memories
+        return selected
+
+    def get_memories_formatted(self, query: str = "", top_k: int = 0):
+        """
+        Формирует блок LongMemory для промпта.
+        При top_k > 0 выводятся только релевантные query воспоминания (плюс high/critical),
+        и модель не подталкивается к удалению воспоминаний из-за размера памяти.
+        """
+        retrieval = top_k > 0
+        shown_memories = self.get_relevant_memories(query, top_k) if retrieval else self.memories
 
-    def get_memories_formatted(self):
         formatted_memories = []
-        for memory in self.memories:
+        for memory in shown_memories:
             if memory.get('memory_type', "") == "summary":
                 formatted_memories.append(
                     f"N:{memory['N']}, Date {memory['date']}, Type: Summary: {memory['content']}"
@@ -139,19 +300,23 @@ class MemoryManager:
                     f"N:{memory['N']}, Date {memory['date']}, Priority: {memory['priority']}: {memory['content']}"
                 )
 
-        memory_stats = f"\nMemory status: {len(self.memories)} facts, {self.total_characters} characters"
+        memory_stats = f"\nMemory status: {len(self._memories)} facts, {self.total_characters} characters"
+        if retrieval:
+            memory_stats += f" (shown {len(shown_memories)} most relevant)"
 
         # Правила для управления памятью
         management_tips = []
-        if self.total_characters > 10000:
-            management_tips.append("CRITICAL: Memory limit exceeded! Delete old or useless memories immediately!")
-        elif self.total_characters > 5000:
-            management_tips.append("WARNING: Memory size is large. Consider optimization or summarization")
-
-        if len(self.memories) > 75:
-            management_tips.append("Too many memories! Delete unimportant ones using <-memory>N</memory> syntax")
-        elif len(self.memories) > 40:
-            management_tips.append("Many memories stored. Review lower priority entries")
+        # В режиме выборки размер промпта ограничен top_k, чистить память не требуется
+        if not retrieval:
+            if self.total_characters > 10000:
+                management_tips.append("CRITICAL: Memory limit exceeded! Delete old or useless memories immediately!")
+            elif self.total_characters > 5000:
+                management_tips.append("WARNING: Memory size is large. Consider optimization or summarization")
+
+            if len(self._memories) > 75:
+                management_tips.append("Too many memories! Delete unimportant ones using <-memory>N</memory> syntax")
+            elif len(self._memories) > 40:
+                management_tips.append("Many memories stored. Review lower priority entries")
 
         # Примеры команд
         examples = [
@@ -1,10 +1,13 @@
 import uuid
 import time
+from collections import OrderedDict
 from enum import Enum
-from typing import Dict, Optional, Any
-from dataclasses import dataclass, field
+from typing import Dict, Optional, Any, Set, Tuple
+from dataclasses import dataclass
 from threading import Lock
-from main_logger import logger
+from main_logger import get_logger
+
+logger = get_logger("tasks")
 
 
 class TaskStatus(Enum):
@@ -18,6 +21,33 @@ class TaskStatus(Enum):
     ABORTED = "ABORTED"
 
 
+FINAL_STATUSES = frozenset({
+    TaskStatus.SUCCESS,
+    TaskStatus.FAILED_ON_GENERATION,
+    TaskStatus.FAILED_ON_VOICEOVER,
+    TaskStatus.FAILED,
+    TaskStatus.CANCELLED,
+    TaskStatus.ABORTED,
+})
+
+# Значения data длиннее этого (и вложенные структуры) в задаче не хранятся: входные данные запроса
+# сервер передаёт в генерацию сам, задаче нужны только короткие поля для статусов
+COMPACT_VALUE_MAX_LENGTH = 256
+
+
+def _compact_task_data(data: Dict[str, Any]) -> Tuple[Dict[str, Any], list]:
+    """(короткие значения data, ключи отброшенных крупных значений)."""
+    compact, dropped = {}, []
+    for key, value in data.items():
+        if value is None or isinstance(value, (bool, int, float)):
+            compact[key] = value
+        elif isinstance(value, str) and len(value) <= COMPACT_VALUE_MAX_LENGTH:
+            compact[key] = value
+        else:
+            dropped.append(key)
+    return compact, dropped
+
+
 @dataclass
 class Task:
     uid: str
@@ -28,102 +58,195 @@ class Task:
     updated_at: float
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
-    
+
+    @property
+    def is_final(self) -> bool:
+        return self.status in FINAL_STATUSES
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "uid": self.uid,
             "status": self.status.value,
             "type": self.type,
-            "data": self.data,
+            "data": dict(self.data),
             "created_at": self.created_at,
             "updated_at": self.updated_at,
-            "result": self.result,
+            # Копия: обработчики дополняют result ответа (audio_path), задача от этого не меняется
+            "result": dict(self.result) if self.result is not None else None,
             "error": self.error
         }
 
 
 class TaskManager:
-    def __init__(self):
-        self._tasks: Dict[str, Task] = {}
+    """
+    Хранилище задач игрового сервера с ограниченной памятью.
+
+    Раньше задачи жили в одном словаре целиком (вместе с текстами запросов) и чистились раз в час
+    по возрасту в сутки. Теперь:
+     • крупные значения data (тексты запроса, контекст игры) в задаче не хранятся;
+     • завершённые задачи удаляются через final_ttl секунд, незавершённые - через stale_ttl;
+     • задач не больше max_tasks: сначала вытесняются самые старые завершённые;
+     • индекс client_id -> задачи заменяет отдельный учёт на сервере.
+    """
+
+    def __init__(self, max_tasks: int = 1000, final_ttl: float = 900.0, stale_ttl: float = 3600.0,
+                 sweep_interval: float = 30.0):
+        self._tasks: "OrderedDict[str, Task]" = OrderedDict()
+        self._by_client: Dict[str, Set[str]] = {}
         self._lock = Lock()
-        self._cleanup_interval = 3600
-        self._last_cleanup = time.time()
-        
+        self.max_tasks = max_tasks
+        self.final_ttl = final_ttl
+        self.stale_ttl = stale_ttl
+        self._sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self._evicted = {"ttl": 0, "stale": 0, "size": 0}
+        self._created = 0
+
     def create_task(self, task_type: str, data: Dict[str, Any]) -> Task:
         with self._lock:
             uid = str(uuid.uuid4())
             current_time = time.time()
-            
+            compact, dropped = _compact_task_data(data or {})
+
             task = Task(
                 uid=uid,
                 status=TaskStatus.PENDING,
                 type=task_type,
-                data=data,
+                data=compact,
                 created_at=current_time,
                 updated_at=current_time
             )
-            
+
             self._tasks[uid] = task
+            self._created += 1
+            client_id = compact.get('client_id')
+            if client_id:
+                self._by_client.setdefault(client_id, set()).add(uid)
             logger.info(f"Created task {uid} of type {task_type}")
-            
-            self._cleanup_if_needed()
-            
+            if dropped:
+                logger.debug(f"Task {uid}: large data fields not stored: {', '.join(dropped)}")
+
+            self._cleanup_if_needed(current_time)
+
             return task
-    
+
     def update_task_status(self, uid: str, status: TaskStatus, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Optional[Task]:
         with self._lock:
             if uid not in self._tasks:
                 logger.error(f"Task {uid} not found")
                 return None
-                
+
             task = self._tasks[uid]
+            # Отменённая задача не возвращается в работу запоздалыми обновлениями генерации/озвучки
+            if task.status in (TaskStatus.CANCELLED, TaskStatus.ABORTED) and status != task.status:
+                logger.info(f"Task {uid} is {task.status.value}, status {status.value} ignored")
+                return None
+
             task.status = status
             task.updated_at = time.time()
-            
+
             if result:
                 task.result = result
             if error:
                 task.error = error
-                
+
             logger.info(f"Updated task {uid} status to {status.value}")
             return task
-    
+
     def get_task(self, uid: str) -> Optional[Task]:
         with self._lock:
             return self._tasks.get(uid)
-    
+
     def delete_task(self, uid: str) -> bool:
         with self._lock:
             if uid in self._tasks:
-                del self._tasks[uid]
+                self._remove(uid)
                 logger.info(f"Deleted task {uid}")
                 return True
             return False
-    
-    def _cleanup_if_needed(self):
-        current_time = time.time()
-        if current_time - self._last_cleanup > self._cleanup_interval:
-            self._cleanup_old_tasks()
-            self._last_cleanup = current_time
-    
-    def _cleanup_old_tasks(self):
-        current_time = time.time()
-        max_age = 86400
-        
-        tasks_to_delete = []
-        for uid, task in self._tasks.items():
-            if current_time - task.created_at > max_age:
-                tasks_to_delete.append(uid)
-        
-        for uid in tasks_to_delete:
-            del self._tasks[uid]
-            
-        if tasks_to_delete:
-            logger.info(f"Cleaned up {len(tasks_to_delete)} old tasks")
-    
+
+    # ---------- индекс по клиентам ----------
+
+    def link_client(self, client_id: str, uid: str) -> None:
+        """Привязывает задачу к ещё одному клиенту (например, событие объединено с чужой задачей)."""
+        with self._lock:
+            if uid in self._tasks:
+                self._by_client.setdefault(client_id, set()).add(uid)
+
+    def client_has_task(self, client_id: str, uid: str) -> bool:
+        with self._lock:
+            return uid in self._by_client.get(client_id, ())
+
+    def get_client_tasks(self, client_id: str) -> Set[str]:
+        with self._lock:
+            return set(self._by_client.get(client_id, ()))
+
+    def forget_client(self, client_id: str) -> None:
+        """Клиент отключился: индекс больше не нужен, сами задачи доживают до TTL."""
+        with self._lock:
+            self._by_client.pop(client_id, None)
+
+    # ---------- вытеснение ----------
+
+    def _remove(self, uid: str) -> None:
+        self._tasks.pop(uid)
+        # Подключённых клиентов единицы, обход индекса дешевле хранения обратных ссылок
+        for client_id, uids in list(self._by_client.items()):
+            uids.discard(uid)
+            if not uids:
+                del self._by_client[client_id]
+
+    def _cleanup_if_needed(self, current_time: float):
+        if len(self._tasks) > self.max_tasks or current_time - self._last_sweep > self._sweep_interval:
+            self._cleanup_old_tasks(current_time)
+            self._last_sweep = current_time
+
+    def _cleanup_old_tasks(self, current_time: float):
+        evicted = {"ttl": 0, "stale": 0, "size": 0}
+
+        for uid, task in list(self._tasks.items()):
+            if task.is_final:
+                if current_time - task.updated_at > self.final_ttl:
+                    self._remove(uid)
+                    evicted["ttl"] += 1
+            elif current_time - task.updated_at > self.stale_ttl:
+                self._remove(uid)
+                evicted["stale"] += 1
+
+        # Порядок словаря - порядок создания: сначала самые старые завершённые, затем любые.
+        # Освобождаем 10% с запасом, чтобы не обходить словарь на каждой новой задаче
+        overflow = len(self._tasks) - self.max_tasks
+        if overflow > 0:
+            overflow += self.max_tasks // 10
+        if overflow > 0:
+            for uid in [uid for uid, task in self._tasks.items() if task.is_final][:overflow]:
+                self._remove(uid)
+                evicted["size"] += 1
+                overflow -= 1
+        if overflow > 0:
+            for uid in list(self._tasks)[:overflow]:
+                self._remove(uid)
+                evicted["size"] += 1
+
+        for reason, count in evicted.items():
+            self._evicted[reason] += count
+        if any(evicted.values()):
+            logger.info(f"Cleaned up tasks: {evicted}, {len(self._tasks)} left")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tasks": len(self._tasks),
+                "active": sum(1 for task in self._tasks.values() if not task.is_final),
+                "clients": len(self._by_client),
+                "created": self._created,
+                "evicted": dict(self._evicted),
+            }
+
     def clear_all_tasks(self):
         with self._lock:
             self._tasks.clear()
+            self._by_client.clear()
             logger.info("Cleared all tasks")
 
 
@@ -134,4 +257,4 @@ def get_task_manager() -> TaskManager:
     global _global_task_manager
     if _global_task_manager is None:
         _global_task_manager = TaskManager()
-    return _global_task_manager
\ No newline at end of file
+    return _global_task_manager
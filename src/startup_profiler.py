@@ -0,0 +1,121 @@
+# startup_profiler.py
+"""
+Профилировщик холодного старта.
+
+Включается переменной окружения STARTUP_PROFILE=1 (например, в features.env).
+ • перехватывает builtins.__import__ и меряет время импорта каждого нового модуля
+   (полное - вместе с вложенными импортами, и собственное - без них);
+ • stage(name) меряет крупные этапы запуска (инициализация контроллеров, создание окна);
+ • report() пишет сводку в лог и в STARTUP_PROFILE_FILE.
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from main_logger import logger
+
+STARTUP_PROFILE_FILE = "StartupProfile.txt"
+
+# Сколько самых медленных импортов показывать в отчёте
+TOP_IMPORTS = 40
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.started_at = time.perf_counter()
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # имя модуля -> (полное время, собственное время)
+        self._imports = {}
+        # [(имя этапа, время)]
+        self._stages = []
+
+    # ---------- импорт ----------
+
+    def install(self):
+        """Ставит перехватчик импортов. Повторный вызов ничего не делает."""
+        if self._original_import is not None:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        # Относительные и уже загруженные модули не интересны - пропускаем без накладных расходов
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                if name not in self._imports:
+                    self._imports[name] = (elapsed, elapsed - children)
+
+    # ---------- этапы ----------
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stages.append((name, time.perf_counter() - start))
+
+    # ---------- отчёт ----------
+
+    def report(self, path: str = STARTUP_PROFILE_FILE):
+        """Пишет отчёт и снимает перехватчик: после показа окна профилировать нечего."""
+        if not self.enabled:
+            return
+        self.uninstall()
+        total = time.perf_counter() - self.started_at
+
+        with self._lock:
+            imports = sorted(self._imports.items(), key=lambda item: item[1][0], reverse=True)
+            stages = list(self._stages)
+
+        lines = [f"Холодный старт: {total:.3f} с", "", "Этапы:"]
+        lines += [f"  {seconds:8.3f} с  {name}" for name, seconds in stages]
+        lines += ["", f"Самые медленные импорты (всего модулей: {len(imports)}):",
+                  f"  {'полное':>8}    {'своё':>8}    модуль"]
+        lines += [f"  {full:8.3f} с  {own:8.3f} с  {name}" for name, (full, own) in imports[:TOP_IMPORTS]]
+        text = "\n".join(lines)
+
+        logger.info(f"Профиль запуска:\n{text}")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить профиль запуска в {path}: {e}")
+
+
+startup_profiler = StartupProfiler()
+if os.environ.get("STARTUP_PROFILE", "0") == "1":
+    startup_profiler.install()
@@ -5,6 +5,11 @@ from typing import Any, Dict
 class Tool(ABC):
     """ Базовый интерфейс любого инструмента """
 
+    # Сколько секунд хранить результат в кэше ToolManager (0 – не кэшировать)
+    cache_ttl: float = 0
+    # Максимальное время выполнения одного вызова, сек
+    timeout: float = 30
+
     @property
     @abstractmethod
     def name(self) -> str: ...
@@ -27,4 +32,8 @@ class Tool(ABC):
         """
         Непосредственно выполняет действие инструмента,
         возвращает строку (или dict – на ваше усмотрение).
-        """
\ No newline at end of file
+        """
+
+    def is_cacheable(self, result: Any) -> bool:
+        """ Ошибки (строки вида "[name] Ошибка…") в кэш не попадают. """
+        return not (isinstance(result, str) and result.startswith(f"[{self.name}] Ошибка"))
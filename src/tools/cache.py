@@ -0,0 +1,101 @@
+# tools/cache.py
+"""
+ToolResultCache
+ • ключ — (имя инструмента, нормализованные аргументы)
+ • TTL на запись + LRU-вытеснение по количеству записей
+ • сохраняется на диск, переживает перезапуск
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from main_logger import logger
+
+DEFAULT_CACHE_PATH = os.path.join("Cache", "tool_results.json")
+
+
+def normalize_args(arguments: Optional[dict]) -> str:
+    """Каноническая строка аргументов: ключи отсортированы, строки без лишних пробелов, None выброшены."""
+    def _norm(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {k: _norm(v) for k, v in value.items() if v is not None}
+        if isinstance(value, list):
+            return [_norm(v) for v in value]
+        return value
+
+    return json.dumps(_norm(arguments or {}), ensure_ascii=False, sort_keys=True)
+
+
+class ToolResultCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Optional[dict]) -> str:
+        return f"{tool_name}:{normalize_args(arguments)}"
+
+    # ---------- публичное API ----------
+
+    def get(self, tool_name: str, arguments: Optional[dict]) -> Optional[Any]:
+        key = self.make_key(tool_name, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def put(self, tool_name: str, arguments: Optional[dict], value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        key = self.make_key(tool_name, arguments)
+        with self._lock:
+            self._entries[key] = {"value": value, "expires": time.time() + ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save_locked()
+
+    # ---------- загрузка / сохранение ----------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, entry in data:
+                if entry.get("expires", 0) > now:
+                    self._entries[key] = entry
+            logger.info(f"Кэш инструментов загружен: {len(self._entries)} записей")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось загрузить кэш инструментов {self.path}: {e}")
+            self._entries.clear()
+
+    def _save_locked(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша инструментов: {e}")
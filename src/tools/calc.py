@@ -4,6 +4,7 @@ from .base import Tool
 class CalculatorTool(Tool):
     name = "calculator"
     description = "Выполняет простые арифметические выражения. Пример: 2+2*5"
+    timeout = 5
     parameters = {
         "type": "object",
         "properties": {
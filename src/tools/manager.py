@@ -1,16 +1,23 @@
 # tools/manager.py
 import json
+import time
 import uuid
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional, Tuple
 from .calc import CalculatorTool
 from .web_read import WebPageReaderTool
 from .web_search  import WebSearchTool
 from .base        import Tool
+from .cache       import ToolResultCache
 
 
 class ToolManager:
-    def __init__(self):
+    def __init__(self, cache: Optional[ToolResultCache] = None, max_workers: int = 4):
         self._tools: Dict[str, Tool] = {}
+        # Кэш результатов (tool, args) с TTL, общий между ходами модели
+        self.cache = cache if cache is not None else ToolResultCache()
+        # Сколько вызовов одного хода выполняется параллельно
+        self.max_workers = max_workers
         self.register(CalculatorTool())
         self.register(WebSearchTool())
         self.register(WebPageReaderTool())   # ← регистрация
@@ -56,20 +63,74 @@ class ToolManager:
             return self.json_schema()
 
 
+    # -------------------------------------------------
+    #  Выполнение (кэш + таймаут + параллельный запуск)
+    # -------------------------------------------------
     def run(self, name: str, arguments: dict):
         """
         Выполняет инструмент по имени и возвращает строковый результат.
         Если такого инструмента нет – возвращает сообщение об ошибке.
         """
-        tool = self._tools.get(name)
-        if not tool:
-            return f"[Tool-Error] Неизвестный инструмент: {name}"
+        return self.run_many([(name, arguments)])[0]
+
+    def run_many(self, calls: List[Tuple[str, dict]]) -> List[Any]:
+        """
+        Выполняет независимые вызовы одного хода модели параллельно.
+        Порядок результатов совпадает с порядком calls.
+
+        Потоки Python нельзя прервать: инструмент, не уложившийся в timeout, продолжает работать
+        в фоне, хотя его результат уже заменён ошибкой. Поэтому у каждого хода свой пул - зависший
+        вызов держит только свой поток и не занимает воркеры следующих ходов.
+        """
+        results: List[Any] = [None] * len(calls)
+        to_run = []
 
+        for i, (name, arguments) in enumerate(calls):
+            tool = self._tools.get(name)
+            if not tool:
+                results[i] = f"[Tool-Error] Неизвестный инструмент: {name}"
+                continue
+            cached = self.cache.get(name, arguments) if tool.cache_ttl > 0 else None
+            if cached is not None:
+                results[i] = cached
+                continue
+            to_run.append((i, tool, arguments))
+
+        if not to_run:
+            return results
+
+        executor = ThreadPoolExecutor(max_workers=min(len(to_run), self.max_workers),
+                                      thread_name_prefix="ToolRunner")
+        try:
+            pending = [
+                (i, tool, arguments, executor.submit(self._invoke, tool, arguments), time.monotonic() + tool.timeout)
+                for i, tool, arguments in to_run
+            ]
+            for i, tool, arguments, future, deadline in pending:
+                results[i] = self._collect(tool, arguments, future, deadline)
+        finally:
+            # Не ждём зависшие вызовы; ещё не начатые (вышли за лимит пула) отменяются
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    @staticmethod
+    def _invoke(tool: Tool, arguments: dict):
         # инструмент может ожидать **kwargs; если arguments=None, даём {}
+        return tool.run(**(arguments or {}))
+
+    def _collect(self, tool: Tool, arguments: dict, future, deadline: float):
         try:
-            return tool.run(**(arguments or {}))
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Снимает вызов, только если он ещё не начался; начатый доработает в своём потоке
+            future.cancel()
+            return f"[Tool-Error] {tool.name} не ответил за {tool.timeout} сек"
         except Exception as e:
-            return f"[Tool-Error] {name} вызвал исключение: {e}"
+            return f"[Tool-Error] {tool.name} вызвал исключение: {e}"
+
+        if tool.cache_ttl > 0 and tool.is_cacheable(result):
+            self.cache.put(tool.name, arguments, result, tool.cache_ttl)
+        return result
 
     def tools_prompt(self):
         return (
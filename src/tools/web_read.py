@@ -15,6 +15,8 @@ _CLEAN_TAGS = ["script", "style", "noscript", "iframe", "header",
 class WebPageReaderTool(Tool):
     name = "web_reader"
     description = "Скачивает веб-страницу (или raw-файл GitHub) и возвращает очищенный текст."
+    cache_ttl = 30 * 60
+    timeout = 20
     parameters = {
         "type": "object",
         "properties": {
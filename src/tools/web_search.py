@@ -6,6 +6,8 @@ from tools.base import Tool
 class WebSearchTool(Tool):
     name = "web_search"
     description = "Выполняет поиск в интернете через DuckDuckGo и возвращает результаты в формате JSON"
+    cache_ttl = 60 * 60
+    timeout = 20
 
     parameters = {
         "type": "object",
@@ -0,0 +1,368 @@
+# src/ui/chat/chat_view.py
+"""
+Окно чата на модели/представлении (QListView + делегат).
+
+Раньше каждое сообщение вставлялось курсором в один общий QTextDocument, и при показе истории
+весь документ (со всеми картинками) строился сразу в GUI-потоке. Теперь сообщения лежат в
+ChatMessageModel как лёгкие словари, а ChatItemDelegate собирает документ строки только при
+отрисовке. QListView с разной высотой строк запрашивает sizeHint у всех строк, поэтому для ещё не
+нарисованных строк высота оценивается по длине текста, а точная высота (и перераскладка через
+sizeHintChanged) появляется при первой отрисовке строки. Картинки рисуются миниатюрами из
+ThumbnailCache; миниатюры запрашиваются только из paint, пока миниатюра не готова - заглушка.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from PyQt6.QtCore import QAbstractListModel, QEvent, QModelIndex, QSize, Qt, QTimer, QUrl
+from PyQt6.QtGui import (QAbstractTextDocumentLayout, QColor, QFont, QFontMetrics, QGuiApplication, QKeySequence,
+                         QPalette, QTextCursor, QTextDocument)
+from PyQt6.QtWidgets import QAbstractItemView, QListView, QMenu, QStyle, QStyledItemDelegate
+
+from utils import _
+from ui.chat.thumbnail_cache import THUMB_MAX_HEIGHT, ThumbnailCache
+
+MessageRole = Qt.ItemDataRole.UserRole + 1
+
+ROW_PADDING = 2
+TIMESTAMP_COLOR = QColor("#888888")
+DOCUMENT_CACHE_SIZE = 128
+
+
+class ChatMessageModel(QAbstractListModel):
+    """
+    Список сообщений. Сообщение: {"uid", "rev", "role", "label": (текст, цвет, жирный),
+    "timestamp", "content_color", "parts": [{"type": "text", "content", "tag"} | {"type": "image", "key", "data"}]}.
+    uid растут при добавлении в конец и убывают при вставке в начало, так что строка = uid - first_uid.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: List[dict] = []
+        self._first_uid = 0
+        self._next_uid = 0
+        # key миниатюры -> сообщения, где она встречается
+        self._by_image_key: Dict[str, List[dict]] = {}
+
+    # ---------- QAbstractListModel ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._messages):
+            return None
+        message = self._messages[index.row()]
+        if role == MessageRole:
+            return message
+        if role == Qt.ItemDataRole.DisplayRole:
+            return message_plain_text(message)
+        return None
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    # ---------- изменение ----------
+
+    def add_message(self, message: dict, at_start: bool = False) -> dict:
+        message.setdefault("rev", 0)
+        if at_start:
+            self._first_uid -= 1
+            message["uid"] = self._first_uid
+            self.beginInsertRows(QModelIndex(), 0, 0)
+            self._messages.insert(0, message)
+        else:
+            message["uid"] = self._next_uid
+            self._next_uid += 1
+            row = len(self._messages)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._messages.append(message)
+        self._index_images(message)
+        self.endInsertRows()
+        return message
+
+    def last_message(self) -> Optional[dict]:
+        return self._messages[-1] if self._messages else None
+
+    def append_text(self, message: dict, text: str):
+        """Дописывает текст в последнюю текстовую часть сообщения (стриминг)."""
+        parts = message["parts"]
+        if parts and parts[-1]["type"] == "text" and parts[-1].get("tag") == "default":
+            parts[-1]["content"] += text
+        else:
+            parts.append({"type": "text", "content": text, "tag": "default"})
+        self.touch(message)
+
+    def touch(self, message: dict):
+        message["rev"] += 1
+        row = message["uid"] - self._first_uid
+        if 0 <= row < len(self._messages) and self._messages[row] is message:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def clear(self):
+        self.beginResetModel()
+        self._messages.clear()
+        self._by_image_key.clear()
+        self._first_uid = self._next_uid = 0
+        self.endResetModel()
+
+    def on_thumbnail_ready(self, key: str):
+        for message in self._by_image_key.get(key, []):
+            self.touch(message)
+
+    def _index_images(self, message: dict):
+        for part in message["parts"]:
+            if part["type"] == "image":
+                self._by_image_key.setdefault(part["key"], []).append(message)
+
+
+def message_plain_text(message: dict) -> str:
+    text = "".join(part["content"] for part in message["parts"] if part["type"] == "text")
+    return f"{message.get('timestamp', '')}{message['label'][0]}{text}".rstrip()
+
+
+class ChatItemDelegate(QStyledItemDelegate):
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self._documents: "OrderedDict[tuple, QTextDocument]" = OrderedDict()
+        # uid -> (rev, ширина, высота, точная ли высота)
+        self._heights: Dict[int, tuple] = {}
+        # uid строк, которые уже рисовались: для них высота считается по документу
+        self._measured = set()
+
+    def invalidate(self):
+        self._documents.clear()
+        self._heights.clear()
+        self._measured.clear()
+
+    def paint(self, painter, option, index):
+        message = index.data(MessageRole)
+        if message is None:
+            return
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.color(QPalette.ColorRole.Highlight).darker(250))
+
+        document = self._document(message, option, request_thumbnails=True)
+        self._store_exact_height(message, index, document, self._width(option))
+        painter.save()
+        painter.translate(option.rect.left(), option.rect.top() + ROW_PADDING)
+        painter.setClipRect(0, 0, option.rect.width(), option.rect.height())
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette = option.palette
+        document.documentLayout().draw(painter, context)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        message = index.data(MessageRole)
+        if message is None:
+            return QSize(0, 0)
+        width = self._width(option)
+        cached = self._heights.get(message["uid"])
+        if cached is not None and cached[0] == message["rev"] and cached[1] == width:
+            return QSize(width, cached[2])
+        if message["uid"] in self._measured:
+            document = self._document(message, option, request_thumbnails=False)
+            height = int(document.size().height()) + 2 * ROW_PADDING
+            exact = True
+        else:
+            height = self._estimate_height(message, option, width)
+            exact = False
+        self._heights[message["uid"]] = (message["rev"], width, height, exact)
+        return QSize(width, height)
+
+    def _store_exact_height(self, message: dict, index, document: QTextDocument, width: int):
+        """Запоминает высоту нарисованной строки; если оценка была неточной - просит перераскладку."""
+        self._measured.add(message["uid"])
+        height = int(document.size().height()) + 2 * ROW_PADDING
+        cached = self._heights.get(message["uid"])
+        self._heights[message["uid"]] = (message["rev"], width, height, True)
+        if cached is None or cached[0] != message["rev"] or cached[1] != width or cached[2] != height:
+            self.sizeHintChanged.emit(index)
+
+    def _estimate_height(self, message: dict, option, width: int) -> int:
+        """Грубая высота строки без QTextDocument: число строк текста по средней ширине символа."""
+        metrics = QFontMetrics(option.font)
+        per_line = max(1, (width - 4) // max(1, metrics.averageCharWidth()))
+        lines = sum(max(1, -(-len(line) // per_line)) for line in message_plain_text(message).split("\n"))
+        images = sum(1 for part in message["parts"] if part["type"] == "image")
+        return lines * metrics.lineSpacing() + images * THUMB_MAX_HEIGHT + 4 + 2 * ROW_PADDING
+
+    # ---------- документ строки ----------
+
+    def _width(self, option) -> int:
+        view = self.parent()
+        if view is not None:
+            return max(50, view.viewport().width())
+        return max(50, option.rect.width())
+
+    def _document(self, message: dict, option, request_thumbnails: bool) -> QTextDocument:
+        width = self._width(option)
+        key = (message["uid"], message["rev"], width)
+        document = self._documents.get(key)
+        if document is not None:
+            self._documents.move_to_end(key)
+            return document
+
+        document = QTextDocument()
+        document.setDocumentMargin(2)
+        document.setDefaultFont(option.font)
+        document.setTextWidth(width)
+        pending_images = self._fill_document(document, message, option, request_thumbnails)
+        # Пока миниатюры не готовы, документ не кэшируется - строка перестроится по thumbnail_ready
+        if not pending_images:
+            self._documents[key] = document
+            while len(self._documents) > DOCUMENT_CACHE_SIZE:
+                self._documents.popitem(last=False)
+        return document
+
+    def _fill_document(self, document: QTextDocument, message: dict, option, request_thumbnails: bool) -> bool:
+        cursor = QTextCursor(document)
+        font = QFont(option.font)
+        default_color = option.palette.color(QPalette.ColorRole.Text)
+        pending = False
+
+        if message.get("timestamp"):
+            _insert_text(cursor, message["timestamp"], font, TIMESTAMP_COLOR, italic=True)
+        label_text, label_color, label_bold = message["label"]
+        _insert_text(cursor, label_text, font, label_color or default_color, bold=label_bold)
+
+        content_color = message.get("content_color") or default_color
+        tag_color = message.get("tag_color") or content_color
+        for part in message["parts"]:
+            if part["type"] == "text":
+                color = tag_color if part.get("tag") == "tag_green" else content_color
+                _insert_text(cursor, part["content"], font, color)
+            elif part["type"] == "image":
+                image = self.thumbnails.get(part["key"])
+                if image is not None:
+                    name = f"thumb://{part['key']}"
+                    document.addResource(QTextDocument.ResourceType.ImageResource, QUrl(name), image)
+                    cursor.insertImage(name)
+                    cursor.insertText("\n")
+                elif self.thumbnails.is_failed(part["key"]):
+                    _insert_text(cursor, _("<Ошибка загрузки изображения>", "<Image load error>") + "\n",
+                                 font, TIMESTAMP_COLOR, italic=True)
+                else:
+                    # Миниатюры грузятся только для рисуемых строк, иначе раскладка всей истории
+                    # декодировала бы все картинки и вытесняла LRU
+                    if request_thumbnails:
+                        self.thumbnails.request(part["key"], part["data"])
+                    _insert_text(cursor, _("<Загрузка изображения…>", "<Loading image…>") + "\n",
+                                 font, TIMESTAMP_COLOR, italic=True)
+                    pending = True
+        return pending
+
+
+def _insert_text(cursor: QTextCursor, text: str, font: QFont, color: QColor, bold=False, italic=False):
+    char_format = cursor.charFormat()
+    char_format.setForeground(color)
+    part_font = QFont(font)
+    part_font.setBold(bold)
+    part_font.setItalic(italic)
+    char_format.setFont(part_font)
+    cursor.insertText(text, char_format)
+
+
+class ChatView(QListView):
+    """Окно чата: документы строятся только для рисуемых сообщений, миниатюры картинок грузятся в фоне."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnails = ThumbnailCache(parent=self)
+        self.chat_model = ChatMessageModel(self)
+        self.chat_delegate = ChatItemDelegate(self.thumbnails, self)
+        self.setModel(self.chat_model)
+        self.setItemDelegate(self.chat_delegate)
+        self.thumbnails.thumbnail_ready.connect(self._on_thumbnail_ready)
+        self.chat_delegate.sizeHintChanged.connect(self._on_row_measured)
+
+        self.setUniformItemSizes(False)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+
+    # ---------- API для message_renderer ----------
+
+    def add_message(self, message: dict, at_start: bool = False) -> dict:
+        return self.chat_model.add_message(message, at_start)
+
+    def last_message(self) -> Optional[dict]:
+        return self.chat_model.last_message()
+
+    def append_text(self, message: dict, text: str):
+        self.chat_model.append_text(message, text)
+        self._relayout()
+
+    def clear(self):
+        self.chat_model.clear()
+        self.chat_delegate.invalidate()
+
+    def is_at_bottom(self) -> bool:
+        bar = self.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 5
+
+    def scroll_to_bottom(self):
+        # Раскладка строк отложенная - прокручиваем после неё
+        QTimer.singleShot(0, self.scrollToBottom)
+
+    def keep_position_after_prepend(self, old_value: int, old_max: int):
+        self.executeDelayedItemsLayout()
+        bar = self.verticalScrollBar()
+        bar.setValue(bar.maximum() - old_max + old_value)
+
+    def copy_selection(self):
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if rows:
+            text = "\n".join(self.chat_model.index(row).data() for row in rows)
+            QGuiApplication.clipboard().setText(text)
+
+    # ---------- внутреннее ----------
+
+    def _on_thumbnail_ready(self, key: str):
+        at_bottom = self.is_at_bottom()
+        self.chat_model.on_thumbnail_ready(key)
+        self._relayout()
+        if at_bottom:
+            self.scroll_to_bottom()
+
+    def _on_row_measured(self, index):
+        # Оценка высоты сменилась точной (перераскладку QListView делает сам) - держим низ
+        if self.is_at_bottom():
+            self.scroll_to_bottom()
+
+    def _relayout(self):
+        # Высота строки изменилась - QListView пересчитает раскладку
+        self.scheduleDelayedItemsLayout()
+
+    def resizeEvent(self, event):
+        if event.size().width() != event.oldSize().width():
+            self.chat_delegate.invalidate()
+        super().resizeEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() in (QEvent.Type.FontChange, QEvent.Type.PaletteChange, QEvent.Type.StyleChange):
+            self.chat_delegate.invalidate()
+            self.scheduleDelayedItemsLayout()
+        super().changeEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            self.copy_selection()
+            return
+        super().keyPressEvent(event)
+
+    def _show_context_menu(self, pos):
+        if not self.selectedIndexes():
+            index = self.indexAt(pos)
+            if not index.isValid():
+                return
+            self.setCurrentIndex(index)
+        menu = QMenu(self)
+        menu.addAction(_("Копировать", "Copy"), self.copy_selection)
+        menu.exec(self.viewport().mapToGlobal(pos))
@@ -1,10 +1,6 @@
-import io
-import base64
-import time
-from PyQt6.QtGui import QTextCursor, QColor, QImage, QFont, QPalette
 from utils import _
-from main_logger import logger
 from ui.chat.chat_delegate import ChatMessageDelegate
+from ui.chat.thumbnail_cache import image_key, strip_data_url
 
 def _get_delegate(gui) -> ChatMessageDelegate:
     if hasattr(gui, "chat_delegate") and gui.chat_delegate:
@@ -45,75 +41,51 @@ def insert_message(gui, role, content, insert_at_start=False, message_time=""):
         else:
             normalized_parts.append(part)
 
-    cursor = gui.chat_window.textCursor()
     show_timestamps = gui._get_setting("SHOW_CHAT_TIMESTAMPS", False)
     timestamp_str = delegate.get_timestamp(show_timestamps, message_time)
 
-    if insert_at_start:
-        cursor.movePosition(QTextCursor.MoveOperation.Start)
-    else:
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-
-    if show_timestamps and timestamp_str:
-        _insert_formatted_text(gui, cursor, timestamp_str, QColor("#888888"), italic=True)
-
-    # Лейбл спикера (включая system)
-    label_text, label_color, label_bold = delegate.get_label(gui, role)
-    _insert_formatted_text(gui, cursor, label_text, label_color, bold=label_bold)
+    # Конец сообщения - пустая строка после реплик ассистента/системы, как раньше в общем документе
+    if role in {"assistant", "system"}:
+        normalized_parts.append({"type": "text", "content": "\n", "tag": "default"})
 
-    # Контент (системным — отдельный цвет)
-    content_color = delegate.get_content_color(role)
-
-    for part in normalized_parts:
-        if part["type"] == "text":
-            color = None
-            if part.get("tag") == "tag_green":
-                color = delegate.tag_color
-            else:
-                color = content_color  # для system — окрашиваем контент
-            _insert_formatted_text(gui, cursor, part["content"], color)
-        elif part["type"] == "image":
-            cursor.insertImage(part["content"])
-            cursor.insertText("\n")
-
-    insert_message_end(gui, cursor, role)
+    gui.chat_window.add_message(_new_message(gui, role, normalized_parts, timestamp_str), at_start=insert_at_start)
 
     if not insert_at_start:
-        gui.chat_window.verticalScrollBar().setValue(gui.chat_window.verticalScrollBar().maximum())
+        gui.chat_window.scroll_to_bottom()
+
+def _new_message(gui, role, parts, timestamp_str=""):
+    delegate = _get_delegate(gui)
+    return {
+        "role": role,
+        "label": delegate.get_label(gui, role),
+        "timestamp": timestamp_str,
+        "content_color": delegate.get_content_color(role),
+        "tag_color": delegate.tag_color,
+        "parts": parts,
+    }
 
 def insert_message_end(gui, cursor=None, role="assistant"):
-    if not cursor:
-        cursor = gui.chat_window.textCursor()
-    if role == "user":
-        cursor.insertText("\n")
-    elif role in {"assistant", "system"}:
-        cursor.insertText("\n\n")
+    message = gui.chat_window.last_message()
+    if message is not None and message.get("streaming"):
+        message["streaming"] = False
+        if role in {"assistant", "system"}:
+            gui.chat_window.append_text(message, "\n")
 
 def insert_speaker_name(gui, cursor=None, role="assistant"):
-    delegate = _get_delegate(gui)
-    if not cursor:
-        cursor = gui.chat_window.textCursor()
-    label_text, label_color, label_bold = delegate.get_label(gui, role)
-    _insert_formatted_text(gui, cursor, label_text, label_color, bold=label_bold)
-
-def _insert_formatted_text(gui, cursor, text, color=None, bold=False, italic=False):
-    char_format = cursor.charFormat()
-    if color:
-        char_format.setForeground(color)
-    else:
-        default_text_color = gui.chat_window.palette().color(QPalette.ColorRole.Text)
-        char_format.setForeground(default_text_color)
-    font = QFont("Arial", int(gui._get_setting("CHAT_FONT_SIZE", 12)))
-    font.setBold(bold)
-    font.setItalic(italic)
-    char_format.setFont(font)
-    cursor.insertText(text, char_format)
+    message = _new_message(gui, role, [])
+    message["streaming"] = True
+    gui.chat_window.add_message(message)
+    gui.chat_window.scroll_to_bottom()
 
 def append_message(gui, text):
-    cursor = gui.chat_window.textCursor()
-    cursor.movePosition(QTextCursor.MoveOperation.End)
-    _insert_formatted_text(gui, cursor, text)
-    gui.chat_window.verticalScrollBar().setValue(gui.chat_window.verticalScrollBar().maximum())
+    message = gui.chat_window.last_message()
+    if message is None or not message.get("streaming"):
+        insert_speaker_name(gui, role="assistant")
+        message = gui.chat_window.last_message()
+    at_bottom = gui.chat_window.is_at_bottom()
+    gui.chat_window.append_text(message, text)
+    if at_bottom:
+        gui.chat_window.scroll_to_bottom()
 
 def prepare_stream_slot(gui):
     insert_speaker_name(gui, role="assistant")
@@ -125,31 +97,10 @@ def finish_stream_slot(gui):
     insert_message_end(gui, role="assistant")
 
 def process_image_for_chat(gui, has_image_content, item, processed_content_parts):
-    image_data_base64 = item.get("image_url", {}).get("url", "")
-    if image_data_base64.startswith("data:image/jpeg;base64,"):
-        image_data_base64 = image_data_base64.replace("data:image/jpeg;base64,", "")
-    elif image_data_base64.startswith("data:image/png;base64,"):
-        image_data_base64 = image_data_base64.replace("data:image/png;base64,", "")
-    try:
-        from PIL import Image
-        image_bytes = base64.b64decode(image_data_base64)
-        image = Image.open(io.BytesIO(image_bytes))
-        max_width = 400
-        max_height = 300
-        original_width, original_height = image.size
-        if original_width > max_width or original_height > max_height:
-            ratio = min(max_width / original_width, max_height / original_height)
-            new_width = int(original_width * ratio)
-            new_height = int(original_height * ratio)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format='PNG')
-        image_bytes.seek(0)
-        qimage = QImage()
-        qimage.loadFromData(image_bytes.getvalue())
-        processed_content_parts.append({"type": "image", "content": qimage})
-        has_image_content = True
-    except Exception as e:
-        logger.error(f"Ошибка при декодировании или обработке изображения: {e}")
+    """Добавляет ссылку на картинку; миниатюра декодируется в фоне окном чата (ThumbnailCache)."""
+    image_data_base64 = strip_data_url(item.get("image_url", {}).get("url", ""))
+    if not image_data_base64:
         processed_content_parts.append({"type": "text", "content": _("<Ошибка загрузки изображения>", "<Image load error>")})
-    return has_image_content
\ No newline at end of file
+        return has_image_content
+    processed_content_parts.append({"type": "image", "key": image_key(image_data_base64), "data": image_data_base64})
+    return True
@@ -0,0 +1,119 @@
+# src/ui/chat/thumbnail_cache.py
+"""
+Кэш миниатюр картинок для окна чата.
+
+Раньше каждая картинка при каждом показе истории проходила base64 -> PIL -> LANCZOS -> PNG -> QImage
+прямо в GUI-потоке. Здесь декодирование и масштабирование выполняются в QThreadPool (QImage можно
+использовать вне GUI-потока, в отличие от QPixmap), а готовые миниатюры хранятся в LRU по хэшу
+исходных данных - одна и та же картинка в истории декодируется один раз.
+"""
+import base64
+import binascii
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from main_logger import logger
+
+THUMB_MAX_WIDTH = 400
+THUMB_MAX_HEIGHT = 300
+DEFAULT_CAPACITY = 256
+
+
+def strip_data_url(data: str) -> str:
+    """Отрезает префикс data:image/...;base64, если он есть."""
+    if data.startswith("data:"):
+        comma = data.find(",")
+        if comma != -1:
+            return data[comma + 1:]
+    return data
+
+
+def image_key(data: str) -> str:
+    return hashlib.sha1(data.encode("ascii", "ignore")).hexdigest()
+
+
+class _ThumbnailSignals(QObject):
+    # key, QImage (пустой при ошибке)
+    finished = pyqtSignal(str, QImage)
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, key: str, data: str, signals: _ThumbnailSignals):
+        super().__init__()
+        self.key = key
+        self.data = data
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        try:
+            raw = base64.b64decode(self.data)
+            if image.loadFromData(raw):
+                if image.width() > THUMB_MAX_WIDTH or image.height() > THUMB_MAX_HEIGHT:
+                    image = image.scaled(THUMB_MAX_WIDTH, THUMB_MAX_HEIGHT,
+                                         Qt.AspectRatioMode.KeepAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+            else:
+                logger.error("Не удалось декодировать изображение для чата")
+        except (binascii.Error, ValueError) as e:
+            logger.error(f"Ошибка при декодировании изображения: {e}")
+            image = QImage()
+        self.signals.finished.emit(self.key, image)
+
+
+class ThumbnailCache(QObject):
+    """LRU миниатюр; thumbnail_ready(key) приходит в GUI-поток, когда миниатюра готова (или не удалась)."""
+
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self._images: "OrderedDict[str, QImage]" = OrderedDict()
+        self._failed = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._signals = _ThumbnailSignals()
+        self._signals.finished.connect(self._on_finished, Qt.ConnectionType.QueuedConnection)
+
+    def get(self, key: str) -> Optional[QImage]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def is_failed(self, key: str) -> bool:
+        return key in self._failed
+
+    def request(self, key: str, data: str) -> None:
+        """Ставит декодирование в пул, если миниатюры ещё нет и она не в работе."""
+        with self._lock:
+            if key in self._images or key in self._pending or key in self._failed:
+                return
+            self._pending.add(key)
+        self._pool.start(_ThumbnailJob(key, strip_data_url(data), self._signals))
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._failed.clear()
+
+    def _on_finished(self, key: str, image: QImage):
+        with self._lock:
+            self._pending.discard(key)
+            if image.isNull():
+                self._failed.add(key)
+            else:
+                self._images[key] = image
+                self._images.move_to_end(key)
+                while len(self._images) > self.capacity:
+                    self._images.popitem(last=False)
+        self.thumbnail_ready.emit(key)
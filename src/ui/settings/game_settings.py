@@ -10,6 +10,14 @@ def setup_game_controls(self, parent):
         {'label': _('Использовать новый API', 'Use new API'), 'key': 'USE_NEW_API', 'type': 'checkbutton',
         'default_checkbutton': False,
         'tooltip': _('Использовать новую систему передачи данных с задачами', 'Use new task-based data transfer system')},
+        {'label': _('Параллельных генераций', 'Parallel generations'), 'key': 'GAME_MAX_PARALLEL_GENERATIONS',
+         'type': 'entry', 'default': 2, 'validation': self.validate_positive_integer,
+         'tooltip': _('Сколько персонажей из игры могут генерировать ответ одновременно (не больше 4). Запросы одного персонажа всегда выполняются по очереди',
+                      'How many in-game characters can generate a reply at the same time (at most 4). Requests of one character always run in order')},
+        {'label': _('Окно объединения событий, мс', 'Event coalescing window, ms'), 'key': 'GAME_COALESCE_WINDOW_MS',
+         'type': 'entry', 'default': 300, 'validation': self.validate_positive_integer_or_zero,
+         'tooltip': _('Idle-таймеры и сбросы system_info одного персонажа за это время объединяются в один запрос к модели. 0 - без объединения',
+                      'Idle timers and system_info flushes of one character within this window are merged into one model request. 0 disables merging')},
     ]
 
     create_settings_section(
@@ -191,6 +191,29 @@ def setup_model_interaction_controls(self, parent):
                            _("Сжатие истории", "History Compression"),
                            history_compression_config)
 
+    memory_retrieval_config = [
+        {'label': _('Режим долговременной памяти', 'Long-term memory mode'),
+         'key': 'MEMORY_RETRIEVAL_MODE', 'type': 'combobox',
+         'options': ['all', 'top_k'],
+         'default': "all",
+         'tooltip': _('all - в промпт попадает вся память, top_k - только воспоминания, релевантные текущему диалогу, и важные (high/critical). Для top_k используется модель эмбеддингов.',
+                      'all - the whole memory goes into the prompt, top_k - only memories relevant to the current dialogue plus important ones (high/critical). top_k uses the embedding model.')},
+        {'label': _('Кол-во релевантных воспоминаний', 'Relevant memories count'),
+         'key': 'MEMORY_RETRIEVAL_TOP_K', 'type': 'entry',
+         'default': 15, 'validation': self.validate_positive_integer,
+         'tooltip': _('Сколько наиболее релевантных воспоминаний добавлять в промпт в режиме top_k.',
+                      'How many of the most relevant memories are added to the prompt in top_k mode.')},
+        {'label': _('Сообщений контекста для поиска', 'Context messages for search'),
+         'key': 'MEMORY_RETRIEVAL_CONTEXT_MESSAGES', 'type': 'entry',
+         'default': 4, 'validation': self.validate_positive_integer_or_zero,
+         'tooltip': _('Сколько последних сообщений истории учитывать вместе с вводом пользователя при поиске воспоминаний.',
+                      'How many recent history messages are used together with the user input to search memories.')},
+    ]
+
+    create_settings_section(self, parent,
+                           _("Долговременная память", "Long-term Memory"),
+                           memory_retrieval_config)
+
     token_settings_config = [
         {'label': _('Показывать информацию о токенах', 'Show Token Info'), 'key': 'SHOW_TOKEN_INFO',
          'type': 'checkbutton', 'default_checkbutton': True,
@@ -214,6 +237,28 @@ def setup_model_interaction_controls(self, parent):
                            _("Настройки токенов", "Token Settings"),
                            token_settings_config)
 
+    request_dump_config = [
+        {'label': _('Сохранять запросы', 'Save requests'), 'key': 'REQUEST_DUMP_MODE', 'type': 'combobox',
+         'options': ["off", "last_n", "all"], 'default': "last_n",
+         'tooltip': _('Дампы промптов в SavedMessages для отладки (пишутся в фоне). off - не сохранять, '
+                      'last_n - только последние, all - каждый запрос',
+                      'Prompt dumps in SavedMessages for debugging (written in the background). off - disabled, '
+                      'last_n - only the latest ones, all - every request')},
+        {'label': _('Сколько последних хранить', 'How many to keep'), 'key': 'REQUEST_DUMP_LAST_N', 'type': 'entry',
+         'default': 3, 'validation': self.validate_positive_integer},
+        {'label': _('Сжимать дампы (gzip)', 'Compress dumps (gzip)'), 'key': 'REQUEST_DUMP_COMPRESS',
+         'type': 'checkbutton', 'default_checkbutton': True},
+        {'label': _('Уровни логов', 'Log levels'), 'key': 'LOG_LEVELS', 'type': 'entry', 'default': "",
+         'tooltip': _('Уровни логирования по подсистемам, например: events=WARNING, chat=DEBUG, commands=DEBUG. '
+                      '"*" - общий уровень (по умолчанию INFO)',
+                      'Per-subsystem log levels, e.g.: events=WARNING, chat=DEBUG, commands=DEBUG. '
+                      '"*" sets the common level (INFO by default)')},
+    ]
+
+    create_settings_section(self, parent,
+                           _("Отладка запросов", "Request Debugging"),
+                           request_dump_config)
+
     command_processing_config = [
         {'label': _('Использовать обработку команд', 'Use command processing'), 'key': 'USE_COMMAND_REPLACER',
          'type': 'checkbutton',
@@ -141,6 +141,28 @@ def build_voiceover_settings_ui(self, parent_layout):
         {'label': _('Озвучивать в чате', 'Voiceover in chat'),
          'key': 'VOICEOVER_LOCAL_CHAT', 'type': 'checkbutton',
          'default_checkbutton': True},
+        {'label': _('Озвучивать по предложениям', 'Voice sentence by sentence'),
+         'key': 'LOCAL_VOICE_SEGMENTED', 'type': 'checkbutton',
+         'default_checkbutton': True,
+         'tooltip': _('В чате реплика начинает звучать, как только озвучено первое предложение',
+                      'In chat, playback starts as soon as the first sentence is voiced')},
+        {'label': _('Кэшировать реплики', 'Cache voice lines'),
+         'key': 'LOCAL_VOICE_CACHE', 'type': 'checkbutton',
+         'default_checkbutton': True,
+         'tooltip': _('Повторяющиеся фразы не синтезируются заново, а берутся с диска',
+                      'Repeated phrases are played from disk instead of being synthesized again')},
+        {'label': _('Размер кэша реплик (МБ)', 'Voice line cache size (MB)'),
+         'key': 'LOCAL_VOICE_CACHE_MB', 'type': 'entry', 'default': '512'},
+        {'label': _('Бюджет памяти моделей (ГБ)', 'Model memory budget (GB)'),
+         'key': 'LOCAL_VOICE_RAM_BUDGET_GB', 'type': 'entry', 'default': '0',
+         'tooltip': _('Сколько памяти могут занимать одновременно загруженные модели озвучки. '
+                      'При превышении выгружается давно неиспользуемая. 0 - без ограничения',
+                      'How much memory loaded voice models may use together. '
+                      'The least recently used one is unloaded when exceeded. 0 - unlimited')},
+        {'label': _('Голосов RVC в памяти', 'RVC voices kept loaded'),
+         'key': 'LOCAL_VOICE_RVC_CACHE_SIZE', 'type': 'entry', 'default': '3',
+         'tooltip': _('Сколько голосов персонажей RVC держать загруженными, чтобы смена персонажа не перезагружала модель',
+                      'How many character RVC voices stay loaded so switching characters does not reload the model')},
         {'label': _('Управление моделями', 'Manage Models'),
          'type': 'button', 'command': getattr(self, 'open_local_model_installation_window', None)}
     ]
@@ -163,7 +185,8 @@ def build_voiceover_settings_ui(self, parent_layout):
             default=cfg.get('default', ''),
             default_checkbutton=cfg.get('default_checkbutton', False),
             command=cfg.get('command'),
-            widget_name=cfg.get('widget_name')
+            widget_name=cfg.get('widget_name'),
+            tooltip=cfg.get('tooltip')
         )
         if widget:
             local_layout.addWidget(widget)
@@ -1,6 +1,6 @@
 import base64
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFrame, QTextBrowser,
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFrame,
     QTextEdit, QGridLayout, QGraphicsOpacityEffect, QFileDialog
 )
 from PyQt6.QtCore import Qt, QPropertyAnimation, QPoint, QTimer, QBuffer, QIODevice
@@ -11,6 +11,7 @@ from ui.widgets.mita_status_widget import MitaStatusWidget
 from ui.widgets.image_preview_widget import ImagePreviewBar
 from ui.widgets.image_viewer_widget import ImageViewerWidget
 from ui.widgets.status_indicators_widget import create_status_indicators_inline
+from ui.chat.chat_view import ChatView
 from utils import _
 from core.events import Events
 from main_logger import logger
@@ -48,9 +49,7 @@ def setup_chat_panel(gui, main_layout):
     top_panel_layout.addStretch()
     chat_layout.addLayout(top_panel_layout)
     
-    gui.chat_window = QTextBrowser()
-    gui.chat_window.setOpenExternalLinks(False)
-    gui.chat_window.setReadOnly(True)
+    gui.chat_window = ChatView()
     initial_font_size = int(gui._get_setting("CHAT_FONT_SIZE", 12))
     font = QFont("Arial", initial_font_size)
     gui.chat_window.setFont(font)
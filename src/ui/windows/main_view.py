@@ -390,7 +390,7 @@ class ChatGUI(QMainWindow):
             except Exception as ex:
                 logger.error(f"_on_history_loaded: НУ Я ПОНЯЛ: {str(ex)}")
         self.update_debug_info()
-        self.chat_window.verticalScrollBar().setValue(self.chat_window.verticalScrollBar().maximum())
+        self.chat_window.scroll_to_bottom()
 
     def validate_number_0_60(self, new_value):
         if not new_value.isdigit():
@@ -569,7 +569,7 @@ class ChatGUI(QMainWindow):
             content = entry["content"]
             message_time = entry.get("time", "???")
             message_renderer.insert_message(self, role, content, insert_at_start=True, message_time=message_time)
-        QTimer.singleShot(0, lambda: scrollbar.setValue(scrollbar.maximum() - old_max + old_value))
+        self.chat_window.keep_position_after_prepend(old_value, old_max)
         logger.info(f"Загружено еще {len(messages_to_prepend)} сообщений.")
 
     def _save_setting(self, key, value):
@@ -1245,10 +1245,6 @@ class ChatGUI(QMainWindow):
         from ui.chat import message_renderer
         return message_renderer.insert_speaker_name(self, cursor, role)
 
-    def _insert_formatted_text(self, cursor, text, color=None, bold=False, italic=False):
-        from ui.chat import message_renderer
-        return message_renderer._insert_formatted_text(self, cursor, text, color, bold, italic)
-
     def _prepare_stream_slot(self):
         from ui.chat import message_renderer
         return message_renderer.prepare_stream_slot(self)
@@ -1336,15 +1332,9 @@ class ChatGUI(QMainWindow):
 
     # ===== Совместимость: упрощённая вставка диалога =====
     def insert_dialog(self, input_text="", response="", system_text=""):
-        MitaName = self._get_character_name()
-        cursor = self.chat_window.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
         if input_text != "":
-            self._insert_formatted_text(cursor, "Вы: ", QColor("gold"), bold=True)
-            cursor.insertText(f"{input_text}\n")
+            message_renderer.insert_message(self, "user", input_text)
         if system_text != "":
-            self._insert_formatted_text(cursor, f"System to {MitaName}: ", QColor("white"), bold=True)
-            cursor.insertText(f"{system_text}\n\n")
+            message_renderer.insert_message(self, "system", system_text)
         if response != "":
-            self._insert_formatted_text(cursor, f"{MitaName}: ", QColor("hot pink"), bold=True)
-            cursor.insertText(f"{response}\n\n")
\ No newline at end of file
+            message_renderer.insert_message(self, "assistant", response)
\ No newline at end of file
@@ -1,10 +1,19 @@
+import asyncio
+import io
 import subprocess
 import os
 import ffmpeg
 import sys
+from typing import List, Tuple, Union
+
+import numpy as np
 
 from main_logger import logger
 
+# Формат, который ждёт игра: PCM 16 бит, 44100 Гц, стерео
+GAME_SAMPLE_RATE = 44100
+GAME_CHANNELS = 2
+
 
 class AudioConverter:
     ffmpeg_path = os.path.join("ffmpeg.exe")
@@ -12,23 +21,75 @@ class AudioConverter:
     @staticmethod
     async def convert_to_wav(input_file, output_file):
         logger.info(f"Начинаю конвертацию {input_file} в {output_file} с помощью {AudioConverter.ffmpeg_path}")
+        return await AudioConverter.convert_batch_to_wav([(input_file, output_file)])
 
-        try:
-            command = [
-                AudioConverter.ffmpeg_path,
-                '-i', input_file,
+    @staticmethod
+    async def convert_batch_to_wav(pairs: List[Tuple[str, str]]) -> bool:
+        """Конвертирует несколько файлов одним запуском ffmpeg (запасной путь для того, что не читает soundfile)."""
+        if not pairs:
+            return True
+        command = [AudioConverter.ffmpeg_path, '-y']
+        for input_file, _output_file in pairs:
+            command += ['-i', input_file]
+        for index, (_input_file, output_file) in enumerate(pairs):
+            command += [
+                '-map', f'{index}:a',
                 '-f', 'wav',
                 '-acodec', 'pcm_s16le',
-                '-ar', '44100', # Стандартная частота дискретизации
-                '-ac', '2', # Стерео
-                '-q:a', '0', # Высокое качество
-                '-threads', '4', # Используем многопоточность
-                '-preset', 'ultrafast', # Самый быстрый пресет
+                '-ar', str(GAME_SAMPLE_RATE), # Стандартная частота дискретизации
+                '-ac', str(GAME_CHANNELS), # Стерео
                 output_file,
-                '-y'
             ]
-            subprocess.run(command, check=True, capture_output=True)
+        try:
+            await asyncio.to_thread(subprocess.run, command, check=True, capture_output=True)
             return True
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             logger.info(f"Ошибка при конвертации аудио: {e}")
             return False
+
+    @staticmethod
+    def decode_to_wav(source: Union[bytes, str], output_file: str) -> bool:
+        """
+        Декодирует MP3/OGG (байты или путь) в памяти и сразу пишет WAV для игры, без запуска ffmpeg.
+        Возвращает False, если формат не поддерживается libsndfile.
+        """
+        import soundfile as sf
+        from handlers.voice_models.pipelines.audio_chain import resample
+
+        try:
+            audio, sample_rate = sf.read(io.BytesIO(source) if isinstance(source, bytes) else source,
+                                         dtype="float32", always_2d=True)
+        # LibsndfileError есть только в soundfile >= 0.11 и наследует RuntimeError - его и ловим
+        except (RuntimeError, TypeError) as e:
+            logger.info(f"soundfile не смог декодировать аудио: {e}")
+            return False
+
+        if sample_rate != GAME_SAMPLE_RATE:
+            audio = np.stack([resample(np.ascontiguousarray(audio[:, ch]), sample_rate, GAME_SAMPLE_RATE)
+                              for ch in range(audio.shape[1])], axis=1)
+        if audio.shape[1] == 1:
+            audio = np.repeat(audio, GAME_CHANNELS, axis=1)
+        elif audio.shape[1] > GAME_CHANNELS:
+            audio = audio[:, :GAME_CHANNELS]
+
+        tmp_path = output_file + ".tmp"
+        sf.write(tmp_path, np.clip(audio, -1.0, 1.0), GAME_SAMPLE_RATE, subtype="PCM_16", format="WAV")
+        os.replace(tmp_path, output_file)
+        return True
+
+    @staticmethod
+    async def bytes_to_wav(data: bytes, output_file: str, source_extension: str = ".ogg") -> bool:
+        """Скачанный ответ -> WAV для игры: сначала в памяти, при неудаче - через ffmpeg."""
+        if await asyncio.to_thread(AudioConverter.decode_to_wav, data, output_file):
+            return True
+
+        source_file = os.path.splitext(output_file)[0] + source_extension
+        with open(source_file, "wb") as f:
+            f.write(data)
+        try:
+            return await AudioConverter.convert_to_wav(source_file, output_file)
+        finally:
+            try:
+                os.remove(source_file)
+            except OSError:
+                pass
@@ -6,6 +6,9 @@ import re
 from typing import List, Dict, Tuple, Optional, Any
 
 from handlers.embedding_handler import EmbeddingModelHandler
+from main_logger import get_logger
+
+logger = get_logger("commands")
 
 EMBEDDINGS_FILE = "mita_commands_embeddings_full.json"
 CATEGORY_SWITCH_THRESHOLD_DIFF = 0.18
@@ -24,10 +27,10 @@ class CommandParser:
         self.model_handler = model_handler
         self.embeddings_data = self._load_embeddings(embeddings_path)
         self.all_canonical_items = self._prepare_all_items()
-        print(f"\nCommandParser инициализирован. Загружено {len(self.all_canonical_items)} канонических команд.")
+        logger.info("CommandParser инициализирован. Загружено %d канонических команд.", len(self.all_canonical_items))
 
     def _load_embeddings(self, embeddings_path: str) -> Dict[str, List[Dict[str, Any]]]:
-        print(f"Загрузка эмбеддингов из файла: {embeddings_path}")
+        logger.info("Загрузка эмбеддингов из файла: %s", embeddings_path)
         if not os.path.exists(embeddings_path):
              raise FileNotFoundError(f"Файл с эмбеддингами не найден: {embeddings_path}")
         try:
@@ -47,14 +50,16 @@ class CommandParser:
                              item['embedding'] = np.array(item['embedding'], dtype=np.float32)
                              processed_items.append(item)
                          else:
-                             print(f"  Предупреждение: Неверная размерность эмбеддинга ({len(item['embedding'])}, ожидалось {model_dim}) для '{item.get('name', 'N/A')}' в категории '{category}'. Пропущено.")
+                             logger.warning("Неверная размерность эмбеддинга (%d, ожидалось %s) для '%s' в категории '%s'. Пропущено.",
+                                            len(item['embedding']), model_dim, item.get('name', 'N/A'), category)
                     else:
-                         print(f"  Предупреждение: Отсутствует или неверный формат эмбеддинга для '{item.get('name', 'N/A')}' в категории '{category}'. Пропущено.")
+                         logger.warning("Отсутствует или неверный формат эмбеддинга для '%s' в категории '%s'. Пропущено.",
+                                        item.get('name', 'N/A'), category)
                 processed_data[category] = processed_items
-            print(f"Эмбеддинги успешно загружены и обработаны.")
+            logger.info("Эмбеддинги успешно загружены и обработаны.")
             return processed_data
         except Exception as e:
-            print(f"Ошибка при загрузке или обработке файла эмбеддингов: {e}")
+            logger.error("Ошибка при загрузке или обработке файла эмбеддингов: %s", e)
             raise e
 
     def _prepare_all_items(self) -> List[Dict[str, Any]]:
@@ -111,34 +116,39 @@ class CommandParser:
         chosen_score = -1.0
 
         if best_overall_item is None:
-             print("  Предупреждение: Не найдено ни одного валидного совпадения.")
+             logger.debug("Не найдено ни одного валидного совпадения.")
              return None, None, -1.0, top_candidates
 
         if best_overall_score < min_threshold:
-             print(f"  Информация: Лучшее общее сходство ({best_overall_score:.4f}) ниже порога ({min_threshold}). Замена не будет выполнена.")
+             logger.debug("Лучшее общее сходство (%.4f) ниже порога (%s). Замена не будет выполнена.", best_overall_score, min_threshold)
              return None, None, best_overall_score, top_candidates
 
         if original_category is None or best_in_category_item is None or best_in_category_score < min_threshold:
             chosen_item = best_overall_item
             chosen_category = best_overall_category
             chosen_score = best_overall_score
-            print(f"  Информация: Исходная категория не определена или лучший результат в ней ниже порога. Выбран лучший общий: '{chosen_item['name']}' ({chosen_category}, {chosen_score:.4f})")
+            logger.debug("Исходная категория не определена или лучший результат в ней ниже порога. Выбран лучший общий: '%s' (%s, %.4f)",
+                         chosen_item['name'], chosen_category, chosen_score)
         else:
             score_diff = best_overall_score - best_in_category_score
             if best_overall_category != original_category and score_diff >= category_threshold:
                 chosen_item = best_overall_item
                 chosen_category = best_overall_category
                 chosen_score = best_overall_score
-                print(f"  Информация: Лучший общий результат из ДРУГОЙ категории ('{chosen_item['name']}' [{chosen_category}], {chosen_score:.4f}) "
-                      f"значительно лучше лучшего в исходной ('{best_in_category_item['name']}' [{original_category}], {best_in_category_score:.4f}), разница {score_diff:.4f}. Категория изменена.")
+                logger.debug("Лучший общий результат из ДРУГОЙ категории ('%s' [%s], %.4f) значительно лучше лучшего в исходной "
+                             "('%s' [%s], %.4f), разница %.4f. Категория изменена.",
+                             chosen_item['name'], chosen_category, chosen_score,
+                             best_in_category_item['name'], original_category, best_in_category_score, score_diff)
             else:
                 chosen_item = best_in_category_item
                 chosen_category = original_category
                 chosen_score = best_in_category_score
-                print(f"  Информация: Выбран лучший результат из исходной категории '{original_category}': '{chosen_item['name']}' ({chosen_score:.4f})")
+                logger.debug("Выбран лучший результат из исходной категории '%s': '%s' (%.4f)",
+                             original_category, chosen_item['name'], chosen_score)
 
         if chosen_score < min_threshold:
-             print(f"  Информация: Выбранный результат '{chosen_item['name']}' ({chosen_score:.4f}) ниже порога ({min_threshold}). Замена не будет выполнена.")
+             logger.debug("Выбранный результат '%s' (%.4f) ниже порога (%s). Замена не будет выполнена.",
+                          chosen_item['name'], chosen_score, min_threshold)
              return None, None, chosen_score, top_candidates
 
         return chosen_item, chosen_category, chosen_score, top_candidates
@@ -191,10 +201,10 @@ class CommandParser:
             end = tag_info['end']
             full_match = tag_info['full_match']
 
-            print(f"\nОбработка тега: <{tag_name}>, Содержимое: '{content}'")
+            logger.debug("Обработка тега: <%s>, Содержимое: '%s'", tag_name, content)
 
             if skip_comma_params and ',' in content:
-                print(f"  Информация: Содержимое тега содержит запятую. Пропускаем замену для '{full_match}'.")
+                logger.debug("Содержимое тега содержит запятую. Пропускаем замену для '%s'.", full_match)
                 replacements_report.append({
                     "original_tag": tag_name,
                     "original_content": content,
@@ -204,7 +214,7 @@ class CommandParser:
                 continue
 
             if not original_category:
-                 print(f"  Предупреждение: Неизвестная категория для тега <{tag_name}>. Пропускаем.")
+                 logger.debug("Неизвестная категория для тега <%s>. Пропускаем.", tag_name)
                  replacements_report.append({
                     "original_tag": tag_name, "original_content": content,
                     "skipped_reason": f"Unknown category for tag <{tag_name}>",
@@ -212,7 +222,7 @@ class CommandParser:
                  })
                  continue
             if not content.strip():
-                 print(f"  Информация: Пустое содержимое тега <{tag_name}>. Пропускаем.")
+                 logger.debug("Пустое содержимое тега <%s>. Пропускаем.", tag_name)
                  replacements_report.append({
                     "original_tag": tag_name, "original_content": content,
                     "skipped_reason": f"Empty content for tag <{tag_name}>",
@@ -222,7 +232,7 @@ class CommandParser:
 
             input_embedding = self.model_handler.get_embedding(content)
             if input_embedding is None:
-                print(f"  Ошибка: Не удалось получить эмбеддинг для '{content}'. Пропускаем тег.")
+                logger.warning("Не удалось получить эмбеддинг для '%s'. Пропускаем тег.", content)
                 replacements_report.append({
                     "original_tag": tag_name, "original_content": content,
                     "skipped_reason": f"Failed to get embedding for '{content}'",
@@ -252,19 +262,20 @@ class CommandParser:
                     canonical_name = best_item['name']
                     new_tag_name = CATEGORY_TO_TAG_MAP.get(best_category, best_category)
                     replacement_str = f"<{new_tag_name}>{canonical_name}</{new_tag_name}>"
-                    print(f"  ЗАМЕНА: '{full_match}' -> '{replacement_str}' (Сходство: {best_score:.4f})")
+                    logger.info("ЗАМЕНА: '%s' -> '%s' (Сходство: %.4f)", full_match, replacement_str, best_score)
 
                     modified_text = modified_text[:start] + replacement_str + modified_text[end:]
 
                     report_entry["chosen_item"] = canonical_name
                     report_entry["chosen_tag"] = new_tag_name
                 else:
-                    print(f"  ЗАМЕНА НЕ ВЫПОЛНЕНА для '{full_match}'. Лучший кандидат '{best_item['name']}' требует параметры (needs_param=True). Сходство: {best_score:.4f}")
+                    logger.debug("ЗАМЕНА НЕ ВЫПОЛНЕНА для '%s'. Лучший кандидат '%s' требует параметры (needs_param=True). Сходство: %.4f",
+                                 full_match, best_item['name'], best_score)
                     report_entry["skipped_reason"] = f"Best match '{best_item['name']}' requires parameters (needs_param=True)"
                     report_entry["chosen_item"] = best_item['name']
                     report_entry["chosen_tag"] = CATEGORY_TO_TAG_MAP.get(best_category, best_category)
             else:
-                 print(f"  ЗАМЕНА НЕ ВЫПОЛНЕНА для '{full_match}'. Лучшее сходство: {best_score:.4f} (ниже порога или не найдено).")
+                 logger.debug("ЗАМЕНА НЕ ВЫПОЛНЕНА для '%s'. Лучшее сходство: %s (ниже порога или не найдено).", full_match, best_score)
                  report_entry["skipped_reason"] = f"Best similarity {best_score:.4f} below threshold or no match found"
 
             replacements_report.append(report_entry)
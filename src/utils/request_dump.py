@@ -0,0 +1,245 @@
+# src/utils/request_dump.py
+"""
+Отладочные дампы запросов к LLM.
+
+Раньше перед каждой попыткой генерации весь промпт (вместе со скриншотами в base64) синхронно
+писался через json.dump(indent=4) - ещё до отправки HTTP-запроса. Теперь на горячем пути делается
+только дешёвый снимок структуры сообщений, а всё остальное - в фоновом потоке:
+ • картинки (data:...;base64, длинные base64-строки, bytes) сохраняются один раз в images/<sha1>.<ext>,
+   а в дампе заменяются ссылкой вида "<image sha1=... bytes=...>";
+ • JSON пишется компактно, по умолчанию сжатым (.json.gz);
+ • в режиме last_n вместе со старыми дампами удаляются картинки, на которые не ссылается ни один
+   оставшийся дамп;
+ • режим задаётся настройкой REQUEST_DUMP_MODE:
+     off     - не сохранять;
+     last_n  - хранить последние REQUEST_DUMP_LAST_N дампов каждого вида (по умолчанию);
+     all     - сохранять каждый запрос.
+"""
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from main_logger import logger
+
+DUMP_ROOT = "SavedMessages"
+IMAGES_DIR = os.path.join(DUMP_ROOT, "images")
+
+MODE_OFF = "off"
+MODE_LAST_N = "last_n"
+MODE_ALL = "all"
+
+# Строки длиннее этого проверяются на base64-картинку
+_IMAGE_MIN_LENGTH = 2048
+_DATA_URL_RE = re.compile(r"^data:(image/[\w.+-]+);base64,")
+_BASE64_RE = re.compile(r"^[A-Za-z0-9+/=\s]+$")
+_IMAGE_REF_RE = re.compile(rb"<image sha1=([0-9a-f]{40})")
+_DUMP_SUFFIXES = (".json", ".json.gz")
+_MIME_EXT = {"image/png": "png", "image/jpeg": "jpg", "image/jpg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+
+
+def _snapshot(obj: Any) -> Any:
+    """Копия контейнеров без копирования строк/байтов - сообщения могут измениться после capture()."""
+    if isinstance(obj, dict):
+        return {key: _snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_snapshot(value) for value in obj]
+    return obj
+
+
+class RequestDumper:
+    def __init__(self, root: str = DUMP_ROOT, max_pending: int = 8):
+        self.root = root
+        self.images_dir = os.path.join(root, "images")
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._seq = 0
+        self._known_images = set()
+        # путь дампа -> sha1 картинок, на которые он ссылается
+        self._dump_refs: Dict[str, Set[str]] = {}
+
+    # ---------- публичное API ----------
+
+    def capture(self, messages: Any, name: str = "last_attempt_log") -> None:
+        """
+        Ставит дамп в очередь фонового потока. Не блокирует: если писатель не успевает,
+        дамп пропускается.
+        """
+        mode = self._setting("REQUEST_DUMP_MODE", MODE_LAST_N)
+        if mode == MODE_OFF:
+            return
+        try:
+            self._queue.put_nowait((name, _snapshot(messages), mode, time.time()))
+        except queue.Full:
+            logger.debug("Очередь дампов запросов заполнена, дамп пропущен")
+            return
+        self._ensure_thread()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Ждёт, пока очередь дампов опустеет (для отладки и завершения работы)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    # ---------- фоновый поток ----------
+
+    @staticmethod
+    def _setting(key: str, default: Any) -> Any:
+        try:
+            from managers.settings_manager import SettingsManager
+            return SettingsManager.get(key, default)
+        except Exception:
+            return default
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="RequestDumpWriter", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"Ошибка записи дампа запроса: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, name: str, messages: Any, mode: str, timestamp: float):
+        payload = self._replace_images(messages)
+        compress = bool(self._setting("REQUEST_DUMP_COMPRESS", True))
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory, exist_ok=True)
+
+        self._seq += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp))
+        file_name = f"{stamp}_{self._seq:05d}.json" + (".gz" if compress else "")
+        file_path = os.path.join(directory, file_name)
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        tmp_path = file_path + ".tmp"
+        if compress:
+            with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+                f.write(data)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        os.replace(tmp_path, file_path)
+        logger.debug(f"Дамп запроса сохранён: {file_path}")
+
+        if mode == MODE_LAST_N:
+            self._dump_refs[file_path] = {ref.decode("ascii") for ref in _IMAGE_REF_RE.findall(data)}
+            try:
+                keep = max(1, int(self._setting("REQUEST_DUMP_LAST_N", 3)))
+            except (TypeError, ValueError):
+                keep = 3
+            if self._prune(directory, keep):
+                self._collect_images()
+
+    def _prune(self, directory: str, keep: int) -> int:
+        dumps = sorted(f for f in os.listdir(directory) if f.endswith(_DUMP_SUFFIXES))
+        removed = 0
+        for old in dumps[:-keep]:
+            path = os.path.join(directory, old)
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            self._dump_refs.pop(path, None)
+        return removed
+
+    def _collect_images(self):
+        """Удаляет картинки, на которые не ссылается ни один оставшийся дамп (во всех видах дампов)."""
+        if not os.path.isdir(self.images_dir):
+            return
+        referenced: Set[str] = set()
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if directory == self.images_dir or not os.path.isdir(directory):
+                continue
+            for file_name in os.listdir(directory):
+                if file_name.endswith(_DUMP_SUFFIXES):
+                    referenced |= self._refs_of(os.path.join(directory, file_name))
+
+        removed = 0
+        for file_name in os.listdir(self.images_dir):
+            digest = file_name.split(".", 1)[0]
+            if digest in referenced:
+                continue
+            try:
+                os.remove(os.path.join(self.images_dir, file_name))
+                removed += 1
+            except OSError:
+                pass
+            self._known_images.discard(digest)
+        if removed:
+            logger.debug(f"Удалено картинок без дампов: {removed}")
+
+    def _refs_of(self, path: str) -> Set[str]:
+        refs = self._dump_refs.get(path)
+        if refs is None:
+            # Дамп от прошлого запуска: читаем один раз
+            try:
+                opener = gzip.open if path.endswith(".gz") else open
+                with opener(path, "rb") as f:
+                    refs = {ref.decode("ascii") for ref in _IMAGE_REF_RE.findall(f.read())}
+            except (OSError, EOFError):
+                refs = set()
+            self._dump_refs[path] = refs
+        return refs
+
+    # ---------- картинки ----------
+
+    def _replace_images(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            return {key: self._replace_images(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self._replace_images(value) for value in obj]
+        if isinstance(obj, (bytes, bytearray)):
+            return self._store_image(bytes(obj), "bin")
+        if isinstance(obj, str) and len(obj) >= _IMAGE_MIN_LENGTH:
+            match = _DATA_URL_RE.match(obj)
+            if match:
+                raw = self._decode(obj[match.end():])
+                if raw is not None:
+                    return self._store_image(raw, _MIME_EXT.get(match.group(1), "bin"))
+            elif _BASE64_RE.match(obj[:256]) and " " not in obj[:256]:
+                raw = self._decode(obj)
+                if raw is not None:
+                    return self._store_image(raw, "bin")
+        return obj
+
+    @staticmethod
+    def _decode(data: str) -> Optional[bytes]:
+        try:
+            return base64.b64decode(data, validate=False)
+        except (binascii.Error, ValueError):
+            return None
+
+    def _store_image(self, raw: bytes, extension: str) -> str:
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest not in self._known_images:
+            os.makedirs(self.images_dir, exist_ok=True)
+            path = os.path.join(self.images_dir, f"{digest}.{extension}")
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(raw)
+            self._known_images.add(digest)
+        return f"<image sha1={digest} bytes={len(raw)}>"
+
+
+# Общий экземпляр для всех провайдеров
+request_dumper = RequestDumper()
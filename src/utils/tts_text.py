@@ -0,0 +1,357 @@
+# src/utils/tts_text.py
+"""
+Подготовка текста реплики к озвучке (TTS): очистка разметки, определение языка, числа -> слова.
+
+Раньше на каждую реплику заново компилировались регулярки, скрипт каждой буквы определялся через
+unicodedata.name(), num2words вызывался с кэшем на один вызов, а фильтр символов был списком
+по символам. TTSTextNormalizer держит всё подготовленным заранее:
+ • регулярки скомпилированы один раз, пары тегов и одиночные теги снимаются одним проходом;
+ • скрипт буквы определяется по таблице диапазонов кодовых точек (bisect + кэш по кодовой точке);
+ • num2words кэшируется между вызовами (LRU по (число, язык));
+ • фильтр символов - str.translate с лениво заполняемой таблицей;
+ • результат нормализации кэшируется (одна и та же реплика идёт и в озвучку, и в окно чата);
+ • если у персонажа задан язык озвучки (переменная voice_language в config.json), определение
+   языка не выполняется вовсе.
+Функции модуля (detect_language, replace_numbers_with_words, process_text_to_voice) реэкспортируются
+из utils и работают через общий экземпляр tts_normalizer.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+
+# langdetect (опционально): pip install langdetect
+try:
+    from langdetect import detect, DetectorFactory, LangDetectException
+    DetectorFactory.seed = 0  # детерминированность
+    LANGDETECT_AVAILABLE = True
+except Exception:
+    LANGDETECT_AVAILABLE = False
+
+from num2words import num2words
+
+from main_logger import logger
+
+
+# =========================== Детекция языка для TTS ============================
+
+SAFE_PUNCT = ".,-:;"
+
+# Максимально расширенная карта "скрипт → предполагаемый язык".
+# Для LATIN осознанно НЕ выбираем язык — для латиницы лучше использовать статистику.
+SCRIPT_TO_LANG = {
+    "CYRILLIC": "ru",
+    "ARABIC": "ar",
+    "HEBREW": "he",
+    "GREEK": "el",
+    "ARMENIAN": "hy",
+    "GEORGIAN": "ka",
+    "DEVANAGARI": "hi",
+    "BENGALI": "bn",
+    "GURMUKHI": "pa",   # панджаби
+    "GUJARATI": "gu",
+    "ORIYA": "or",      # одия
+    "TAMIL": "ta",
+    "TELUGU": "te",
+    "KANNADA": "kn",
+    "MALAYALAM": "ml",
+    "SINHALA": "si",
+    "THAI": "th",
+    "LAO": "lo",
+    "KHMER": "km",
+    "TIBETAN": "bo",
+    "MONGOLIAN": "mn",
+    "ETHIOPIC": "am",   # амхарский
+    "CJK": "zh",        # Han (кандзи/ханзи)
+    "HIRAGANA": "ja",
+    "KATAKANA": "ja",
+    "HANGUL": "ko",
+    "BOPOMOFO": "zh",
+    # "LATIN": "en",    # не доверяем на 100% латинице — пусть решит модель
+}
+
+# Нормализация кодов языка (из langdetect → для num2words и общего использования)
+LANG_NORMALIZATION = {
+    "zh-cn": "zh",
+    "zh-tw": "zh",
+    "pt-br": "pt_BR",
+    "pt-pt": "pt",
+    "iw": "he",   # устаревшее обозначение иврита
+    "in": "id",   # индонезийский
+}
+
+# Диапазоны кодовых точек (включительно) -> скрипт. Буквы вне таблицы считаются "OTHER".
+SCRIPT_RANGES = (
+    (0x0041, 0x024F, "LATIN"), (0x0250, 0x02AF, "LATIN"),
+    (0x0370, 0x03FF, "GREEK"),
+    (0x0400, 0x052F, "CYRILLIC"),
+    (0x0530, 0x058F, "ARMENIAN"),
+    (0x0590, 0x05FF, "HEBREW"),
+    (0x0600, 0x06FF, "ARABIC"), (0x0750, 0x077F, "ARABIC"), (0x08A0, 0x08FF, "ARABIC"),
+    (0x0900, 0x097F, "DEVANAGARI"),
+    (0x0980, 0x09FF, "BENGALI"),
+    (0x0A00, 0x0A7F, "GURMUKHI"),
+    (0x0A80, 0x0AFF, "GUJARATI"),
+    (0x0B00, 0x0B7F, "ORIYA"),
+    (0x0B80, 0x0BFF, "TAMIL"),
+    (0x0C00, 0x0C7F, "TELUGU"),
+    (0x0C80, 0x0CFF, "KANNADA"),
+    (0x0D00, 0x0D7F, "MALAYALAM"),
+    (0x0D80, 0x0DFF, "SINHALA"),
+    (0x0E00, 0x0E7F, "THAI"),
+    (0x0E80, 0x0EFF, "LAO"),
+    (0x0F00, 0x0FFF, "TIBETAN"),
+    (0x10A0, 0x10FF, "GEORGIAN"),
+    (0x1100, 0x11FF, "HANGUL"),
+    (0x1200, 0x139F, "ETHIOPIC"),
+    (0x1780, 0x17FF, "KHMER"),
+    (0x1800, 0x18AF, "MONGOLIAN"),
+    (0x1C80, 0x1C8F, "CYRILLIC"),
+    (0x1C90, 0x1CBF, "GEORGIAN"),
+    (0x1E00, 0x1EFF, "LATIN"),
+    (0x1F00, 0x1FFF, "GREEK"),
+    (0x2C60, 0x2C7F, "LATIN"),
+    (0x2DE0, 0x2DFF, "CYRILLIC"),
+    (0x3040, 0x309F, "HIRAGANA"),
+    (0x30A0, 0x30FF, "KATAKANA"),
+    (0x3100, 0x312F, "BOPOMOFO"),
+    (0x3130, 0x318F, "HANGUL"),
+    (0x31A0, 0x31BF, "BOPOMOFO"),
+    (0x31F0, 0x31FF, "KATAKANA"),
+    (0x3400, 0x4DBF, "CJK"),
+    (0x4E00, 0x9FFF, "CJK"),
+    (0xA640, 0xA69F, "CYRILLIC"),
+    (0xA720, 0xA7FF, "LATIN"),
+    (0xAB30, 0xAB6F, "LATIN"),
+    (0xAC00, 0xD7AF, "HANGUL"),
+    (0xF900, 0xFAFF, "CJK"),
+    (0xFB1D, 0xFB4F, "HEBREW"),
+    (0xFB50, 0xFDFF, "ARABIC"),
+    (0xFE70, 0xFEFF, "ARABIC"),
+    (0xFF21, 0xFF5A, "LATIN"),
+    (0xFF66, 0xFF9F, "KATAKANA"),
+    (0x20000, 0x2FA1F, "CJK"),
+)
+_RANGE_STARTS = [start for start, _end, _script in SCRIPT_RANGES]
+
+_MARKUP_RE = re.compile(r"<[^>]+>.*?</[^>]+>|<[^>]+>", flags=re.DOTALL)
+_NUMBER_RE = re.compile(r"[-+]?\d+")
+_SPACES_RE = re.compile(r"\s{2,}")
+_SENTENCE_END_RE = re.compile(r"(?<=[.;])\s+")
+
+NUM2WORDS_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 512
+
+
+def script_of(ch: str) -> str:
+    """Скрипт буквы по таблице диапазонов (без unicodedata)."""
+    return _script_of_code(ord(ch))
+
+
+@lru_cache(maxsize=8192)
+def _script_of_code(code: int) -> str:
+    i = bisect_right(_RANGE_STARTS, code) - 1
+    if i >= 0:
+        start, end, script = SCRIPT_RANGES[i]
+        if code <= end:
+            return script
+    return "OTHER"
+
+
+def guess_lang_by_script(text: str, threshold: float = 0.6) -> str | None:
+    """
+    Пытается угадать язык по доминирующему юникод-скрипту.
+    Возвращает ISO-код языка или None, если уверенности недостаточно.
+    """
+    counts = Counter(_script_of_code(ord(ch)) for ch in text if ch.isalpha())
+    total = sum(counts.values())
+    if not total:
+        return None
+
+    script, cnt = counts.most_common(1)[0]
+    share = cnt / total
+
+    # Спец. правила для CJK/JA/KR
+    if counts.get("HIRAGANA", 0) + counts.get("KATAKANA", 0) >= max(3, 0.1 * total):
+        return "ja"
+    if counts.get("HANGUL", 0) >= max(3, 0.1 * total):
+        return "ko"
+    if counts.get("CJK", 0) >= max(3, 0.2 * total):
+        # Если CJK без явной хираганы/катаканы — скорее китайский
+        return "zh"
+
+    if share >= threshold:
+        # Не доверяем латинице — много языков делят один скрипт.
+        if script == "LATIN":
+            return None
+        return SCRIPT_TO_LANG.get(script)
+
+    return None
+
+
+def guess_lang_statistically(text: str) -> str | None:
+    """
+    Определяет язык с помощью langdetect (если установлен).
+    Лучше работает на латинице и смешанных языках.
+    """
+    if not LANGDETECT_AVAILABLE:
+        return None
+    sample = text.strip()
+    # langdetect плохо на очень коротких строках
+    if len(sample) < 20:
+        return None
+    sample = sample[:800]  # ограничим для скорости
+    try:
+        code = detect(sample)  # 'ru', 'en', 'fr', 'zh-cn', ...
+        return code
+    except LangDetectException:
+        return None
+    except Exception as e:
+        logger.debug(f"langdetect error: {e}")
+        return None
+
+
+def normalize_lang_code(code: str | None) -> str | None:
+    if not code:
+        return None
+    c = code.lower()
+    c = LANG_NORMALIZATION.get(c, c)
+    # num2words чаще ожидает базовые коды ('en', 'ru', 'fr', 'pt', 'pt_BR', ...)
+    return c
+
+
+def detect_language(text: str) -> str | None:
+    """
+    Комбинирует две стратегии:
+      1) эвристика по скриптам (для не-латиницы, CJK, арабской графики и т.п.);
+      2) статистическая модель (langdetect) — для латиницы и смешанных текстов.
+    Возвращает ISO-код языка (возможно нормализованный) или None.
+    """
+    lang = guess_lang_by_script(text)
+    if lang:
+        return normalize_lang_code(lang)
+    lang = guess_lang_statistically(text)
+    return normalize_lang_code(lang)
+
+
+# ===================== Числа → слова с учётом языка ===========================
+
+@lru_cache(maxsize=NUM2WORDS_CACHE_SIZE)
+def number_to_words(token: str, lang: str) -> str:
+    """Одно число -> слова; кэшируется между вызовами. Безопасный фолбэк на английский."""
+    try:
+        # int() съест лидирующие нули, минусы учтём
+        num = int(token)
+        try:
+            return num2words(num, lang=lang)
+        except NotImplementedError:
+            # Фолбэк на английский
+            if lang != "en":
+                logger.debug(f"num2words: язык '{lang}' не поддержан, используем 'en'.")
+            return num2words(num, lang="en")
+    except Exception:
+        # На случай чего-то странного — вернём исходное
+        return token
+
+
+def replace_numbers_with_words(text: str, lang: str | None = None) -> str:
+    """
+    Заменяет числа на слова с учётом языка (если поддержан).
+    Безопасный фолбэк на английский при NotImplementedError.
+    """
+    lang = normalize_lang_code(lang) or "en"
+    # Меняем только целые числа (знаки минуса поддержаны)
+    return _NUMBER_RE.sub(lambda m: number_to_words(m.group(0), lang), text)
+
+
+# ========================== Основная очистка для TTS ==========================
+
+class _CharFilterTable(dict):
+    """Таблица для str.translate: буквы, пробелы и SAFE_PUNCT остаются, прочее -> пробел. Заполняется лениво."""
+
+    def __missing__(self, code: int):
+        ch = chr(code)
+        value = code if ch.isalpha() or ch.isspace() or ch in SAFE_PUNCT else " "
+        self[code] = value
+        return value
+
+
+class TTSTextNormalizer:
+    def __init__(self, cache_size: int = RESULT_CACHE_SIZE):
+        self._char_table = _CharFilterTable()
+        self._normalize_cached = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def normalize(self, text: str, language: str | None = None) -> str:
+        """
+        Очищает текст перед TTS:
+          1) удаляет HTML/markup;
+          2) определяет язык (эвристика по скриптам + langdetect), если не задан language;
+          3) переводит числа в слова на соответствующем языке (если поддержан);
+          4) оставляет только буквы Юникода, пробелы и знаки из SAFE_PUNCT;
+          5) схлопывает пробелы; при пустом результате возвращает '...'.
+        """
+        if not isinstance(text, str):
+            logger.warning("process_text_to_voice expected str, got %s. Converting.", type(text))
+            text = str(text)
+        return self._normalize_cached(text, normalize_lang_code(language))
+
+    def cache_clear(self):
+        self._normalize_cached.cache_clear()
+
+    def _normalize(self, text: str, language: str | None) -> str:
+        # 1) Удаляем HTML/markup
+        clean_text = _MARKUP_RE.sub("", text) if "<" in text else text
+
+        # 2) Определяем язык (подсказка персонажа отменяет определение)
+        lang_code = language
+        if not lang_code and _NUMBER_RE.search(clean_text):
+            # Язык нужен только для чисел
+            lang_code = detect_language(clean_text)
+            if lang_code:
+                logger.debug(f"Detected language: {lang_code}")
+            else:
+                logger.debug("Language detection failed, using default 'en' for numbers.")
+
+        # 3) Цифры → слова
+        clean_text = replace_numbers_with_words(clean_text, lang=lang_code or "en")
+
+        # 4) Фильтрация символов: оставляем буквы, пробелы и безопасные знаки
+        clean_text = clean_text.translate(self._char_table)
+
+        # 5) Схлопываем пробелы и обрезаем
+        clean_text = _SPACES_RE.sub(" ", clean_text).strip()
+
+        if not clean_text:
+            clean_text = "..."
+            logger.info("TTS text was empty after cleaning, using default '...'")
+
+        return clean_text
+
+
+# Общий экземпляр (кэши живут между вызовами)
+tts_normalizer = TTSTextNormalizer()
+
+
+def process_text_to_voice(text_to_speak: str, language: str | None = None) -> str:
+    """Очищает текст перед TTS (см. TTSTextNormalizer.normalize)."""
+    return tts_normalizer.normalize(text_to_speak, language)
+
+
+def split_sentences(text: str, min_length: int = 40) -> list[str]:
+    """
+    Делит очищенный текст на предложения для посегментной озвучки. Короткие предложения
+    присоединяются к следующему: синтез отдельных «Да.» звучит рвано и не быстрее.
+    """
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        current = f"{current} {sentence}" if current else sentence
+        if len(current) >= min_length:
+            segments.append(current)
+            current = ""
+    if current:
+        if segments and len(current) < min_length:
+            segments[-1] = f"{segments[-1]} {current}"
+        else:
+            segments.append(current)
+    return segments
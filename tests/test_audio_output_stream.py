@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import numpy as np
+
+from handlers.audio_handler import AudioHandler
+from handlers.audio_output_stream import AudioOutputStream, NullOutputStream, SAMPLE_RATE, BLOCK_SIZE
+from utils.tts_text import split_sentences
+
+
+def _tone(value: float, frames: int) -> np.ndarray:
+    return np.full((frames, 2), value, dtype=np.float32)
+
+
+def _played(stream: NullOutputStream) -> np.ndarray:
+    return np.concatenate(list(stream.captured))[:, 0]
+
+
+def test_segments_are_played_back_to_back():
+    output = AudioOutputStream(stream_factory=NullOutputStream, idle_close_seconds=None)
+    handles = [output.enqueue(_tone(value, 1500), SAMPLE_RATE) for value in (0.1, 0.2, 0.3)]
+    assert all(handle.done.wait(2.0) for handle in handles)
+
+    played = _played(output.stream)
+    start = int(np.argmax(played != 0))
+    # Без тишины между сегментами: 1500 кадров каждого подряд
+    assert np.allclose(played[start:start + 1500], 0.1)
+    assert np.allclose(played[start + 1500:start + 3000], 0.2)
+    assert np.allclose(played[start + 3000:start + 4500], 0.3)
+    output.close()
+
+
+def test_mono_input_is_fitted_to_stereo():
+    output = AudioOutputStream(stream_factory=NullOutputStream, idle_close_seconds=None)
+    handle = output.enqueue(np.full(BLOCK_SIZE, 0.5, dtype=np.float32), SAMPLE_RATE)
+    assert handle.done.wait(2.0)
+    captured = np.concatenate(list(output.stream.captured))
+    assert captured.shape[1] == 2
+    assert np.allclose(captured[:BLOCK_SIZE], 0.5)
+    output.close()
+
+
+def test_clear_cancels_pending_buffers():
+    output = AudioOutputStream(stream_factory=lambda **kw: NullOutputStream(realtime=True, **kw),
+                               idle_close_seconds=None)
+    handle = output.enqueue(_tone(0.1, SAMPLE_RATE * 5), SAMPLE_RATE)
+    output.clear()
+    assert handle.done.is_set() and handle.cancelled
+    assert not output.is_playing
+    output.close()
+
+
+def test_idle_stream_is_closed():
+    output = AudioOutputStream(stream_factory=NullOutputStream, idle_close_seconds=0.05)
+    assert output.enqueue(_tone(0.1, 100), SAMPLE_RATE).done.wait(2.0)
+    for _ in range(100):
+        if output.stream is None:
+            break
+        time.sleep(0.01)
+    assert output.stream is None
+
+
+def test_play_segments_starts_before_last_segment_is_ready(monkeypatch):
+    output = AudioOutputStream(stream_factory=NullOutputStream, idle_close_seconds=None)
+    monkeypatch.setattr(AudioHandler, "_output", output)
+
+    async def run():
+        first_played = asyncio.Event()
+
+        async def segments():
+            yield _tone(0.1, 1000), SAMPLE_RATE
+            # Следующий сегмент "синтезируется" - первый уже должен звучать
+            assert await asyncio.to_thread(_wait_for_output, output)
+            first_played.set()
+            yield _tone(0.2, 1000), SAMPLE_RATE
+
+        await AudioHandler.play_segments(segments())
+        return first_played.is_set()
+
+    assert asyncio.run(run())
+    played = _played(output.stream)
+    assert np.count_nonzero(np.isclose(played, 0.1)) == 1000
+    assert np.count_nonzero(np.isclose(played, 0.2)) == 1000
+    output.close()
+
+
+def _wait_for_output(output: AudioOutputStream, timeout: float = 2.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stream = output.stream
+        if stream is not None and stream.captured and any(np.any(block != 0) for block in list(stream.captured)):
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_split_sentences_merges_short_ones():
+    text = "Да. Ну ладно, пойдём тогда вместе в ту комнату наверху. Там тихо и никого нет, можно поговорить."
+    assert split_sentences(text) == [
+        "Да. Ну ладно, пойдём тогда вместе в ту комнату наверху.",
+        "Там тихо и никого нет, можно поговорить.",
+    ]
+    assert split_sentences("Коротко.") == ["Коротко."]
@@ -0,0 +1,56 @@
+import time
+
+from game_connections.client_outbox import ClientOutbox
+from managers.task_manager import Task, TaskStatus
+
+
+class _FakeWriter:
+    transport = None
+
+
+def _task(uid: str, status: TaskStatus) -> Task:
+    now = time.time()
+    return Task(uid=uid, status=status, type="chat", data={}, created_at=now, updated_at=now)
+
+
+def _outbox(max_pending: int) -> ClientOutbox:
+    return ClientOutbox("client", _FakeWriter(), task_message=lambda task: task.to_dict(), max_pending=max_pending)
+
+
+def _pending_keys(outbox: ClientOutbox) -> list:
+    return [key[1] if key[0] == "task" else key for key in outbox._pending]
+
+
+def test_unkeyed_messages_are_dropped_before_task_updates():
+    outbox = _outbox(max_pending=3)
+    outbox.push_task(_task("t1", TaskStatus.PENDING))
+    outbox.push({"type": "log"})
+    outbox.push_task(_task("t2", TaskStatus.SUCCESS))
+    outbox.push_task(_task("t3", TaskStatus.PENDING))
+
+    assert outbox.dropped == 1
+    assert _pending_keys(outbox) == ["t1", "t2", "t3"]
+
+
+def test_final_task_state_is_never_dropped():
+    outbox = _outbox(max_pending=2)
+    outbox.push_task(_task("done", TaskStatus.SUCCESS))
+    outbox.push_task(_task("running", TaskStatus.PENDING))
+    outbox.push_task(_task("failed", TaskStatus.FAILED))
+    assert _pending_keys(outbox) == ["done", "failed"]
+
+    # Остались только итоговые состояния: очередь превышает лимит, но ничего не теряет
+    outbox.push_task(_task("cancelled", TaskStatus.CANCELLED))
+    assert _pending_keys(outbox) == ["done", "failed", "cancelled"]
+    assert outbox.dropped == 1
+
+
+def test_keyed_messages_are_dropped_after_intermediate_tasks():
+    outbox = _outbox(max_pending=2)
+    outbox.push({"type": "settings"}, key="settings")
+    outbox.push_task(_task("running", TaskStatus.VOICING))
+    outbox.push_task(_task("done", TaskStatus.SUCCESS))
+    assert _pending_keys(outbox) == ["settings", "done"]
+
+    outbox.push_task(_task("done2", TaskStatus.SUCCESS))
+    assert _pending_keys(outbox) == ["done", "done2"]
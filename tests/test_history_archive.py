@@ -0,0 +1,80 @@
+import json
+import os
+
+from managers.history_archive import MissedHistoryArchive
+
+
+def _read(archive: MissedHistoryArchive) -> list:
+    with open(archive.segment_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _msg(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+
+def test_growing_prefix_is_archived_once(tmp_path):
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    history = [_msg("user", "a"), _msg("assistant", "b")]
+
+    assert archive.append(history) == 2
+    assert archive.append(history) == 0
+    history.append(_msg("user", "c"))
+    assert archive.append(history) == 1
+
+    assert [m["content"] for m in _read(archive)] == ["a", "b", "c"]
+
+
+def test_repeated_messages_are_not_dropped(tmp_path):
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    idle = _msg("system", "The player is silent")
+    history = [idle, _msg("assistant", "Hello?")]
+    archive.append(history)
+
+    history += [dict(idle), _msg("assistant", "Hello?")]
+    assert archive.append(history) == 2
+
+    assert [m["content"] for m in _read(archive)] == ["The player is silent", "Hello?"] * 2
+
+
+def test_position_survives_restart(tmp_path):
+    history = [_msg("user", "a"), _msg("assistant", "b")]
+    MissedHistoryArchive(str(tmp_path), "mita_missed_history").append(history)
+
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    assert archive.append(history + [_msg("user", "a")]) == 1
+    assert len(_read(archive)) == 3
+
+
+def test_compressed_front_shifts_position(tmp_path):
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    history = [_msg("user", str(i)) for i in range(5)]
+    archive.append(history)
+
+    # Сжатие истории убрало три старых сообщения, добавились два новых
+    shifted = history[3:] + [_msg("user", "5"), _msg("user", "6")]
+    assert archive.append(shifted) == 2
+    assert [m["content"] for m in _read(archive)] == [str(i) for i in range(7)]
+
+
+def test_cleared_history_is_archived_from_start(tmp_path):
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    archive.append([_msg("user", "old")])
+
+    assert archive.append([_msg("user", "new")]) == 1
+    assert [m["content"] for m in _read(archive)] == ["old", "new"]
+
+
+def test_legacy_fingerprint_state_is_migrated(tmp_path):
+    history = [_msg("user", "a"), _msg("assistant", "b")]
+    state_path = os.path.join(str(tmp_path), "mita_missed_history.state.json")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprints": [MissedHistoryArchive.fingerprint(m) for m in history]}, f)
+
+    archive = MissedHistoryArchive(str(tmp_path), "mita_missed_history")
+    assert archive.append(history + [_msg("user", "c")]) == 1
+
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    assert "fingerprints" not in state
+    assert state["archived_count"] == 3
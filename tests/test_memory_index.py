@@ -0,0 +1,87 @@
+import numpy as np
+
+from managers.memory_index import MemoryIndex
+
+
+class FakeEmbeddings:
+    model_name = "fake"
+
+    def __init__(self):
+        self.calls = []
+
+    def get_embedding(self, text, prefix=""):
+        self.calls.append(text)
+        # Запрос "topic-i" ближе всего к воспоминанию "topic-i"
+        vector = np.zeros(64, dtype=np.float32)
+        vector[int(text.split("-")[1]) % 64] = 1.0
+        return vector
+
+
+def _memories(count):
+    return [{"N": n, "content": f"topic-{n}", "priority": "normal"} for n in range(1, count + 1)]
+
+
+def _index(tmp_path, handler, per_sync=4):
+    index = MemoryIndex(str(tmp_path / "index.json"), lambda: handler)
+    index.MAX_EMBEDDINGS_PER_SYNC = per_sync
+    return index
+
+
+def test_sync_caps_work_and_starts_with_newest(tmp_path):
+    handler = FakeEmbeddings()
+    index = _index(tmp_path, handler)
+    memories = _memories(10)
+
+    index.sync(memories)
+
+    assert handler.calls == ["topic-10", "topic-9", "topic-8", "topic-7"]
+    assert index.pending == 6
+
+    index.sync(memories)
+    index.sync(memories)
+    assert index.pending == 0
+    assert len(handler.calls) == 10
+
+    index.sync(memories)
+    assert len(handler.calls) == 10
+
+
+def test_search_falls_back_to_recent_until_backfilled(tmp_path):
+    handler = FakeEmbeddings()
+    index = _index(tmp_path, handler, per_sync=2)
+    memories = _memories(10)
+
+    # Первый ход: проиндексированы только 10 и 9, запрос к 3 ещё не находится
+    first = index.search(memories, "topic-3", top_k=3)
+    assert [m["N"] for m in first] == [8, 9, 10]
+
+    for _ in range(5):
+        index.sync(memories)
+    assert index.pending == 0
+
+    best = index.search(memories, "topic-3", top_k=1)
+    assert [m["N"] for m in best] == [3]
+
+
+def test_high_priority_is_always_included(tmp_path):
+    handler = FakeEmbeddings()
+    index = _index(tmp_path, handler, per_sync=100)
+    memories = _memories(5)
+    memories[0]["priority"] = "High"
+
+    result = index.search(memories, "topic-4", top_k=1)
+
+    assert [m["N"] for m in result] == [1, 4]
+
+
+def test_changed_content_is_reembedded(tmp_path):
+    handler = FakeEmbeddings()
+    index = _index(tmp_path, handler, per_sync=100)
+    memories = _memories(3)
+    index.sync(memories)
+
+    memories[1]["content"] = "topic-20"
+    index.sync(memories)
+
+    assert handler.calls[-1] == "topic-20"
+    assert len(handler.calls) == 4
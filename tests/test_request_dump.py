@@ -0,0 +1,37 @@
+import base64
+import os
+
+from utils.request_dump import RequestDumper, MODE_LAST_N
+
+
+def _image_message(seed: int) -> list:
+    raw = bytes([seed]) * 4096
+    url = "data:image/png;base64," + base64.b64encode(raw).decode("ascii")
+    return [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": url}}]}]
+
+
+def test_last_n_removes_images_of_pruned_dumps(tmp_path, monkeypatch):
+    monkeypatch.setattr(RequestDumper, "_setting", staticmethod(
+        lambda key, default: {"REQUEST_DUMP_LAST_N": 2, "REQUEST_DUMP_COMPRESS": True}.get(key, default)))
+    dumper = RequestDumper(root=str(tmp_path))
+    images_dir = os.path.join(str(tmp_path), "images")
+
+    shared = _image_message(0)
+    dumper._write("other_log", shared, MODE_LAST_N, 0)
+    for seed in range(1, 6):
+        dumper._write("last_attempt_log", _image_message(seed), MODE_LAST_N, seed)
+
+    assert len(os.listdir(tmp_path / "last_attempt_log")) == 2
+    # Две картинки последних дампов и картинка дампа другого вида
+    assert len(os.listdir(images_dir)) == 3
+
+
+def test_refs_of_old_dumps_are_read_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(RequestDumper, "_setting", staticmethod(lambda key, default: default))
+    RequestDumper(root=str(tmp_path))._write("last_attempt_log", _image_message(7), MODE_LAST_N, 0)
+
+    # Новый экземпляр (перезапуск) ничего не знает о прежних дампах
+    dumper = RequestDumper(root=str(tmp_path))
+    dumper._write("other_log", _image_message(8), MODE_LAST_N, 1)
+    dumper._collect_images()
+    assert len(os.listdir(os.path.join(str(tmp_path), "images"))) == 2
@@ -0,0 +1,188 @@
+import pytest
+
+from handlers.voice_models.residency import GB, ModelResidencyManager, estimate_footprint
+
+
+class StubHandler:
+    def __init__(self, size_gb: float):
+        self.size = int(size_gb * GB)
+        self.initialized = True
+        self.unloads = 0
+
+    def unload(self):
+        self.unloads += 1
+        self.initialized = False
+
+
+# Менеджер различает обработчики по имени класса, как LocalVoice - Fish, F5 и Edge+RVC
+class FishStub(StubHandler):
+    pass
+
+
+class F5Stub(StubHandler):
+    pass
+
+
+class RvcStub(StubHandler):
+    pass
+
+
+def make_manager(budget_gb: float) -> ModelResidencyManager:
+    return ModelResidencyManager(budget_bytes=int(budget_gb * GB), measure=lambda handler: handler.size)
+
+
+def test_budget_evicts_least_recently_used():
+    manager = make_manager(5)
+    fish, f5, rvc = FishStub(2), F5Stub(2), RvcStub(2)
+    manager.loaded(fish)
+    manager.loaded(f5)
+
+    manager.loaded(rvc)
+
+    assert fish.unloads == 1
+    assert f5.unloads == 0 and rvc.unloads == 0
+    assert list(manager.footprints()) == ["F5Stub", "RvcStub"]
+    assert manager.total_bytes() == 4 * GB
+
+
+def test_zero_budget_never_evicts():
+    manager = make_manager(0)
+    handlers = [FishStub(10), F5Stub(10), RvcStub(10)]
+    for handler in handlers:
+        manager.loaded(handler)
+
+    assert all(handler.unloads == 0 for handler in handlers)
+    assert manager.total_bytes() == 30 * GB
+
+
+def test_pinned_handlers_are_not_evicted():
+    manager = make_manager(3)
+    fish, f5, rvc = FishStub(2), F5Stub(1), RvcStub(2)
+    manager.loaded(fish)
+    manager.loaded(f5)
+
+    # Комбинированный режим: новой модели нужен и давно загруженный RVC-обработчик
+    manager.loaded(rvc, pinned=[fish])
+
+    assert fish.unloads == 0
+    assert f5.unloads == 1
+    assert set(manager.footprints()) == {"FishStub", "RvcStub"}
+
+
+def test_all_pinned_keeps_everything_over_budget():
+    manager = make_manager(1)
+    fish, f5 = FishStub(2), F5Stub(2)
+    manager.loaded(fish)
+
+    manager.loaded(f5, pinned=[fish])
+
+    assert fish.unloads == 0 and f5.unloads == 0
+    assert manager.total_bytes() == 4 * GB
+
+
+def test_touch_moves_handler_to_most_recent():
+    manager = make_manager(5)
+    fish, f5, rvc = FishStub(2), F5Stub(2), RvcStub(2)
+    manager.loaded(fish)
+    manager.loaded(f5)
+
+    manager.touch(fish)
+    manager.loaded(rvc)
+
+    assert f5.unloads == 1
+    assert fish.unloads == 0
+    assert list(manager.footprints()) == ["FishStub", "RvcStub"]
+
+
+def test_touch_registers_handler_loaded_elsewhere():
+    manager = make_manager(0)
+    rvc = RvcStub(1)
+
+    manager.touch(rvc)
+
+    assert manager.footprints() == {"RvcStub": GB}
+
+
+def test_touch_ignores_uninitialized_handler():
+    manager = make_manager(0)
+    rvc = RvcStub(1)
+    rvc.initialized = False
+
+    manager.touch(rvc, None)
+
+    assert manager.footprints() == {}
+
+
+def test_forget_stops_accounting_without_unloading():
+    manager = make_manager(3)
+    fish, f5 = FishStub(2), F5Stub(2)
+    manager.loaded(fish)
+    manager.forget(fish)
+
+    manager.loaded(f5)
+
+    assert fish.unloads == 0
+    assert manager.footprints() == {"F5Stub": 2 * GB}
+
+
+def test_custom_unload_is_used_and_errors_do_not_stop_eviction():
+    unloaded = []
+
+    def unload(handler):
+        unloaded.append(type(handler).__name__)
+        raise RuntimeError("boom")
+
+    manager = ModelResidencyManager(budget_bytes=2 * GB, measure=lambda handler: handler.size, unload=unload)
+    fish, f5, rvc = FishStub(1), F5Stub(1), RvcStub(2)
+    manager.loaded(fish)
+    manager.loaded(f5)
+
+    evicted = manager.enforce_budget()
+    assert evicted == []
+
+    manager.loaded(rvc)
+
+    assert unloaded == ["FishStub", "F5Stub"]
+    assert list(manager.footprints()) == ["RvcStub"]
+
+
+class FakeTensor:
+    def __init__(self, n: int, size: int = 4):
+        self.n = n
+        self.size = size
+
+    def element_size(self):
+        return self.size
+
+    def nelement(self):
+        return self.n
+
+
+class FakeModule:
+    def __init__(self, *tensors):
+        self._tensors = tensors
+
+    def parameters(self):
+        return list(self._tensors)
+
+    def buffers(self):
+        return []
+
+
+def test_estimate_footprint_counts_tensors_once_and_skips_shared():
+    shared_weight = FakeTensor(100)
+    handler = FishStub(0)
+    handler.model = FakeModule(shared_weight, FakeTensor(50))
+    handler.cache = {"a": shared_weight, "b": [FakeTensor(25, size=2)]}
+    handler.parent = FakeModule(FakeTensor(10 ** 6))
+
+    assert estimate_footprint(handler, skip=[handler.parent]) == (100 + 50) * 4 + 25 * 2
+
+
+@pytest.mark.parametrize("budget_gb, expected", [(4, ["F5Stub", "RvcStub"]), (6, ["FishStub", "F5Stub", "RvcStub"])])
+def test_eviction_depends_on_budget(budget_gb, expected):
+    manager = make_manager(budget_gb)
+    for handler in (FishStub(2), F5Stub(2), RvcStub(2)):
+        manager.loaded(handler)
+
+    assert list(manager.footprints()) == expected
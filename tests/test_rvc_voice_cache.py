@@ -0,0 +1,101 @@
+from handlers.voice_models.rvc_voice_cache import RVCVoiceCache, SharedRVCComponents
+
+
+class FakePipeline:
+    def __init__(self):
+        self._f0 = object()
+
+
+class FakeVC:
+    """Повторяет устройство tts_with_rvc.VC: HuBERT грузится лениво, Pipeline - при загрузке голоса."""
+
+    hubert_loads = 0
+
+    def __init__(self, config="cuda:0/fp16"):
+        self.config = config
+        self.hubert_model = None
+        self.pipeline = None
+        self.loaded_path = None
+
+    def _ensure_hubert(self):
+        if self.hubert_model is None:
+            FakeVC.hubert_loads += 1
+            self.hubert_model = object()
+        return self.hubert_model
+
+    def load_model(self, model_path):
+        if self.loaded_path == model_path:
+            return
+        self.loaded_path = model_path
+        self.pipeline = FakePipeline()
+
+
+class FakeConverter:
+    def __init__(self, config):
+        self._vc = FakeVC(config)
+
+
+class FakeTTSRVC:
+    def __init__(self, model_path, config="cuda:0/fp16"):
+        self.current_model = model_path
+        self.index_path = ""
+        self._converter = FakeConverter(config)
+
+    def set_index_path(self, index_path):
+        self.index_path = index_path
+
+    def convert(self):
+        vc = self._converter._vc
+        vc.load_model(self.current_model)
+        return vc._ensure_hubert(), vc.pipeline._f0
+
+
+def test_voices_share_hubert_and_f0(tmp_path):
+    FakeVC.hubert_loads = 0
+    shared = SharedRVCComponents()
+
+    def factory(model_path):
+        instance = FakeTTSRVC(model_path)
+        assert shared.attach(instance)
+        return instance
+
+    cache = RVCVoiceCache(factory, capacity=3)
+    paths = []
+    for name in ("mila", "kind", "crazy"):
+        path = tmp_path / f"{name}.pth"
+        path.write_bytes(b"x")
+        paths.append(str(path))
+
+    results = [cache.acquire(path).convert() for path in paths]
+
+    assert FakeVC.hubert_loads == 1
+    assert len({id(hubert) for hubert, _f0 in results}) == 1
+    assert len({id(f0) for _hubert, f0 in results}) == 1
+
+
+def test_different_config_is_not_shared():
+    shared = SharedRVCComponents()
+    assert shared.attach(FakeTTSRVC("a.pth", config="cuda:0/fp16"))
+    assert not shared.attach(FakeTTSRVC("b.pth", config="cpu/fp32"))
+
+
+def test_unknown_layout_is_left_alone():
+    class OnnxTTSRVC:
+        pass
+
+    assert not SharedRVCComponents().attach(OnnxTTSRVC())
+
+
+def test_clear_starts_new_shared_set():
+    FakeVC.hubert_loads = 0
+    shared = SharedRVCComponents()
+    first = FakeTTSRVC("a.pth")
+    shared.attach(first)
+    first.convert()
+
+    shared.clear()
+    second = FakeTTSRVC("b.pth", config="cpu/fp32")
+    assert shared.attach(second)
+    second.convert()
+
+    assert FakeVC.hubert_loads == 2
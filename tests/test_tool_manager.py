@@ -0,0 +1,149 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools.base import Tool
+from tools.cache import ToolResultCache
+from tools.manager import ToolManager
+
+
+class StubTool(Tool):
+    description = "stub"
+
+    def __init__(self, name: str, delay: float = 0.0, cache_ttl: float = 0, timeout: float = 5):
+        self._name = name
+        self.delay = delay
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def run(self, value=None, **_):
+        self.calls += 1
+        time.sleep(self.delay)
+        return f"{self._name}:{value}"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ToolManager(cache=ToolResultCache(path=str(tmp_path / "tool_results.json")))
+
+
+def test_calls_run_in_parallel_and_keep_order(manager):
+    for name, delay in (("slow", 0.4), ("fast", 0.1), ("medium", 0.2)):
+        manager.register(StubTool(name, delay))
+
+    started = time.monotonic()
+    results = manager.run_many([("slow", {"value": 1}), ("fast", {"value": 2}),
+                                ("missing", {}), ("medium", {"value": 3})])
+    elapsed = time.monotonic() - started
+
+    assert results[0] == "slow:1"
+    assert results[1] == "fast:2"
+    assert results[2].startswith("[Tool-Error]")
+    assert results[3] == "medium:3"
+    assert elapsed < 0.65
+
+
+def test_cache_hit_uses_normalized_args(manager):
+    tool = StubTool("cached", cache_ttl=60)
+    manager.register(tool)
+
+    assert manager.run("cached", {"value": "  hello   world "}) == "cached:  hello   world "
+    assert manager.run("cached", {"value": "hello world"}) == "cached:  hello   world "
+    assert tool.calls == 1
+
+
+def test_cache_entry_expires(manager):
+    tool = StubTool("short", cache_ttl=0.1)
+    manager.register(tool)
+
+    manager.run("short", {"value": 1})
+    manager.run("short", {"value": 1})
+    assert tool.calls == 1
+    time.sleep(0.15)
+    manager.run("short", {"value": 1})
+    assert tool.calls == 2
+
+
+def test_cache_is_persisted_to_disk(tmp_path):
+    path = str(tmp_path / "tool_results.json")
+    cache = ToolResultCache(path=path)
+    cache.put("web_search", {"query": "mita"}, "result", ttl=60)
+    cache.put("web_search", {"query": "old"}, "stale", ttl=0.05)
+    time.sleep(0.1)
+
+    reloaded = ToolResultCache(path=path)
+    assert reloaded.get("web_search", {"query": " mita "}) == "result"
+    assert reloaded.get("web_search", {"query": "old"}) is None
+
+
+def test_errors_are_not_cached(manager):
+    class FailingTool(StubTool):
+        def run(self, **_):
+            self.calls += 1
+            return f"[{self.name}] Ошибка: сеть недоступна"
+
+    tool = FailingTool("flaky", cache_ttl=60)
+    manager.register(tool)
+    manager.run("flaky", {})
+    manager.run("flaky", {})
+    assert tool.calls == 2
+
+
+def test_per_tool_timeout_does_not_hold_other_calls(manager):
+    manager.register(StubTool("hung", delay=2.0, timeout=0.2))
+    manager.register(StubTool("quick", delay=0.05))
+
+    started = time.monotonic()
+    results = manager.run_many([("hung", {}), ("quick", {"value": 1})])
+    assert time.monotonic() - started < 1.0
+    assert results[0].startswith("[Tool-Error] hung")
+    assert results[1] == "quick:1"
+
+    # Зависший вызов ещё работает, но следующий ход получает свои потоки
+    started = time.monotonic()
+    assert manager.run("quick", {"value": 2}) == "quick:2"
+    assert time.monotonic() - started < 0.5
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        body = "<html><body><nav>menu</nav><p>Mita   lives in the   game</p></body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def local_site(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1,localhost")
+    _PageHandler.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_web_reader_against_local_server_is_cached(manager, local_site):
+    first = manager.run("web_reader", {"url": f"{local_site}/page"})
+    second = manager.run("web_reader", {"url": f"{local_site}/page"})
+
+    assert first == "Mita lives in the game"
+    assert second == first
+    assert _PageHandler.hits == 1